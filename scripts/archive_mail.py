@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+from njs_mywork_tools.mail.archive import MailArchive, MailArchiver
+from njs_mywork_tools.mail.repository import MailRepository
+from njs_mywork_tools.mail.store import create_mail_store
+from njs_mywork_tools.settings import Settings
+from njs_mywork_tools.utils.logger import setup_logger
+
+logger = setup_logger(name=__name__, log_file=Path("logs/archive_mail.log"))
+
+
+async def archive_mail(archive_dir: Path, archive_after_days: int):
+    """古いメールをデータベースから年・月ごとの Parquet ファイルに移す関数"""
+    setting = Settings()
+    # アーカイブ・ジャーナルを経由せず、データベースから直接読み込み・削除する
+    storage_setting = setting.mail_storage.model_copy(
+        update={"archive_dir": None, "journal_path": None}
+    )
+    store = create_mail_store(setting.surrealdb, storage_setting)
+    archiver = MailArchiver(store, MailArchive(archive_dir), archive_after_days)
+
+    try:
+        logger.info(f"メールのアーカイブを開始します: {archive_dir}")
+        moved = await archiver.run()
+        for (year, month), count in moved.items():
+            logger.info(f"アーカイブしました: {year:04d}-{month:02d} {count} 件")
+        logger.info(f"メールのアーカイブが完了しました（{sum(moved.values())} 件）")
+        if moved and isinstance(store, MailRepository):
+            # 削除したメールの日時が連絡先の最初・最後のやり取りに残らないよう集計し直す
+            await store.rebuild_contact_stats()
+            logger.info("連絡先の集計を作り直しました")
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}", exc_info=True)
+
+
+if __name__ == "__main__":
+    setting = Settings().mail_storage
+    parser = argparse.ArgumentParser(description="古いメールを Parquet ファイルにアーカイブする")
+    parser.add_argument(
+        "archive_dir", type=Path, nargs="?",
+        default=Path(setting.archive_dir or "data/mail_archive"),
+    )
+    parser.add_argument("--days", type=int, default=setting.archive_after_days,
+                        help="この日数より前の月のメールをアーカイブする")
+    args = parser.parse_args()
+    asyncio.run(archive_mail(args.archive_dir, args.days))
@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+from njs_mywork_tools.mail.export import MailParquetExporter
+from njs_mywork_tools.mail.store import create_mail_store
+from njs_mywork_tools.settings import Settings
+from njs_mywork_tools.utils.logger import setup_logger
+
+logger = setup_logger(name=__name__, log_file=Path("logs/export_mail.log"))
+
+
+async def export_mail(output_dir: Path, full: bool):
+    """メールを年・月ごとの Parquet ファイルに書き出す関数"""
+    setting = Settings()
+    store = create_mail_store(setting.surrealdb, setting.mail_storage)
+    exporter = MailParquetExporter(store, output_dir)
+
+    try:
+        logger.info(f"メールのエクスポートを開始します: {output_dir}")
+        written = await exporter.export(incremental=not full)
+        for path in written:
+            logger.info(f"書き出しました: {path}")
+        logger.info(f"メールのエクスポートが完了しました（{len(written)} パーティション）")
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}", exc_info=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="メールを Parquet 形式で書き出す")
+    parser.add_argument("output_dir", type=Path, nargs="?", default=Path("data/mail_parquet"))
+    parser.add_argument("--full", action="store_true", help="全パーティションを書き出し直す")
+    args = parser.parse_args()
+    asyncio.run(export_mail(args.output_dir, args.full))
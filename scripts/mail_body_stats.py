@@ -0,0 +1,32 @@
+import asyncio
+
+from njs_mywork_tools.mail.repository import MailRepository
+from njs_mywork_tools.settings import Settings
+
+
+def format_bytes(size: float) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+async def show_body_stats():
+    """本文の保存容量と削減量を表示する関数"""
+    setting = Settings()
+    stats = await MailRepository(setting.surrealdb).body_stats()
+
+    print(f"メッセージ数: {stats.messages}")
+    print(f"本文レコード数: {stats.bodies}")
+    print(f"本文の合計: {format_bytes(stats.logical_bytes)}")
+    print(f"重複除去後: {format_bytes(stats.unique_bytes)}")
+    print(
+        f"圧縮後: {format_bytes(stats.stored_bytes)}"
+        f"（うち全文検索用の返信部分: {format_bytes(stats.inline_bytes)}）"
+    )
+    print(f"削減量: {format_bytes(stats.saved_bytes)} ({stats.saved_ratio:.1%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(show_body_stats())
@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+from datetime import date, timedelta
+
+from njs_mywork_tools.mail.repository import MailRepository
+from njs_mywork_tools.settings import Settings
+
+
+async def show_mail_stats(days: int, limit: int):
+    """集計テーブルから日ごとの件数とやり取りの多い連絡先を表示する関数"""
+    setting = Settings()
+    repository = MailRepository(setting.surrealdb)
+
+    print(f"直近 {days} 日のメール件数:")
+    start = date.today() - timedelta(days=days - 1)
+    for daily in await repository.daily_counts(start=start):
+        print(f"  {daily.day.isoformat()}: {daily.message_count}")
+
+    print(f"やり取りの多い連絡先（上位 {limit} 件）:")
+    for correspondent in await repository.top_correspondents(limit):
+        last_seen = correspondent.last_seen.strftime("%Y-%m-%d") if correspondent.last_seen else "-"
+        print(
+            f"  {correspondent.email} ({correspondent.name or '-'}): "
+            f"送信 {correspondent.sent_count} / 受信 {correspondent.received_count} "
+            f"最終 {last_seen}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="メールの集計を表示する")
+    parser.add_argument("--days", type=int, default=14, help="日ごとの件数を表示する日数")
+    parser.add_argument("--limit", type=int, default=20, help="表示する連絡先の件数")
+    args = parser.parse_args()
+    asyncio.run(show_mail_stats(args.days, args.limit))
@@ -0,0 +1,26 @@
+import asyncio
+from pathlib import Path
+
+from njs_mywork_tools.mail.repository import MailRepository
+from njs_mywork_tools.settings import Settings
+from njs_mywork_tools.utils.logger import setup_logger
+
+logger = setup_logger(name=__name__, log_file=Path("logs/migrate_mail_layout.log"))
+
+
+async def migrate_mail_layout():
+    """保存済みのメールを送信者・受信者・添付ファイルを埋め込む保存形式に変換する関数"""
+    setting = Settings()
+    repository = MailRepository(setting.surrealdb, layout="embedded")
+
+    try:
+        logger.info("メールの保存形式の変換を開始します")
+        migrated = await repository.migrate_to_embedded()
+        logger.info(f"メールの保存形式の変換が完了しました（{migrated} 件）")
+        logger.info("MAIL_STORAGE__LAYOUT=embedded を設定してください")
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}", exc_info=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate_mail_layout())
@@ -0,0 +1,32 @@
+import asyncio
+from pathlib import Path
+
+from njs_mywork_tools.mail.client import (DenbunMailClient,
+                                          DenbunMailClientOptions)
+from njs_mywork_tools.settings import Settings
+from njs_mywork_tools.utils.logger import setup_logger
+
+logger = setup_logger(name=__name__, log_file=Path("logs/outbox_worker.log"))
+
+
+async def run_outbox_worker():
+    """送信キューのメールを送信し続ける"""
+    setting = Settings()
+    options = DenbunMailClientOptions(
+        denbun_setting=setting.denbun,
+        surrealdb_setting=setting.surrealdb,
+        playwright_headless=setting.playwright.headless,
+        xlwings_visible=setting.xlwings.visible,
+    )
+    client = DenbunMailClient(options)
+
+    try:
+        logger.info("送信キューの処理を開始します")
+        await client.run_outbox_worker()
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}", exc_info=True)
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_outbox_worker())
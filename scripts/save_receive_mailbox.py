@@ -25,6 +25,7 @@ async def save_receive_mail(start_date: str, end_date: str, keyword: str):
         surrealdb_setting=setting.surrealdb,
         playwright_headless=setting.playwright.headless,
         xlwings_visible=setting.xlwings.visible,
+        mail_storage_setting=setting.mail_storage,
     )
     client = DenbunMailClient(options)
 
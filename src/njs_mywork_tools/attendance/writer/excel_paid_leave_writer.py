@@ -95,6 +95,19 @@ class ExcelPaidLeaveWriter:
         for app_date, leave_type in data.items():
             self.add_paid_leave_application(app_date, leave_type)
 
+    def to_bytes(self) -> bytes:
+        """
+        保存済みのワークブックの内容を返す
+
+        Returns:
+            bytes: Excelファイルの内容
+        """
+        if not self._wb:
+            raise ValueError("ワークブックが開かれていません")
+
+        self._wb.save()
+        return Path(self.template_path).read_bytes()
+
     def _stamp_syokuin(
         self, sheet: xw.Sheet, cell: str, text1: str, text2: str, text3: str
     ) -> None:
@@ -2,7 +2,6 @@
 処理結果をExcelファイルに出力するモジュール
 """
 
-import os
 import tempfile
 from contextlib import contextmanager
 from datetime import datetime
@@ -81,12 +80,26 @@ class ExcelWriter:
             month (int): 対象月
             time_cards (TimeCardDataList): タイムカードデータ
         """
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            self.write_to_file(tmp.name, month, time_cards)
-            
-            with open(tmp.name, "rb") as f:
-                output.write(f.read())
-            os.unlink(tmp.name)
+        output.write(self.write_bytes(month, time_cards))
+
+    def write_bytes(self, month: int, time_cards: TimeCardDataList) -> bytes:
+        """
+        タイムカードデータを書き込んだExcelファイルの内容を返す
+
+        Excelはファイルにしか保存できないため、作業用ディレクトリを経由し、
+        読み込み後に削除する。メール添付などにそのまま渡せる。
+
+        Args:
+            month (int): 対象月
+            time_cards (TimeCardDataList): タイムカードデータ
+
+        Returns:
+            bytes: Excelファイルの内容
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir) / Path(self.template_path).name
+            self.write_to_file(tmp_path, month, time_cards)
+            return tmp_path.read_bytes()
 
     def write_to_file(self, output_path: Path, month: int, time_cards: TimeCardDataList) -> None:
         """
@@ -1,5 +1,7 @@
  
 from .client import DenbunMailClient
+from .outbox import MailOutbox, OutboxWorker
+from .query import MailQuery, MailQueryRow
 from .watcher import MailWatcher
 
-__all__ = ["DenbunMailClient", "MailWatcher"]
+__all__ = ["DenbunMailClient", "MailWatcher", "MailOutbox", "OutboxWorker", "MailQuery", "MailQueryRow"]
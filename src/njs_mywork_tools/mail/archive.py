@@ -0,0 +1,320 @@
+"""古いメールのコールドストレージへのアーカイブ
+
+直近のメールのみをデータベースに残し、一定期間より古いメールは年・月ごとの
+Parquet ファイル（zstd 圧縮）に移す。アーカイブしたメールは必要なときに
+ファイルを読み込んで検索する。
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import (AsyncIterator, Dict, Iterable, List, Optional, Set,
+                    Tuple, Union)
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from njs_mywork_tools.mail.export import (MAIL_EXPORT_SCHEMA, Partition,
+                                          existing_partitions,
+                                          from_record_batch, partition_of,
+                                          partition_path, to_record_batch)
+from njs_mywork_tools.mail.models.message import MailMessage
+from njs_mywork_tools.mail.models.search import (MailSearchFilters,
+                                                 MailSearchResult)
+from njs_mywork_tools.mail.store import MailStore
+
+
+def _month_start(partition: Partition) -> datetime:
+    year, month = partition
+    return datetime(year, month, 1)
+
+
+def _next_month(partition: Partition) -> Partition:
+    year, month = partition
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _highlight(text: str, keyword: str, width: int = 40) -> str:
+    """検索語の前後を切り出し、検索語を<mark>タグで囲む"""
+    position = text.lower().find(keyword.lower())
+    if position < 0:
+        return ""
+    start = max(0, position - width)
+    end = min(len(text), position + len(keyword) + width)
+    snippet = text[start:end]
+    offset = position - start
+    return (
+        snippet[:offset] + "<mark>" + snippet[offset:offset + len(keyword)] + "</mark>"
+        + snippet[offset + len(keyword):]
+    )
+
+
+class MailArchive:
+    """
+    アーカイブしたメールを保持する年・月ごとの Parquet ファイル
+
+    ファイルの形式は MailParquetExporter の書き出しと同じため、pandas や DuckDB でも
+    そのまま読み込める。
+    """
+
+    def __init__(self, archive_dir: Union[str, Path]):
+        self.archive_dir = Path(archive_dir)
+        # パーティションごとの (更新日時, ID) と、全パーティションのIDの和集合
+        self._partition_ids: Dict[Path, Tuple[int, Set[str]]] = {}
+        self._ids: Set[str] = set()
+
+    def partitions(self) -> List[Partition]:
+        return existing_partitions(self.archive_dir)
+
+    def _paths(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Path]:
+        """期間に含まれるパーティションのファイルを古い順に返す"""
+        return [
+            partition_path(self.archive_dir, partition)
+            for partition in self.partitions()
+            if (start is None or _month_start(_next_month(partition)) > start)
+            and (end is None or _month_start(partition) <= end)
+        ]
+
+    def _write_partition(self, partition: Partition, messages: List[MailMessage]) -> Path:
+        path = partition_path(self.archive_dir, partition)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_batches([to_record_batch(messages)], schema=MAIL_EXPORT_SCHEMA)
+        if path.exists():
+            # 既にアーカイブ済みの月には追加し、同じIDは新しいものを残す
+            existing = pq.read_table(path, schema=MAIL_EXPORT_SCHEMA)
+            keep = pc.invert(pc.is_in(existing["id"], value_set=table["id"]))
+            table = pa.concat_tables([existing.filter(keep), table])
+        table = table.sort_by([("mail_date", "ascending"), ("id", "ascending")])
+
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    async def write_partition(self, partition: Partition, messages: List[MailMessage]) -> Path:
+        """1か月分のメールをパーティションに書き込む"""
+        return await asyncio.to_thread(self._write_partition, partition, messages)
+
+    async def message_ids(self) -> Set[str]:
+        """
+        アーカイブしたメールのID
+
+        id 列はパーティションのファイルの更新日時が変わった場合のみ読み直すため、
+        他のプロセスがアーカイブしたメールも反映される。
+        """
+        def load() -> Set[str]:
+            mtimes = {path: path.stat().st_mtime_ns for path in self._paths()}
+            if mtimes == {path: mtime for path, (mtime, _) in self._partition_ids.items()}:
+                return self._ids
+            partition_ids = {}
+            for path, mtime in mtimes.items():
+                cached = self._partition_ids.get(path)
+                if cached is None or cached[0] != mtime:
+                    ids = set(pq.read_table(path, columns=["id"])["id"].to_pylist())
+                    cached = (mtime, ids)
+                partition_ids[path] = cached
+            self._partition_ids = partition_ids
+            self._ids = set().union(*(ids for _, ids in partition_ids.values()))
+            return self._ids
+        return await asyncio.to_thread(load)
+
+    async def find_by_id(self, message_id: str) -> Optional[MailMessage]:
+        if message_id not in await self.message_ids():
+            return None
+
+        def find() -> Optional[MailMessage]:
+            for path in self._paths():
+                table = pq.read_table(path, filters=[("id", "=", message_id)])
+                if table.num_rows:
+                    return from_record_batch(table)[0]
+            return None
+        return await asyncio.to_thread(find)
+
+    async def iter_messages(
+        self,
+        start: datetime,
+        end: datetime,
+        sender: Optional[str] = None,
+    ) -> AsyncIterator[MailMessage]:
+        """期間内のメールを日時順に返す（期間に含まれるパーティションのみ読み込む）"""
+        for path in self._paths(start, end):
+            table = await asyncio.to_thread(pq.read_table, path, schema=MAIL_EXPORT_SCHEMA)
+            mask = pc.and_(
+                pc.greater_equal(table["mail_date"], pa.scalar(start, pa.timestamp("us"))),
+                pc.less_equal(table["mail_date"], pa.scalar(end, pa.timestamp("us"))),
+            )
+            if sender:
+                mask = pc.and_(mask, pc.equal(pc.struct_field(table["sender"], "email"), sender))
+            for message in from_record_batch(table.filter(mask)):
+                yield message
+
+    async def search(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        """件名と本文の部分一致でアーカイブを検索し、新しい順に返す"""
+        filters = filters or MailSearchFilters()
+        results: List[MailSearchResult] = []
+        for path in reversed(self._paths(filters.start_date, filters.end_date)):
+            table = await asyncio.to_thread(pq.read_table, path, schema=MAIL_EXPORT_SCHEMA)
+            mask = pc.or_(
+                pc.match_substring(table["subject"], text, ignore_case=True),
+                pc.match_substring(table["body"], text, ignore_case=True),
+            )
+            if filters.start_date:
+                mask = pc.and_(mask, pc.greater_equal(
+                    table["mail_date"], pa.scalar(filters.start_date, pa.timestamp("us"))
+                ))
+            if filters.end_date:
+                mask = pc.and_(mask, pc.less_equal(
+                    table["mail_date"], pa.scalar(filters.end_date, pa.timestamp("us"))
+                ))
+            if filters.sender:
+                mask = pc.and_(
+                    mask, pc.equal(pc.struct_field(table["sender"], "email"), filters.sender)
+                )
+            matched = table.filter(mask).sort_by([("mail_date", "descending")])
+            for row in matched.select(["id", "subject", "mail_date", "body"]).to_pylist():
+                results.append(MailSearchResult(
+                    id=row["id"],
+                    subject=row["subject"],
+                    mail_date=row["mail_date"],
+                    score=0.0,
+                    subject_highlight=_highlight(row["subject"], text) or row["subject"],
+                    body_highlight=_highlight(row["body"], text),
+                ))
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+class MailArchiver:
+    """
+    一定期間より古いメールをデータベースからアーカイブに移すクラス
+
+    月単位で、アーカイブへの書き込みが完了してからデータベースから削除するため、
+    途中で停止しても再実行すれば続きから移動する。
+    """
+
+    def __init__(
+        self,
+        store: MailStore,
+        archive: MailArchive,
+        archive_after_days: int = 365,
+        batch_size: int = 500,
+    ):
+        self.store = store
+        self.archive = archive
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """この日時より前の月をアーカイブの対象とする（月の途中では区切らない）"""
+        threshold = (now or datetime.now()) - timedelta(days=self.archive_after_days)
+        return datetime(threshold.year, threshold.month, 1)
+
+    async def run(self, now: Optional[datetime] = None) -> Dict[Partition, int]:
+        """
+        アーカイブの対象となるメールを月ごとに移動する
+
+        Returns:
+            Dict[Partition, int]: 月ごとの移動した件数
+        """
+        cutoff = self.cutoff(now)
+        moved: Dict[Partition, int] = {}
+        partition: Optional[Partition] = None
+        buffer: List[MailMessage] = []
+        async for message in self.store.iter_messages(
+            datetime.min, cutoff - timedelta(microseconds=1), batch_size=self.batch_size
+        ):
+            message_partition = partition_of(message.mail_date)
+            if partition is not None and message_partition != partition:
+                moved[partition] = await self._move(partition, buffer)
+                buffer = []
+            partition = message_partition
+            buffer.append(message)
+        if partition is not None:
+            moved[partition] = await self._move(partition, buffer)
+        return moved
+
+    async def _move(self, partition: Partition, messages: List[MailMessage]) -> int:
+        await self.archive.write_partition(partition, messages)
+        ids = [message.id for message in messages]
+        for index in range(0, len(ids), self.batch_size):
+            await self.store.delete_many(ids[index:index + self.batch_size])
+        self.logger.info(f"Archived {len(ids)} messages of {partition[0]:04d}-{partition[1]:02d}")
+        return len(ids)
+
+
+class ArchivedMailStore(MailStore):
+    """
+    データベースとアーカイブをまとめて扱う保存先
+
+    保存・全文検索はデータベースに対して行い、IDによる検索・存在確認・期間による
+    取得はアーカイブも対象とする。アーカイブの全文検索は search_archive で行う。
+    """
+
+    def __init__(self, store: MailStore, archive: MailArchive):
+        self.store = store
+        self.archive = archive
+
+    async def save_many(self, mail_messages: List[MailMessage]) -> None:
+        await self.store.save_many(mail_messages)
+
+    async def delete_many(self, message_ids: Iterable[str]) -> None:
+        await self.store.delete_many(message_ids)
+
+    async def find_by_id(self, message_id: str) -> MailMessage:
+        try:
+            return await self.store.find_by_id(message_id)
+        except (KeyError, IndexError):
+            archived = await self.archive.find_by_id(message_id.split(":")[-1])
+            if archived is None:
+                raise KeyError(message_id)
+            return archived
+
+    async def exists_many(self, message_ids: Iterable[str]) -> Set[str]:
+        message_ids = list(message_ids)
+        archived = await self.archive.message_ids()
+        found = {message_id for message_id in message_ids if message_id in archived}
+        return found | await self.store.exists_many(
+            [message_id for message_id in message_ids if message_id not in found]
+        )
+
+    async def search(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        return await self.store.search(text, filters, limit)
+
+    async def search_archive(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        """アーカイブしたメールを検索する"""
+        return await self.archive.search(text, filters, limit)
+
+    async def iter_messages(
+        self,
+        start: datetime,
+        end: datetime,
+        sender: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[MailMessage]:
+        """アーカイブ、データベースの順に期間内のメールを返す"""
+        async for message in self.archive.iter_messages(start, end, sender):
+            yield message
+        async for message in self.store.iter_messages(start, end, sender, batch_size):
+            yield message
@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import zstandard
+
+from njs_mywork_tools.mail.models.entities import MailBodyEntity
+
+BODY_TABLE = "mail_bodies"
+
+# 引用部分の直前に置かれる「〜さんは書きました:」等の行
+_ATTRIBUTION = re.compile(r"^.*(wrote|書きました|書かれました)\s*[:：]\s*$")
+_ORIGINAL_MESSAGE = re.compile(r"^-{2,}\s*(Original Message|元のメッセージ)\s*-{2,}\s*$", re.IGNORECASE)
+
+
+def split_quoted(body: str) -> Tuple[str, str]:
+    """
+    本文を返信部分と引用部分に分割する
+
+    引用部分は、最初の「>」で始まる行（直前に引用元を示す行があればその行）、
+    または「-----Original Message-----」の行から末尾までとする。
+    2つを連結すると元の本文に戻る。
+
+    Returns:
+        Tuple[str, str]: (返信部分, 引用部分)。引用がない場合、引用部分は空文字
+    """
+    lines = body.splitlines(keepends=True)
+    offset = 0
+    previous = None
+    for line in lines:
+        text = line.rstrip("\r\n")
+        if _ORIGINAL_MESSAGE.match(text):
+            return body[:offset], body[offset:]
+        if text.startswith(">"):
+            if previous is not None and _ATTRIBUTION.match(previous[1]):
+                offset = previous[0]
+            return body[:offset], body[offset:]
+        if text.strip():
+            previous = (offset, text)
+        offset += len(line)
+    return body, ""
+
+
+@dataclass
+class MailBodyStats:
+    """本文の保存容量の統計"""
+
+    messages: int
+    bodies: int
+    logical_bytes: int
+    unique_bytes: int
+    # 全文検索用にメッセージにも保存した返信部分（inline_bytes）を含む
+    stored_bytes: int
+    inline_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.logical_bytes - self.stored_bytes
+
+    @property
+    def saved_ratio(self) -> float:
+        return self.saved_bytes / self.logical_bytes if self.logical_bytes else 0.0
+
+
+class MailBodyStore:
+    """
+    本文を内容のハッシュをIDとした mail_bodies テーブルに保存するための変換を行うクラス
+
+    同じ内容の本文は1レコードにまとまる。compress_threshold バイト以上の本文は
+    zstd で圧縮する。split_quoted が有効な場合は引用部分を別レコードにするため、
+    同じメールを引用した返信の間でも引用部分が共有される。
+    """
+
+    def __init__(self, compress_threshold: int = 1024, split_quoted: bool = False, level: int = 3):
+        self.compress_threshold = compress_threshold
+        self.split_quoted = split_quoted
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, body: str) -> List[MailBodyEntity]:
+        """本文を保存するレコードに変換する（連結順に並ぶ）"""
+        parts = split_quoted(body) if self.split_quoted else (body,)
+        return [self._encode_part(part) for part in parts if part]
+
+    def _encode_part(self, text: str) -> MailBodyEntity:
+        raw = text.encode("utf-8")
+        key = "sha256_" + hashlib.sha256(raw).hexdigest()
+        if len(raw) >= self.compress_threshold:
+            data = base64.b64encode(self._compressor.compress(raw)).decode("ascii")
+            codec = "zstd"
+        else:
+            data = text
+            codec = "plain"
+        return MailBodyEntity(
+            id=key, codec=codec, data=data, size=len(raw), stored_size=len(data.encode("utf-8"))
+        )
+
+    def decode(self, parts: List[Dict[str, Any]]) -> str:
+        """保存したレコードから本文を復元する"""
+        texts = []
+        for part in parts:
+            if part["codec"] == "zstd":
+                texts.append(
+                    self._decompressor.decompress(base64.b64decode(part["data"])).decode("utf-8")
+                )
+            else:
+                texts.append(part["data"])
+        return "".join(texts)
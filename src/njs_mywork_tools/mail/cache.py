@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (Awaitable, Callable, Dict, Generic, Iterable, Literal,
+                    Optional, Tuple, TypeVar)
+
+T = TypeVar("T")
+
+
+class BloomFilter:
+    """文字列の集合を省メモリで保持する Bloom フィルタ
+
+    含まれていないと判定した要素は確実に含まれていないが、
+    含まれていると判定した要素は error_rate の確率で誤判定となる。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class MessageIdIndex:
+    """
+    保存済みメッセージIDのプロセス内インデックス
+
+    mode が "set" の場合はIDをそのまま保持し、存在の有無を確定的に判定する。
+    "bloom" の場合は Bloom フィルタで保持し、未保存であることのみ確定的に判定する。
+    いずれも warm で全IDを読み込むまでは、未登録のIDについて判定しない。
+    """
+
+    def __init__(
+        self,
+        mode: Literal["set", "bloom"] = "set",
+        capacity: int = 1_000_000,
+        error_rate: float = 0.01,
+    ):
+        self.mode = mode
+        self.warmed = False
+        self._ids = set() if mode == "set" else BloomFilter(capacity, error_rate)
+
+    def add(self, message_id: str) -> None:
+        self._ids.add(message_id)
+
+    def add_many(self, message_ids: Iterable[str]) -> None:
+        for message_id in message_ids:
+            self._ids.add(message_id)
+
+    def discard_many(self, message_ids: Iterable[str]) -> None:
+        """削除したIDを取り除く（Bloom フィルタからは取り除けないため、データベースへの確認となる）"""
+        if self.mode == "set":
+            self._ids.difference_update(message_ids)
+
+    def warm(self, message_ids: Iterable[str]) -> None:
+        """保存済みの全IDを読み込む"""
+        self.add_many(message_ids)
+        self.warmed = True
+
+    def contains(self, message_id: str) -> Optional[bool]:
+        """
+        IDが保存済みかを判定する
+
+        Returns:
+            Optional[bool]: 保存済みならTrue、未保存ならFalse、
+                データベースへの確認が必要な場合はNone
+        """
+        if message_id not in self._ids:
+            return False if self.warmed else None
+        return True if self.mode == "set" else None
+
+
+class ContactCache:
+    """
+    保存済みの連絡先名を保持する LRU キャッシュ
+
+    名前が変わっていない連絡先の書き込みを省略するために使用する。
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._names: "OrderedDict[str, str]" = OrderedDict()
+
+    def changed(self, contacts: Dict[str, str]) -> Dict[str, str]:
+        """キャッシュと名前が異なる（または未キャッシュの）連絡先を返す"""
+        return {
+            email: name for email, name in contacts.items()
+            if self._names.get(email) != name
+        }
+
+    def update(self, contacts: Dict[str, str]) -> None:
+        """書き込み済みの連絡先をキャッシュに反映する"""
+        for email, name in contacts.items():
+            self._names[email] = name
+            self._names.move_to_end(email)
+        while len(self._names) > self.maxsize:
+            self._names.popitem(last=False)
+
+
+@dataclass
+class CacheStats:
+    """キャッシュのヒット率などの統計"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ReadThroughCache(Generic[T]):
+    """
+    件数と有効期限を制限した非同期の読み込みキャッシュ
+
+    キャッシュにない値は loader で読み込んで保持する。
+    同じキーの読み込みが同時に発生した場合は、1回の読み込み結果を共有する。
+    """
+
+    def __init__(self, maxsize: int = 1_000, ttl: Optional[float] = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, Tuple[T, float]]" = OrderedDict()
+        self._loading: Dict[str, "asyncio.Future[T]"] = {}
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if self.ttl is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return value
+            del self._entries[key]
+
+        self.stats.misses += 1
+        loading = self._loading.get(key)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        future: "asyncio.Future[T]" = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            # 待機しているタスクがない場合の警告を抑止する
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # 読み込み中に無効化された場合は保持しない
+            if self._loading.get(key) is future:
+                self.put(key, value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def put(self, key: str, value: T) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self._loading.pop(key, None)
+        if self._entries.pop(key, None) is not None:
+            self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        self._loading.clear()
+        self._entries.clear()
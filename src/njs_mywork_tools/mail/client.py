@@ -2,20 +2,27 @@ import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import (AsyncIterable, Dict, Iterable, List, Literal, Optional,
+                    Union)
 
 from playwright.async_api import (Browser, BrowserContext, Page,
                                   async_playwright)
 from pydantic import BaseModel
 
+from njs_mywork_tools.mail.cache import MessageIdIndex
+from njs_mywork_tools.mail.core.pool import AccountLease, SessionPool
 from njs_mywork_tools.mail.core.session import SessionManager
+from njs_mywork_tools.mail.journal import MailJournal
 from njs_mywork_tools.mail.models.message import MailMessage
+from njs_mywork_tools.mail.outbox import MailOutbox, OutboxWorker
 from njs_mywork_tools.mail.operations.receive_box import ReceiveBoxOperation
-from njs_mywork_tools.mail.operations.send import (MailSendOperation,
-                                                   SendMailMessage)
+from njs_mywork_tools.mail.operations.send import (MailAttachment,
+                                                   MailSendOperation,
+                                                   SendMailMessage,
+                                                   SendMailReport)
 from njs_mywork_tools.mail.operations.sent_box import SentBoxOperation
 from njs_mywork_tools.settings import (DenbunSetting, GoogleSheetSetting,
-                                       SurrealDBSetting)
+                                       MailStorageSetting, SurrealDBSetting)
 from njs_mywork_tools.utils.logger import setup_logger
 
 logger = setup_logger(name=__name__, log_file=Path("logs/denbun_mail.log"))
@@ -26,6 +33,14 @@ class DenbunMailClientOptions(BaseModel):
     surrealdb_setting: SurrealDBSetting
     playwright_headless: bool = False
     xlwings_visible: bool = False
+    message_id_index: Optional[Literal["set", "bloom"]] = None
+    mail_storage_setting: MailStorageSetting = MailStorageSetting()
+
+
+class MailSyncReport(BaseModel):
+    receive_saved: int
+    sent_saved: int
+    elapsed_seconds: float
 
 
 class DenbunMailClient:
@@ -40,9 +55,14 @@ class DenbunMailClient:
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.session: Optional[SessionManager] = None
+        self.session_pool: Optional[SessionPool] = None
         self.receive_box_operation: Optional[ReceiveBoxOperation] = None
         self.sent_box_operation: Optional[SentBoxOperation] = None
         self.send_operation: Optional[MailSendOperation] = None
+        # 保存済みメッセージIDのインデックスは全フォルダ・全アカウントで共有する
+        self.id_index: Optional[MessageIdIndex] = (
+            MessageIdIndex(mode=options.message_id_index) if options.message_id_index else None
+        )
 
     async def initialize(self):
         """Initialize Playwright resources"""
@@ -53,10 +73,16 @@ class DenbunMailClient:
         )
         self.context = await self.browser.new_context()
         self.page = await self.context.new_page()
-        self.send_operation = MailSendOperation(self.page)
+        self.send_operation = MailSendOperation(
+            self.page, send_api=self.options.denbun_setting.send_api
+        )
         self.session = SessionManager(self.page, self.options.denbun_setting)
-        self.receive_box_operation = ReceiveBoxOperation(self.page, self.options.surrealdb_setting)
-        self.sent_box_operation = SentBoxOperation(self.page, self.options.surrealdb_setting)
+        self.receive_box_operation = ReceiveBoxOperation(
+            self.page, self.options.surrealdb_setting, self.id_index, self.options.mail_storage_setting
+        )
+        self.sent_box_operation = SentBoxOperation(
+            self.page, self.options.surrealdb_setting, self.id_index, self.options.mail_storage_setting
+        )
         logger.info("DenbunMailClient initialized successfully")
 
     async def __aenter__(self):
@@ -69,12 +95,16 @@ class DenbunMailClient:
     async def close(self):
         """Clean up Playwright resources"""
         logger.info("Cleaning up Playwright resources...")
+        if self.session_pool:
+            await self.session_pool.close()
         if self.context:
             await self.context.close()
         if self.browser:
             await self.browser.close()
         if self.playwright:
             await self.playwright.stop()
+        # ジャーナルに残ったメールは反映を試み、反映できなかった分は次回の起動時に反映する
+        await MailJournal.close_all()
         logger.info("Cleanup completed")
 
     async def send_mail(
@@ -83,7 +113,8 @@ class DenbunMailClient:
         subject: str,
         body: str,
         cc_addresses: Optional[List[str]] = [],
-        attachment: Optional[Path] = None,
+        attachment: Optional[Union[Path, MailAttachment]] = None,
+        attachments: Optional[List[Union[Path, MailAttachment]]] = None,
     ):
         """Send mail using Denbun Mail"""
         if not self.session:
@@ -98,6 +129,7 @@ class DenbunMailClient:
                 subject=subject,
                 body=body,
                 attachment=attachment,
+                attachments=attachments or [],
             )
             await self.send_operation.send_mail(send_message)
         except Exception as e:
@@ -107,6 +139,65 @@ class DenbunMailClient:
         else:
             logger.info("Mail sent successfully")
 
+    async def send_many(
+        self,
+        messages: Union[Iterable[SendMailMessage], AsyncIterable[SendMailMessage]],
+        concurrency: int = 1,
+        min_interval: float = 0.0,
+    ) -> SendMailReport:
+        """Send multiple mails using Denbun Mail"""
+        if not self.session:
+            logger.info("Session not initialized. Initializing...")
+            await self.initialize()
+        try:
+            logger.info(f"Sending mails (concurrency: {concurrency}, interval: {min_interval})")
+            await self.session.ensure_logged_in()
+            async with self.session.keep_alive():
+                report = await self.send_operation.send_many(
+                    messages, concurrency=concurrency, min_interval=min_interval
+                )
+        except Exception as e:
+            logger.error(f"Failed to send mails: {str(e)}", exc_info=True)
+            await self.close()
+            raise Exception(f"Failed to send mails: {str(e)}")
+        else:
+            logger.info(
+                f"Mail sending completed (sent: {len(report.sent)}, failed: {len(report.failed)}, "
+                f"unknown: {len(report.unknown)})"
+            )
+            for result in report.failed:
+                logger.warning(f"Failed to send mail #{result.index} to {result.to_addresses}: {result.error}")
+            return report
+
+    async def run_outbox_worker(
+        self,
+        batch_size: int = 20,
+        concurrency: int = 1,
+        min_interval: float = 0.0,
+        stop_when_empty: bool = False,
+    ):
+        """Drain the mail outbox using Denbun Mail"""
+        if not self.session:
+            logger.info("Session not initialized. Initializing...")
+            await self.initialize()
+        try:
+            logger.info(f"Starting outbox worker (batch_size: {batch_size}, concurrency: {concurrency})")
+            worker = OutboxWorker(
+                outbox=MailOutbox(self.options.surrealdb_setting),
+                send_operation=self.send_operation,
+                session=self.session,
+                batch_size=batch_size,
+                concurrency=concurrency,
+                min_interval=min_interval,
+            )
+            await worker.run(stop_when_empty=stop_when_empty)
+        except Exception as e:
+            logger.error(f"Outbox worker failed: {str(e)}", exc_info=True)
+            await self.close()
+            raise Exception(f"Outbox worker failed: {str(e)}")
+        else:
+            logger.info("Outbox worker stopped")
+
     async def search_receive_mailbox(
         self, start_date: datetime, end_date: datetime, keyword: str):
         """Search mail using Denbun Mail"""
@@ -141,19 +232,10 @@ class DenbunMailClient:
                 f"Starting mail reception (start: {start_date}, end: {end_date}, keyword: {keyword})"
             )
             await self.session.ensure_logged_in()
-            messages = await self.receive_box_operation.search_messages(
-                start_date=start_date, end_date=end_date, keyword=keyword
-            )
-            for message in messages:
-                # メール保存条件
-                if message.sender.name == "Slack":
-                    continue
-                
-                result = await self.receive_box_operation.persist_message(message)
-                if result.is_already_exists():
-                    logger.info("Found existing message. Stopping reception.")
-                    break
-                logger.debug(f"Received message: {message.subject}")
+            async with self.session.keep_alive():
+                await self._persist_receive_box(
+                    self.receive_box_operation, start_date, end_date, keyword
+                )
 
         except Exception as e:
             logger.error(f"Failed to receive mail: {str(e)}", exc_info=True)
@@ -174,22 +256,10 @@ class DenbunMailClient:
                 f"Starting mail reception (start: {start_date}, end: {end_date}, keyword: {keyword})"
             )
             await self.session.ensure_logged_in()
-            messages: List[MailMessage] = await self.sent_box_operation.search_messages(
-                start_date=start_date, end_date=end_date, keyword=keyword
-            )
-            for message in messages:
-                
-                # 自分宛のメールは保存しない
-                to_emails = [to_address.email for to_address in message.to_addresses]
-                if message.sender.email in to_emails:
-                    continue
-                
-                # メールを永続化する
-                result = await self.sent_box_operation.persist_message(message)
-                if result.is_already_exists():
-                    logger.info("Found existing message. Stopping saving.")
-                    break
-                logger.debug(f"Saved message: {message.subject}")
+            async with self.session.keep_alive():
+                await self._persist_sent_box(
+                    self.sent_box_operation, start_date, end_date, keyword
+                )
 
         except Exception as e:
             logger.error(f"Failed to save mail: {str(e)}", exc_info=True)
@@ -198,6 +268,162 @@ class DenbunMailClient:
         else:
             logger.info("Mail saving completed successfully")
 
+    async def sync_all(
+        self, start_date: datetime, end_date: datetime, keyword: str
+    ) -> MailSyncReport:
+        """Save receive and sent mailboxes concurrently in one logged-in context"""
+        if not self.session:
+            logger.info("Session not initialized. Initializing...")
+            await self.initialize()
+        pages: List[Page] = []
+        try:
+            logger.info(
+                f"Starting mail sync (start: {start_date}, end: {end_date}, keyword: {keyword})"
+            )
+            started = asyncio.get_running_loop().time()
+            await self.session.ensure_logged_in()
+
+            # フォルダごとに別ページで操作する（Cookieを共有するためログインは不要）
+            for _ in range(2):
+                page = await self.context.new_page()
+                await page.goto(self.options.denbun_setting.url)
+                pages.append(page)
+            receive_page, sent_page = pages
+
+            # どちらかが失敗した場合はもう一方もキャンセルされる
+            async with self.session.keep_alive(), asyncio.TaskGroup() as tg:
+                receive_task = tg.create_task(self._persist_receive_box(
+                    ReceiveBoxOperation(
+                        receive_page, self.options.surrealdb_setting, self.id_index,
+                        self.options.mail_storage_setting,
+                    ),
+                    start_date, end_date, keyword,
+                ))
+                sent_task = tg.create_task(self._persist_sent_box(
+                    SentBoxOperation(
+                        sent_page, self.options.surrealdb_setting, self.id_index,
+                        self.options.mail_storage_setting,
+                    ),
+                    start_date, end_date, keyword,
+                ))
+
+            report = MailSyncReport(
+                receive_saved=receive_task.result(),
+                sent_saved=sent_task.result(),
+                elapsed_seconds=asyncio.get_running_loop().time() - started,
+            )
+        except* Exception as eg:
+            errors = ", ".join(str(e) for e in eg.exceptions)
+            logger.error(f"Failed to sync mail: {errors}", exc_info=True)
+            await self.close()
+            raise Exception(f"Failed to sync mail: {errors}")
+        else:
+            logger.info(
+                f"Mail sync completed (received: {report.receive_saved}, sent: {report.sent_saved}, "
+                f"elapsed: {report.elapsed_seconds:.1f}s)"
+            )
+            return report
+        finally:
+            for page in pages:
+                if not page.is_closed():
+                    await page.close()
+
+    async def save_mailboxes_for_accounts(
+        self,
+        accounts: List[DenbunSetting],
+        start_date: datetime,
+        end_date: datetime,
+        keyword: str,
+        max_concurrency_per_account: int = 1,
+    ) -> Dict[str, Union[int, Exception]]:
+        """Save receive and sent mailboxes of multiple accounts concurrently"""
+        if not self.browser:
+            logger.info("Browser not initialized. Initializing...")
+            await self.initialize()
+        if not self.session_pool:
+            self.session_pool = SessionPool(
+                self.browser, max_concurrency_per_account=max_concurrency_per_account
+            )
+
+        async def save_account(lease: AccountLease) -> int:
+            receive_box_operation = ReceiveBoxOperation(
+                lease.page, self.options.surrealdb_setting, self.id_index,
+                self.options.mail_storage_setting,
+            )
+            sent_box_operation = SentBoxOperation(
+                lease.page, self.options.surrealdb_setting, self.id_index,
+                self.options.mail_storage_setting,
+            )
+            saved = await self._persist_receive_box(
+                receive_box_operation, start_date, end_date, keyword
+            )
+            saved += await self._persist_sent_box(
+                sent_box_operation, start_date, end_date, keyword
+            )
+            return saved
+
+        logger.info(f"Starting mail saving for {len(accounts)} accounts")
+        results = await self.session_pool.run(accounts, save_account)
+        for key, result in results.items():
+            if isinstance(result, Exception):
+                logger.error(f"Failed to save mail for {key}: {str(result)}")
+            else:
+                logger.info(f"Saved {result} messages for {key}")
+        return results
+
+    async def _persist_receive_box(
+        self,
+        operation: ReceiveBoxOperation,
+        start_date: datetime,
+        end_date: datetime,
+        keyword: str,
+    ) -> int:
+        """受信ボックスを検索し、未保存のメールを永続化する"""
+        saved = 0
+        messages = await operation.search_messages(
+            start_date=start_date, end_date=end_date, keyword=keyword
+        )
+        for message in messages:
+            # メール保存条件
+            if message.sender.name == "Slack":
+                continue
+            
+            result = await operation.persist_message(message)
+            if result.is_already_exists():
+                logger.info("Found existing message. Stopping reception.")
+                break
+            saved += 1
+            logger.debug(f"Received message: {message.subject}")
+        return saved
+
+    async def _persist_sent_box(
+        self,
+        operation: SentBoxOperation,
+        start_date: datetime,
+        end_date: datetime,
+        keyword: str,
+    ) -> int:
+        """送信ボックスを検索し、未保存のメールを永続化する"""
+        saved = 0
+        messages: List[MailMessage] = await operation.search_messages(
+            start_date=start_date, end_date=end_date, keyword=keyword
+        )
+        for message in messages:
+            
+            # 自分宛のメールは保存しない
+            to_emails = [to_address.email for to_address in message.to_addresses]
+            if message.sender.email in to_emails:
+                continue
+            
+            # メールを永続化する
+            result = await operation.persist_message(message)
+            if result.is_already_exists():
+                logger.info("Found existing message. Stopping saving.")
+                break
+            saved += 1
+            logger.debug(f"Saved message: {message.subject}")
+        return saved
+
 
 async def main():
     from njs_mywork_tools.settings import Settings
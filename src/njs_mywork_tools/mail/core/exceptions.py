@@ -16,4 +16,8 @@ class BrowserOperationError(DeboonError):
 
 class MailOperationError(DeboonError):
     """メール操作に関する例外"""
-    pass
\ No newline at end of file
+    pass
+
+class MailDeliveryUnknownError(MailOperationError):
+    """送信を確定した後に失敗し、送信済みかどうか判別できない場合の例外"""
+    pass
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import (AsyncIterator, Awaitable, Callable, Dict, List, Optional,
+                    Tuple, TypeVar, Union)
+
+from playwright.async_api import Browser, BrowserContext, Page
+
+from njs_mywork_tools.mail.core.session import SessionManager
+from njs_mywork_tools.settings import DenbunSetting
+
+T = TypeVar("T")
+
+
+def account_key(setting: DenbunSetting) -> str:
+    """アカウントを識別するキーを返す"""
+    return f"{setting.username}@{setting.url}"
+
+
+@dataclass
+class AccountSession:
+    """アカウントごとのブラウザコンテキストと、ページごとのログインセッション"""
+
+    setting: DenbunSetting
+    context: BrowserContext
+    semaphore: asyncio.Semaphore
+    # SessionManager は再ログイン時にページを移動するため、ページごとに持つ
+    idle_pages: List[Tuple[Page, SessionManager]] = field(default_factory=list)
+    in_use: int = 0
+    last_used: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return account_key(self.setting)
+
+
+@dataclass
+class AccountLease:
+    """プールから貸し出されたページ"""
+
+    setting: DenbunSetting
+    page: Page
+    session: SessionManager
+
+
+class SessionPool:
+    """
+    複数アカウントのセッションを共有ブラウザ上で管理するプール
+
+    アカウントごとに BrowserContext を1つ作成し、初回利用時にログインする。
+    同じアカウントのページはCookieを共有するため、ログインは1回で済む。
+    ログイン状態の確認・再ログインは貸し出したページに対してのみ行う。
+    一定時間使われなかったアカウントのコンテキストは、acquire のたびに閉じる。
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        max_concurrency_per_account: int = 1,
+        idle_timeout: float = 600.0,
+    ):
+        self.browser = browser
+        self.max_concurrency_per_account = max_concurrency_per_account
+        self.idle_timeout = idle_timeout
+        self._accounts: Dict[str, AccountSession] = {}
+        self._lock = asyncio.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @asynccontextmanager
+    async def acquire(self, setting: DenbunSetting) -> AsyncIterator[AccountLease]:
+        """
+        アカウントのログイン済みページを借りる
+
+        同一アカウントの同時利用数は max_concurrency_per_account までに制限する。
+        """
+        await self.evict_idle(keep=account_key(setting))
+        account = await self._get_account(setting)
+        async with account.semaphore:
+            account.in_use += 1
+            page, session = await self._checkout_page(account)
+            try:
+                await session.ensure_logged_in()
+                yield AccountLease(setting=setting, page=page, session=session)
+            finally:
+                account.idle_pages.append((page, session))
+                account.in_use -= 1
+                account.last_used = asyncio.get_running_loop().time()
+
+    async def run(
+        self,
+        settings: List[DenbunSetting],
+        operation: Callable[[AccountLease], Awaitable[T]],
+    ) -> Dict[str, Union[T, Exception]]:
+        """
+        全アカウントに対して操作を並行実行する
+
+        1アカウントの失敗で他のアカウントは止めず、例外は結果として返す。
+
+        Returns:
+            Dict[str, Union[T, Exception]]: アカウントキーごとの結果
+        """
+        results: Dict[str, Union[T, Exception]] = {}
+
+        async def run_one(setting: DenbunSetting):
+            try:
+                async with self.acquire(setting) as lease:
+                    results[account_key(setting)] = await operation(lease)
+            except Exception as e:
+                self.logger.error(f"Operation failed for {account_key(setting)}: {str(e)}", exc_info=True)
+                results[account_key(setting)] = e
+
+        async with asyncio.TaskGroup() as tg:
+            for setting in settings:
+                tg.create_task(run_one(setting))
+        return results
+
+    async def evict_idle(self, keep: Optional[str] = None) -> int:
+        """
+        一定時間使われていないアカウントのコンテキストを閉じる
+
+        Args:
+            keep: 閉じないアカウントのキー（これから利用するアカウント）
+
+        Returns:
+            int: 閉じたアカウント数
+        """
+        now = asyncio.get_running_loop().time()
+        async with self._lock:
+            idle = [
+                account for account in self._accounts.values()
+                if account.key != keep
+                and account.in_use == 0 and now - account.last_used > self.idle_timeout
+            ]
+            for account in idle:
+                del self._accounts[account.key]
+        for account in idle:
+            await account.context.close()
+        return len(idle)
+
+    async def close(self):
+        """全アカウントのコンテキストを閉じる"""
+        async with self._lock:
+            accounts = list(self._accounts.values())
+            self._accounts.clear()
+        for account in accounts:
+            await account.context.close()
+
+    async def _get_account(self, setting: DenbunSetting) -> AccountSession:
+        key = account_key(setting)
+        async with self._lock:
+            account = self._accounts.get(key)
+            if account is None:
+                context = await self.browser.new_context()
+                page = await context.new_page()
+                account = AccountSession(
+                    setting=setting,
+                    context=context,
+                    semaphore=asyncio.Semaphore(self.max_concurrency_per_account),
+                    idle_pages=[(page, SessionManager(page, setting))],
+                )
+                self._accounts[key] = account
+            return account
+
+    async def _checkout_page(self, account: AccountSession) -> Tuple[Page, SessionManager]:
+        if account.idle_pages:
+            return account.idle_pages.pop()
+
+        # ログイン済みのCookieを共有するため、トップページを開くだけでよい
+        # （Cookieが無効な場合は ensure_logged_in でこのページから再ログインする）
+        page = await account.context.new_page()
+        await page.goto(account.setting.url)
+        return page, SessionManager(page, account.setting)
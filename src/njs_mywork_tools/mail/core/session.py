@@ -1,4 +1,7 @@
 import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 
 from playwright.async_api import Page
 
@@ -7,11 +10,22 @@ from njs_mywork_tools.settings import DenbunSetting
 
 
 class SessionManager:
-    def __init__(self, page: Page, setting: DenbunSetting):
+    """ログインセッションを管理するクラス
+
+    ログイン状態の確認結果は一定時間キャッシュし、その間はブラウザへの問い合わせを行わない。
+    同時に呼び出された場合も、ログイン処理は1つだけ実行して結果を共有する。
+    """
+
+    def __init__(self, page: Page, setting: DenbunSetting, probe_ttl: float = 60.0):
         self.page = page
         self._logged_in = False
-        self._last_activity = None
+        self._last_activity: Optional[float] = None
+        self._last_verified: Optional[float] = None
+        self._login_lock = asyncio.Lock()
         self.setting = setting
+        # セッションタイムアウトより前に必ず再確認する
+        self.probe_ttl = min(probe_ttl, setting.session_timeout / 2)
+        self.logger = logging.getLogger(__name__)
 
     @property
     def is_logged_in(self) -> bool:
@@ -20,48 +34,117 @@ class SessionManager:
     async def ensure_logged_in(self):
         """ログイン状態を確認し、必要に応じて再ログインを行う"""
         try:
-            # ログイン状態チェック（例：特定の要素の有無で判断）
-            is_logged_in = await self._check_login_status()
-            if not is_logged_in:
-                await self.login()
+            if self._is_verified_recently():
+                return
+
+            async with self._login_lock:
+                # 待機中に他の呼び出し元がログインを済ませていれば何もしない
+                if self._is_verified_recently():
+                    return
+
+                if await self._check_login_status():
+                    # 同じコンテキストの別のページでログイン済みの場合も含む
+                    self._logged_in = True
+                    self._mark_verified()
+                else:
+                    await self._login()
         except Exception as e:
             raise SessionError(f"ログイン状態の確認に失敗: {str(e)}")
 
     async def login(self):
         """ログイン処理を実行"""
+        async with self._login_lock:
+            await self._login()
+
+    async def _login(self):
         try:
+            self._logged_in = False
+
             # ログインページに移動
             await self.page.goto(self.setting.url)
-            
+
             # ログインフォームの入力
             await self.page.fill('input[name="UserID"]', self.setting.username)
             await self.page.fill('input[name="_word"]', self.setting.password)
-            
+
             # ログインボタンクリック
             await self.page.get_by_role("button", name="ログイン").click()
-            
+
             # ログイン成功の確認
             await self.page.wait_for_selector(
-                'body[data-page=MailList]', 
+                'body[data-page=MailList]',
                 timeout=10000
             )
-            
+
             self._logged_in = True
-            self._last_activity = asyncio.get_running_loop().time()
+            self._mark_verified()
         except Exception as e:
             raise SessionError(f"ログインに失敗: {str(e)}")
 
     async def _check_login_status(self) -> bool:
-        """ログイン状態をチェック"""
+        """ログイン状態をチェック
+
+        ページと同じCookieでトップページを取得し、ログインフォームが返らないことを確認する。
+        表示中の画面には依存しないため、作成画面や送信ボックスに移動した後も
+        再ログインにはならない。このリクエストによりサーバー側のセッションも延長される。
+        """
         try:
-            # セッション有効性の確認（例：特定の要素の存在確認）
-            dashboard = await self.page.query_selector('.dashboard')
-            return dashboard is not None
+            response = await self.page.context.request.get(self.setting.url)
+            if not response.ok:
+                return False
+            return 'name="UserID"' not in await response.text()
         except Exception:
             return False
 
+    def _is_verified_recently(self) -> bool:
+        if not self._logged_in or self._last_verified is None:
+            return False
+        return (self._now() - self._last_verified) < self.probe_ttl
+
+    def _mark_verified(self):
+        self._last_verified = self._now()
+        self._last_activity = self._last_verified
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
     async def refresh_session(self):
-        """セッションの更新が必要な場合に実行"""
-        current_time = asyncio.get_event_loop().time()
-        if (current_time - self._last_activity) > self.setting.session_timeout:
-            await self.login()
\ No newline at end of file
+        """
+        セッションの更新が必要な場合に実行
+
+        長時間の処理中は keep_alive により定期的に呼び出される。
+        """
+        if self._last_activity is None:
+            await self.ensure_logged_in()
+            return
+        if (self._now() - self._last_activity) > self.probe_ttl:
+            self._last_verified = None
+            await self.ensure_logged_in()
+
+    @asynccontextmanager
+    async def keep_alive(self) -> AsyncIterator[None]:
+        """
+        ブロック内の処理中、定期的にセッションを更新する
+
+        probe_ttl の半分ごとに確認し、最後の確認から probe_ttl（セッションタイムアウトの
+        半分以下）を過ぎていればログイン状態の確認リクエストを送る。このリクエストで
+        サーバー側のセッションが延長されるため、長時間の処理でも途中で切れることはない。
+        """
+        async def refresh_periodically():
+            while True:
+                await asyncio.sleep(self.probe_ttl / 2)
+                try:
+                    await self.refresh_session()
+                except SessionError as e:
+                    # 次の操作時の ensure_logged_in で改めて再ログインする
+                    self.logger.warning(f"セッションの更新に失敗しました: {str(e)}")
+
+        task = asyncio.create_task(refresh_periodically())
+        try:
+            yield
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
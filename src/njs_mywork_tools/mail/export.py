@@ -0,0 +1,207 @@
+"""メールメッセージの Parquet 形式へのエクスポート
+
+pandas や DuckDB で分析できるよう、年・月ごとにパーティション分割した
+Parquet ファイル（output_dir/year=YYYY/month=MM/part-0.parquet）に書き出す。
+"""
+
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.store import MailStore
+
+_CONTACT = pa.struct([("email", pa.string()), ("name", pa.string())])
+
+MAIL_EXPORT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("subject", pa.string()),
+    ("mail_date", pa.timestamp("us")),
+    ("body", pa.string()),
+    ("sender", _CONTACT),
+    ("to_addresses", pa.list_(_CONTACT)),
+    ("cc_addresses", pa.list_(_CONTACT)),
+    ("attachments", pa.list_(pa.string())),
+])
+
+PARTITION_FILE = "part-0.parquet"
+_PARTITION_PATTERN = re.compile(r"year=(\d{4})/month=(\d{2})$")
+
+Partition = Tuple[int, int]
+
+
+def _contact(contact: ContactPerson) -> dict:
+    return {"email": contact.email, "name": contact.name}
+
+
+def to_record_batch(messages: List[MailMessage]) -> pa.RecordBatch:
+    return pa.RecordBatch.from_pydict(
+        {
+            "id": [m.id for m in messages],
+            "subject": [m.subject for m in messages],
+            "mail_date": [m.mail_date for m in messages],
+            "body": [m.body for m in messages],
+            "sender": [_contact(m.sender) for m in messages],
+            "to_addresses": [[_contact(c) for c in m.to_addresses] for m in messages],
+            "cc_addresses": [[_contact(c) for c in m.cc_addresses] for m in messages],
+            "attachments": [list(m.attachments) for m in messages],
+        },
+        schema=MAIL_EXPORT_SCHEMA,
+    )
+
+
+def from_record_batch(batch: Union[pa.RecordBatch, pa.Table]) -> List[MailMessage]:
+    """Parquet から読み込んだ行をメールメッセージに戻す"""
+    return [
+        MailMessage(
+            id=row["id"],
+            subject=row["subject"],
+            mail_date=row["mail_date"],
+            body=row["body"],
+            sender=ContactPerson(**row["sender"]),
+            to_addresses=[ContactPerson(**c) for c in row["to_addresses"]],
+            cc_addresses=[ContactPerson(**c) for c in row["cc_addresses"]],
+            attachments=list(row["attachments"]),
+        )
+        for row in batch.to_pylist()
+    ]
+
+
+def partition_of(mail_date: datetime) -> Partition:
+    return (mail_date.year, mail_date.month)
+
+
+def _month_floor(value: datetime) -> datetime:
+    """月の初日の0時を返す"""
+    return datetime(value.year, value.month, 1)
+
+
+def _month_ceil(value: datetime) -> datetime:
+    """月末の最後の時刻を返す"""
+    if (value.year, value.month) == (datetime.max.year, datetime.max.month):
+        return datetime.max
+    year, month = (value.year + 1, 1) if value.month == 12 else (value.year, value.month + 1)
+    return datetime(year, month, 1) - timedelta(microseconds=1)
+
+
+def partition_path(output_dir: Path, partition: Partition) -> Path:
+    year, month = partition
+    return output_dir / f"year={year:04d}" / f"month={month:02d}" / PARTITION_FILE
+
+
+def existing_partitions(output_dir: Path) -> List[Partition]:
+    """書き出し済みのパーティションを古い順に返す"""
+    partitions = []
+    for path in output_dir.glob(f"year=*/month=*/{PARTITION_FILE}"):
+        match = _PARTITION_PATTERN.search(path.parent.relative_to(output_dir).as_posix())
+        if match:
+            partitions.append((int(match.group(1)), int(match.group(2))))
+    return sorted(partitions)
+
+
+class _PartitionWriter:
+    """1つのパーティションへ書き込み、完了時に一時ファイルを置き換える"""
+
+    def __init__(self, output_dir: Path, partition: Partition):
+        self.partition = partition
+        self.path = partition_path(output_dir, partition)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_suffix(".parquet.tmp")
+        self._writer = pq.ParquetWriter(self._tmp_path, MAIL_EXPORT_SCHEMA, compression="zstd")
+
+    def write(self, messages: List[MailMessage]) -> None:
+        self._writer.write_batch(to_record_batch(messages))
+
+    def commit(self) -> Path:
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self._writer.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class MailParquetExporter:
+    """
+    メールメッセージを年・月ごとの Parquet ファイルに書き出すクラス
+
+    メッセージは日時順に batch_size 件ずつ読み込み、そのまま行グループとして
+    書き込むため、件数が多くてもメモリ使用量は一定となる。
+    incremental の場合は、既存の最新パーティション（書き出し後に追加されたメールが
+    ある可能性がある）とそれ以降のみを書き出し、それより前のパーティションは残す。
+    """
+
+    def __init__(self, store: MailStore, output_dir: Path, batch_size: int = 1000):
+        self.store = store
+        self.output_dir = Path(output_dir)
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def existing_partitions(self) -> List[Partition]:
+        """書き出し済みのパーティションを古い順に返す"""
+        return existing_partitions(self.output_dir)
+
+    async def export(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        incremental: bool = True,
+    ) -> List[Path]:
+        """
+        期間内のメールメッセージをパーティションごとに書き出す
+
+        パーティションは月単位で置き換えるため、start・end が月の途中の場合も
+        その月全体を書き出す（月の一部のメールだけでパーティションを上書きしない）。
+
+        Args:
+            start: 書き出し開始日時。省略時は最初から
+            end: 書き出し終了日時。省略時は最後まで
+            incremental: 書き出し済みのパーティションのうち、最新より前のものを省略する
+
+        Returns:
+            List[Path]: 書き出したパーティションのファイル
+        """
+        start = _month_floor(start or datetime.min)
+        end = _month_ceil(end or datetime.max)
+        if incremental:
+            existing = self.existing_partitions()
+            if existing:
+                year, month = existing[-1]
+                start = max(start, datetime(year, month, 1))
+
+        written: List[Path] = []
+        writer: Optional[_PartitionWriter] = None
+        buffer: List[MailMessage] = []
+        try:
+            async for message in self.store.iter_messages(start, end, batch_size=self.batch_size):
+                partition = partition_of(message.mail_date)
+                if writer is None or writer.partition != partition:
+                    if writer is not None:
+                        if buffer:
+                            writer.write(buffer)
+                            buffer = []
+                        written.append(writer.commit())
+                    writer = _PartitionWriter(self.output_dir, partition)
+                buffer.append(message)
+                if len(buffer) >= self.batch_size:
+                    writer.write(buffer)
+                    buffer = []
+
+            if writer is not None:
+                if buffer:
+                    writer.write(buffer)
+                written.append(writer.commit())
+                writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
+
+        self.logger.info(f"Exported {len(written)} partitions to {self.output_dir}")
+        return written
@@ -0,0 +1,452 @@
+"""メール保存の書き込みジャーナル
+
+データベースが停止・遅延していてもクロールを継続できるよう、保存するメールを
+ローカルの追記専用ファイルに書き込み、バックグラウンドでデータベースに反映する。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import (Any, AsyncIterator, ClassVar, Dict, Iterable, List,
+                    Optional, Set, Tuple, Union)
+
+from njs_mywork_tools.mail.cache import MessageIdIndex
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.models.search import (MailSearchFilters,
+                                                 MailSearchResult)
+from njs_mywork_tools.mail.store import MailStore
+
+
+def _dump(message: MailMessage) -> bytes:
+    record = {**asdict(message), "mail_date": message.mail_date.isoformat()}
+    return json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _load(line: bytes) -> MailMessage:
+    record: Dict[str, Any] = json.loads(line)
+    return MailMessage(
+        id=record["id"],
+        subject=record["subject"],
+        mail_date=datetime.fromisoformat(record["mail_date"]),
+        body=record["body"],
+        sender=ContactPerson(**record["sender"]),
+        to_addresses=[ContactPerson(**c) for c in record["to_addresses"]],
+        cc_addresses=[ContactPerson(**c) for c in record["cc_addresses"]],
+        attachments=record["attachments"],
+    )
+
+
+class MailJournal:
+    """
+    保存待ちのメールを1行1件の JSON で追記するジャーナルファイル
+
+    データベースへの反映が完了した位置は <path>.offset に記録し、起動時には
+    その位置以降を未反映として読み込む。ファイルへの書き込みは毎回行うが、
+    fsync は sync_every 件ごと、または sync_interval 秒ごとにまとめて行う。
+    すべて反映済みになった時点でファイルを空にする。
+    データベースが受け付けないメールは <path>.dead に同じ形式で移す。
+    """
+
+    _shared: ClassVar[Dict[Tuple[str, int], "MailJournal"]] = {}
+
+    def __init__(self, path: Union[str, Path], sync_every: int = 100, sync_interval: float = 1.0):
+        self.path = Path(path)
+        self.offset_path = self.path.with_name(self.path.name + ".offset")
+        self.dead_letter_path = self.path.with_name(self.path.name + ".dead")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.flusher: Optional["JournalFlusher"] = None
+        self._lock = asyncio.Lock()
+        self._file = None
+        self._offset = 0
+        self._pending: Set[str] = set()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def shared(cls, path: Union[str, Path]) -> "MailJournal":
+        """ファイルとイベントループごとに共有されるジャーナルを返す"""
+        key = (str(Path(path).resolve()), id(asyncio.get_running_loop()))
+        journal = cls._shared.get(key)
+        if journal is None:
+            journal = cls(path)
+            cls._shared[key] = journal
+        return journal
+
+    @classmethod
+    async def close_all(cls) -> None:
+        """共有しているジャーナルの反映を停止し、ファイルを閉じる"""
+        journals, cls._shared = list(cls._shared.values()), {}
+        for journal in journals:
+            await journal.close()
+
+    @property
+    def offset(self) -> int:
+        """データベースへの反映が完了した位置"""
+        return self._offset
+
+    @property
+    def pending_ids(self) -> Set[str]:
+        """未反映のメッセージID"""
+        return set(self._pending)
+
+    async def open(self) -> None:
+        if self._file is not None:
+            return
+        async with self._lock:
+            if self._file is None:
+                await asyncio.to_thread(self._open)
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        size = self._file.seek(0, os.SEEK_END)
+
+        # 書き込み途中で停止した末尾の行は破棄する
+        self._file.seek(0)
+        data = self._file.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < size:
+            self.logger.warning(f"Discarding incomplete journal record ({size - complete} bytes)")
+            self._file.truncate(complete)
+
+        try:
+            self._offset = int(self.offset_path.read_text())
+        except (FileNotFoundError, ValueError):
+            self._offset = 0
+        if self._offset > complete:
+            self._offset = 0
+
+        for line in data[self._offset:complete].splitlines():
+            try:
+                self._pending.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue
+        if self._pending:
+            self.logger.info(f"Replaying {len(self._pending)} journaled messages")
+
+    async def append_many(self, messages: List[MailMessage]) -> None:
+        """メールをジャーナルに追記する"""
+        await self.open()
+        data = b"".join(_dump(message) for message in messages)
+        async with self._lock:
+            await asyncio.to_thread(self._write, data)
+            self._pending.update(message.id for message in messages)
+            self._unsynced += len(messages)
+            if (
+                self._unsynced >= self.sync_every
+                or time.monotonic() - self._last_sync >= self.sync_interval
+            ):
+                await self._sync()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+
+    async def sync(self) -> None:
+        """追記済みの内容をディスクに書き込む"""
+        if self._file is None or not self._unsynced:
+            return
+        async with self._lock:
+            await self._sync()
+
+    async def _sync(self) -> None:
+        await asyncio.to_thread(os.fsync, self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    async def read_pending(self, limit: int) -> Tuple[List[MailMessage], int]:
+        """
+        未反映のメールを先頭から最大 limit 件読み込む
+
+        Returns:
+            Tuple[List[MailMessage], int]: メールと、読み込んだ範囲の終了位置
+        """
+        await self.open()
+        async with self._lock:
+            return await asyncio.to_thread(self._read, limit)
+
+    def _read(self, limit: int) -> Tuple[List[MailMessage], int]:
+        messages: List[MailMessage] = []
+        offset = self._offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while len(messages) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    messages.append(_load(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    self.logger.error(f"Skipping corrupt journal record: {e}")
+        return messages, offset
+
+    async def commit(self, offset: int, message_ids: Iterable[str]) -> None:
+        """指定した位置までの反映完了を記録する"""
+        async with self._lock:
+            self._pending.difference_update(message_ids)
+            await asyncio.to_thread(self._commit, offset)
+
+    def _commit(self, offset: int) -> None:
+        if offset >= self._file.seek(0, os.SEEK_END):
+            # すべて反映済みのためファイルを空にする
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            offset = 0
+            self._pending.clear()
+        tmp_path = self.offset_path.with_name(self.offset_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+        self._offset = offset
+
+    async def dead_letter(self, messages: List[MailMessage]) -> None:
+        """反映できないメールを <path>.dead に追記する（ジャーナルと同じ形式のため、戻せば再反映される）"""
+        data = b"".join(_dump(message) for message in messages)
+        await asyncio.to_thread(self._write_dead_letter, data)
+
+    def _write_dead_letter(self, data: bytes) -> None:
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def close(self) -> None:
+        if self.flusher:
+            await self.flusher.stop()
+            self.flusher = None
+        if self._file is not None:
+            await self.sync()
+            self._file.close()
+            self._file = None
+
+
+class JournalFlusher:
+    """
+    ジャーナルのメールを batch_size 件ずつデータベースに反映するクラス
+
+    反映に失敗した場合は間隔を倍にしながら再試行する。保存は上書きで行われるため、
+    反映済みの位置を記録する前に停止した場合も、再度反映するだけでよい。
+
+    同じバッチが max_attempts 回続けて失敗した場合は1件ずつ保存し、他のメールは
+    保存できたのに失敗したメールはデッドレターに移して先に進む。すべて失敗した場合は
+    データベースの停止とみなし、メールを移さずに再試行を続ける。
+    """
+
+    def __init__(
+        self,
+        journal: MailJournal,
+        store: MailStore,
+        batch_size: int = 500,
+        interval: float = 1.0,
+        max_backoff: float = 60.0,
+        max_attempts: int = 5,
+    ):
+        self.journal = journal
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def notify(self) -> None:
+        """追記があったことを通知する"""
+        self._wakeup.set()
+
+    async def drain_once(self) -> int:
+        """
+        未反映のメールを1バッチ分反映する
+
+        Returns:
+            int: ジャーナルから読み込んだ件数
+        """
+        messages, offset = await self.journal.read_pending(self.batch_size)
+        if offset == self.journal.offset:
+            return 0
+        # 同じメールが複数回追記されている場合は最後のものを保存する
+        latest = {message.id: message for message in messages}
+        try:
+            await self.store.save_many(list(latest.values()))
+        except Exception:
+            self._failures += 1
+            if self._failures < self.max_attempts:
+                raise
+            await self._save_each(list(latest.values()))
+        self._failures = 0
+        await self.journal.commit(offset, latest)
+        return len(messages)
+
+    async def _save_each(self, messages: List[MailMessage]) -> None:
+        """1件ずつ保存し、保存できないメールをデッドレターに移す"""
+        failed: List[MailMessage] = []
+        error: Optional[Exception] = None
+        for message in messages:
+            try:
+                await self.store.save(message)
+            except Exception as e:
+                failed.append(message)
+                error = e
+        if failed and len(failed) == len(messages):
+            raise error
+        if failed:
+            self.logger.error(
+                f"Moved {len(failed)} journal records to {self.journal.dead_letter_path}: {error}"
+            )
+            await self.journal.dead_letter(failed)
+
+    async def run(self) -> None:
+        backoff = self.interval
+        while True:
+            try:
+                await self.journal.sync()
+                drained = await self.drain_once()
+                backoff = self.interval
+            except Exception as e:
+                if self._stopping:
+                    self.logger.error(f"Stopped with unflushed journal records: {e}")
+                    return
+                self.logger.warning(f"Failed to flush journal, retrying in {backoff:.0f}s: {e}")
+                await self._sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            if drained >= self.batch_size:
+                continue
+            if self._stopping:
+                return
+            await self._sleep(self.interval)
+
+    async def _sleep(self, seconds: float) -> None:
+        """指定秒数、または追記・停止の通知があるまで待機する"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def stop(self) -> None:
+        """未反映のメールを反映してから停止する（反映に失敗した分は次回の起動時に反映する）"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+
+class JournaledMailStore(MailStore):
+    """
+    保存をジャーナルへの追記で完了とし、データベースへはバックグラウンドで反映する保存先
+
+    読み込みは元の保存先にそのまま委譲する。
+    """
+
+    def __init__(
+        self,
+        store: MailStore,
+        journal_path: Union[str, Path],
+        batch_size: int = 500,
+        id_index: Optional[MessageIdIndex] = None,
+        check_timeout: float = 1.0,
+        check_retry_after: float = 30.0,
+    ):
+        self.store = store
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.id_index = id_index
+        self.check_timeout = check_timeout
+        self.check_retry_after = check_retry_after
+        self._check_suspended_until = 0.0
+
+    async def _journal(self) -> MailJournal:
+        journal = MailJournal.shared(self.journal_path)
+        await journal.open()
+        if journal.flusher is None:
+            journal.flusher = JournalFlusher(journal, self.store, batch_size=self.batch_size)
+            journal.flusher.start()
+        return journal
+
+    async def save_many(self, mail_messages: List[MailMessage]) -> None:
+        """メールをジャーナルに追記する（データベースへはバックグラウンドで反映する）"""
+        if not mail_messages:
+            return
+        journal = await self._journal()
+        await journal.append_many(mail_messages)
+        journal.flusher.notify()
+
+    async def exists_many(self, message_ids: Iterable[str]) -> Set[str]:
+        """
+        指定されたIDのうち、保存済みまたはジャーナルに追記済みのものを返す
+
+        ジャーナルとIDインデックスで判定できないIDのみデータベースに問い合わせる。
+        データベースが check_timeout 秒以内に応答しない場合は未保存として扱い
+        （保存は上書きのため、再度保存しても重複しない）、check_retry_after 秒間は
+        問い合わせを行わない。データベースの遅延でクロールが止まることはない。
+        """
+        journal = await self._journal()
+        pending = journal.pending_ids
+        found: Set[str] = set()
+        unknown: List[str] = []
+        for message_id in dict.fromkeys(message_ids):
+            contained = (
+                True if message_id in pending
+                else self.id_index.contains(message_id) if self.id_index
+                else None
+            )
+            if contained is None:
+                unknown.append(message_id)
+            elif contained:
+                found.add(message_id)
+
+        if unknown and time.monotonic() >= self._check_suspended_until:
+            try:
+                found |= await asyncio.wait_for(
+                    self.store.exists_many(unknown), self.check_timeout
+                )
+            except Exception as e:
+                self._check_suspended_until = time.monotonic() + self.check_retry_after
+                logging.getLogger(__name__).warning(
+                    f"Failed to check stored messages, skipping checks for "
+                    f"{self.check_retry_after:.0f}s: {e!r}"
+                )
+        return found
+
+    async def delete_many(self, message_ids: Iterable[str]) -> None:
+        await self.store.delete_many(message_ids)
+
+    async def find_by_id(self, message_id: str) -> MailMessage:
+        return await self.store.find_by_id(message_id)
+
+    async def search(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        return await self.store.search(text, filters, limit)
+
+    def iter_messages(
+        self,
+        start: datetime,
+        end: datetime,
+        sender: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[MailMessage]:
+        return self.store.iter_messages(start, end, sender, batch_size)
@@ -2,8 +2,13 @@
 Mail models package for mail data structures
 """ 
 
-from .entities import (AttachmentEntity, ContactEntity, MailMessageEntity,
-                       RecipientEntity, RecipientType, SenderEntity)
+from .entities import (AttachmentEntity, ContactEntity,
+                       EmbeddedAttachmentEntity, EmbeddedContactEntity,
+                       EmbeddedMailMessageEntity, EmbeddedRecipientEntity,
+                       MailBodyEntity, MailMessageEntity, RecipientEntity,
+                       RecipientType, SenderEntity)
+from .search import (MailCorrespondent, MailDailyCount, MailSearchFilters,
+                     MailSearchResult)
 
 __all__ = [
     "MailMessageEntity", 
@@ -12,4 +17,13 @@ __all__ = [
     "ContactEntity", 
     "SenderEntity",
     "RecipientType",
+    "EmbeddedMailMessageEntity",
+    "EmbeddedContactEntity",
+    "EmbeddedRecipientEntity",
+    "EmbeddedAttachmentEntity",
+    "MailBodyEntity",
+    "MailSearchFilters",
+    "MailSearchResult",
+    "MailCorrespondent",
+    "MailDailyCount",
 ]
@@ -53,3 +53,40 @@ class MailMessageEntity(BaseModel):
     recipients: list[RecipientEntity]
     attachments: list[AttachmentEntity]
 
+
+
+class EmbeddedContactEntity(BaseModel):
+    """メッセージに埋め込む連絡先"""
+    email: str
+    name: Optional[str] = None
+
+
+class EmbeddedRecipientEntity(EmbeddedContactEntity):
+    """メッセージに埋め込む受信者"""
+    recipient_type: RecipientType
+
+
+class EmbeddedAttachmentEntity(BaseModel):
+    """メッセージに埋め込む添付ファイル"""
+    file_path: str
+
+
+class EmbeddedMailMessageEntity(BaseModel):
+    """送信者・受信者・添付ファイルを埋め込んだメールメッセージのデータモデル"""
+    id: str
+    layout: str = "embedded"
+    subject: str
+    mail_date: str
+    body: str
+    sender: EmbeddedContactEntity
+    recipients: list[EmbeddedRecipientEntity]
+    attachments: list[EmbeddedAttachmentEntity]
+
+
+class MailBodyEntity(BaseModel):
+    """内容のハッシュをIDとして保存するメール本文"""
+    id: str
+    codec: str
+    data: str
+    size: int
+    stored_size: int
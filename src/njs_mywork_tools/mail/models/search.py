@@ -0,0 +1,48 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+
+@dataclass
+class MailSearchFilters:
+    """全文検索の絞り込み条件を表現するデータモデル"""
+
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    sender: Optional[str] = None
+
+
+@dataclass
+class MailSearchResult:
+    """全文検索の結果を表現するデータモデル"""
+
+    id: str
+    subject: str
+    mail_date: datetime
+    score: float
+    subject_highlight: str
+    body_highlight: str
+
+
+@dataclass
+class MailCorrespondent:
+    """やり取りのある連絡先と、やり取りしたメールの件数・期間を表現するデータモデル"""
+
+    email: str
+    name: Optional[str]
+    sent_count: int
+    received_count: int
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+
+    @property
+    def total_count(self) -> int:
+        return self.sent_count + self.received_count
+
+
+@dataclass
+class MailDailyCount:
+    """日ごとのメールの件数を表現するデータモデル"""
+
+    day: date
+    message_count: int
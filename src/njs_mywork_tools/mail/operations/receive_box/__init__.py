@@ -3,9 +3,12 @@
 このモジュールは、メールの受信ボックスに関する操作を提供します。
 """
 
+from typing import Optional
+
 from playwright.async_api import Page
 
-from njs_mywork_tools.settings import SurrealDBSetting
+from njs_mywork_tools.mail.cache import MessageIdIndex
+from njs_mywork_tools.settings import MailStorageSetting, SurrealDBSetting
 
 from .persistence import ReceiveBoxPersistenceOperation
 from .search import ReceiveBoxSearchOperation
@@ -14,8 +17,16 @@ from .search import ReceiveBoxSearchOperation
 class ReceiveBoxOperation:
     """受信ボックスに関する操作をまとめるクラス"""
 
-    def __init__(self, page: Page, surrealdb_setting: SurrealDBSetting):
-        self.persistence_operation = ReceiveBoxPersistenceOperation(surrealdb_setting)
+    def __init__(
+        self,
+        page: Page,
+        surrealdb_setting: SurrealDBSetting,
+        id_index: Optional[MessageIdIndex] = None,
+        storage_setting: Optional[MailStorageSetting] = None,
+    ):
+        self.persistence_operation = ReceiveBoxPersistenceOperation(
+            surrealdb_setting, id_index, storage_setting
+        )
         self.search_operation = ReceiveBoxSearchOperation(page)
 
     async def persist_message(self, message):
@@ -1,9 +1,46 @@
 import asyncio
+import base64
+import logging
+import mimetypes
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from string import Template
+from typing import (Any, AsyncIterable, Dict, Iterable, List, Optional,
+                    Union)
 
-from playwright.async_api import Page
-from pydantic import BaseModel
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import FilePayload, Page
+from pydantic import BaseModel, field_serializer, field_validator
+
+from njs_mywork_tools.mail.core.exceptions import (MailDeliveryUnknownError,
+                                                    MailOperationError)
+from njs_mywork_tools.mail.operations.sent_box.search import \
+    SentBoxSearchOperation
+from njs_mywork_tools.settings import DenbunSendApiSetting
+
+
+class MailAttachment(BaseModel):
+    """メモリ上の添付ファイル"""
+
+    name: str
+    mime_type: str = "application/octet-stream"
+    data: bytes
+
+    @field_validator("data", mode="before")
+    @classmethod
+    def _decode_data(cls, value: Any) -> Any:
+        # JSONから復元する場合はBase64文字列で渡される
+        if isinstance(value, str):
+            return base64.b64decode(value)
+        return value
+
+    @field_serializer("data", when_used="json")
+    def _encode_data(self, value: bytes) -> str:
+        return base64.b64encode(value).decode("ascii")
+
+    def to_file_payload(self) -> FilePayload:
+        """Playwright の set_files に渡せる形式に変換する"""
+        return {"name": self.name, "mimeType": self.mime_type, "buffer": self.data}
 
 
 class SendMailMessage(BaseModel):
@@ -13,48 +50,346 @@ class SendMailMessage(BaseModel):
     cc_addresses: List[str]
     subject: str
     body: str
-    attachment: Optional[Path] = None
+    attachment: Optional[Union[MailAttachment, Path]] = None
+    attachments: List[Union[MailAttachment, Path]] = []
+    variables: Dict[str, str] = {}
+
+    def render(self) -> "SendMailMessage":
+        """差し込み変数を件名・本文に適用したメッセージを返す
+
+        変数は ``$name`` / ``${name}`` 形式で指定する。
+        未定義の変数はそのまま残す。
+        """
+        if not self.variables:
+            return self
+        return self.model_copy(update={
+            "subject": Template(self.subject).safe_substitute(self.variables),
+            "body": Template(self.body).safe_substitute(self.variables),
+            "variables": {},
+        })
+
+    def attachment_payloads(self) -> List[FilePayload]:
+        """添付ファイルの一覧をメモリ上の内容として返す"""
+        files = [self.attachment] if self.attachment else []
+        payloads = []
+        for file in [*files, *self.attachments]:
+            if isinstance(file, Path):
+                mime_type, _ = mimetypes.guess_type(file.name)
+                file = MailAttachment(
+                    name=file.name,
+                    mime_type=mime_type or "application/octet-stream",
+                    data=file.read_bytes(),
+                )
+            payloads.append(file.to_file_payload())
+        return payloads
+
+    def attachment_files(self) -> Union[List[Path], List[FilePayload]]:
+        """
+        添付ファイルの一覧を set_files に渡せる形式で返す
+
+        set_files はファイルパスとメモリ上の内容の混在を受け付けないため、
+        メモリ上の添付ファイルが1つでもある場合はすべてメモリ上の内容として返す。
+        """
+        files = [self.attachment] if self.attachment else []
+        files = [*files, *self.attachments]
+        if any(isinstance(file, MailAttachment) for file in files):
+            return self.attachment_payloads()
+        return files
+
+
+class SendMailResult(BaseModel):
+    """メール1通分の送信結果"""
+
+    index: int
+    to_addresses: List[str]
+    subject: str
+    success: bool
+    error: Optional[str] = None
+    # 送信を確定した後に失敗し、送信済みの可能性がある場合はTrue
+    unknown: bool = False
+
+
+class SendMailReport(BaseModel):
+    """一括送信の結果レポート"""
+
+    results: List[SendMailResult] = []
+
+    @property
+    def sent(self) -> List[SendMailResult]:
+        return [r for r in self.results if r.success]
+
+    @property
+    def failed(self) -> List[SendMailResult]:
+        return [r for r in self.results if not r.success]
+
+    @property
+    def unknown(self) -> List[SendMailResult]:
+        return [r for r in self.results if r.unknown]
+
+
+class _RateLimiter:
+    """送信間隔を全ワーカーで共有して制御する"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._last = 0.0
+
+    async def wait(self):
+        if self.min_interval <= 0:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._last + self.min_interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last = loop.time()
+
 
 class MailSendOperation:
-    """メール送信操作を行うクラス"""
+    """メール送信操作を行うクラス
+
+    send_api が設定されている場合は、作成画面を操作せずにログイン中の
+    セッションのCookieで送信フォームへ直接POSTする。
+    サーバーが送信を拒否し（4xx）、送信ボックスにも見つからない場合のみ
+    従来の画面操作による送信にフォールバックする。タイムアウトや5xx等、
+    送信されたかどうか判別できない場合は二重送信を避けるためフォールバックしない。
+    """
 
-    def __init__(self, page: Page):
+    def __init__(self, page: Page, send_api: Optional[DenbunSendApiSetting] = None):
         self.page = page
+        self.send_api = send_api
+        self.logger = logging.getLogger(__name__)
 
     async def send_mail(self, message: SendMailMessage) -> None:
         """メールを送信する"""
+        await self._deliver(self.page, message.render())
+
+    async def send_many(
+        self,
+        messages: Union[Iterable[SendMailMessage], AsyncIterable[SendMailMessage]],
+        concurrency: int = 1,
+        min_interval: float = 0.0,
+        report: Optional[SendMailReport] = None,
+    ) -> SendMailReport:
+        """
+        複数のメールを一括送信する
+
+        ログイン済みのコンテキスト上に最大 concurrency 枚のページを用意し、
+        各ページで作成ポップアップを順に開いて送信する。
+        1通の失敗で全体を止めず、結果はレポートにまとめて返す。
+
+        Args:
+            messages: 送信するメッセージ（リストまたは非同期イテレータ）
+            concurrency: 同時に使用するページ数
+            min_interval: 送信開始の最小間隔（秒）。全ページで共有する
+            report: 結果を書き込むレポート。途中で例外が発生した場合も、
+                それまでの結果が書き込まれている
+
+        Returns:
+            SendMailReport: メッセージごとの送信結果
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        limiter = _RateLimiter(min_interval)
+        report = report if report is not None else SendMailReport()
+
+        pages = [self.page]
+        for _ in range(concurrency - 1):
+            page = await self.page.context.new_page()
+            await page.goto(self.page.url)
+            pages.append(page)
+
+        async def produce():
+            index = 0
+            if isinstance(messages, AsyncIterable):
+                async for message in messages:
+                    await queue.put((index, message))
+                    index += 1
+            else:
+                for message in messages:
+                    await queue.put((index, message))
+                    index += 1
+            for _ in pages:
+                await queue.put(None)
+
+        async def consume(page: Page):
+            while (item := await queue.get()) is not None:
+                index, message = item
+                message = message.render()
+                await limiter.wait()
+                try:
+                    await self._deliver(page, message)
+                    report.results.append(SendMailResult(
+                        index=index,
+                        to_addresses=message.to_addresses,
+                        subject=message.subject,
+                        success=True,
+                    ))
+                except asyncio.CancelledError:
+                    # 送信の途中で中断したため、送信済みかどうか判別できない
+                    report.results.append(SendMailResult(
+                        index=index,
+                        to_addresses=message.to_addresses,
+                        subject=message.subject,
+                        success=False,
+                        error="送信中に中断しました",
+                        unknown=True,
+                    ))
+                    raise
+                except Exception as e:
+                    report.results.append(SendMailResult(
+                        index=index,
+                        to_addresses=message.to_addresses,
+                        subject=message.subject,
+                        success=False,
+                        error=str(e),
+                        unknown=isinstance(e, MailDeliveryUnknownError),
+                    ))
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(produce())
+                for page in pages:
+                    tg.create_task(consume(page))
+        finally:
+            for page in pages[1:]:
+                await page.close()
+            report.results.sort(key=lambda r: r.index)
+
+        return report
+
+    async def _deliver(self, page: Page, message: SendMailMessage) -> None:
+        """設定に応じてHTTP送信または画面操作でメールを送信する"""
+        if self.send_api and await self._send_via_http(page, message):
+            return
+        await self._send_on_page(page, message)
+
+    async def _send_via_http(self, page: Page, message: SendMailMessage) -> bool:
+        """
+        送信フォームへ直接POSTしてメールを送信する
+
+        Args:
+            page: 送信に使用するページ。トークンの取得とCookieの共有に使用する
+            message: 送信するメッセージ
+
+        Returns:
+            bool: 送信できた場合はTrue、サーバーに拒否され画面操作で再送すべき場合はFalse
+
+        Raises:
+            MailDeliveryUnknownError: 応答から送信結果を判別できない場合
+        """
+        api = self.send_api
+        form: Dict[str, Any] = {
+            **api.extra_fields,
+            api.to_field: ", ".join(message.to_addresses),
+            api.cc_field: ", ".join(message.cc_addresses),
+            api.subject_field: message.subject,
+            api.body_field: message.body,
+        }
+        if api.token_field and api.token_selector:
+            token = await page.locator(api.token_selector).first.get_attribute("value")
+            form[api.token_field] = token or ""
+        for index, payload in enumerate(message.attachment_payloads(), start=1):
+            form[api.attachment_field.format(index=index)] = payload
+
+        # ブラウザコンテキストのリクエストはページと同じCookieを使用する
+        started_at = datetime.now()
+        try:
+            response = await page.context.request.post(api.endpoint, multipart=form)
+        except PlaywrightError as e:
+            # タイムアウト等はサーバーが受け付けた可能性があるため、再送しない
+            raise MailDeliveryUnknownError(f"HTTP送信の応答を受信できませんでした: {str(e)}") from e
+
+        if response.status >= 500 or (not response.ok and response.status < 400):
+            raise MailDeliveryUnknownError(
+                f"HTTP送信の応答から送信結果を確認できませんでした: {response.status} {response.status_text}"
+            )
+        if not response.ok:
+            if await self._exists_in_sent_box(page, message, started_at):
+                return True
+            self.logger.warning(
+                f"HTTP送信が拒否されたため画面操作で送信します: {response.status} {response.status_text}"
+            )
+            return False
+
+        if api.success_marker not in await response.text():
+            # セッション切れでログイン画面が返った場合等。送信済みの可能性もあるため再送しない
+            raise MailDeliveryUnknownError("HTTP送信の応答から送信結果を確認できませんでした")
+        return True
+
+    async def _exists_in_sent_box(self, page: Page, message: SendMailMessage, since: datetime) -> bool:
+        """
+        送信ボックスに指定日時以降に送信した同じ件名・宛先のメールがあるか確認する
+
+        送信ボックスの検索は画面を操作するため、送信中の他のページと競合しないよう
+        同じコンテキストに確認用のページを開いて行う。
+
+        Raises:
+            MailDeliveryUnknownError: 送信ボックスを確認できない場合
+        """
+        # 送信ボックスの日時は分単位のため、1分前から確認する
+        since = since.replace(second=0, microsecond=0) - timedelta(minutes=1)
+        lookup_page = await page.context.new_page()
+        try:
+            await lookup_page.goto(page.url)
+            async for sent in SentBoxSearchOperation(lookup_page).search_messages_iter(start_date=since):
+                recipients = {contact.email for contact in sent.to_addresses}
+                if sent.subject == message.subject and set(message.to_addresses) <= recipients:
+                    return True
+        except (MailOperationError, PlaywrightError) as e:
+            raise MailDeliveryUnknownError(f"送信ボックスを確認できませんでした: {str(e)}") from e
+        finally:
+            await lookup_page.close()
+        return False
+
+    async def _send_on_page(self, page: Page, message: SendMailMessage) -> None:
+        """指定したページから作成ポップアップを開いてメールを送信する"""
+
+        toolbar = page.locator("#toolbar")
+        create_button = toolbar.get_by_role("button", name="作成")
+        await create_button.wait_for(state="visible")
 
-        toolbar = self.page.locator("#toolbar")
         # ツールバーから「作成」ボタンをクリックすると送信用のポップアップが起動する
-        async with self.page.expect_popup() as popup_info:
-            await asyncio.sleep(1)
-            create_button = toolbar.get_by_role("button", name="作成")
+        async with page.expect_popup() as popup_info:
             await create_button.click()
         
         popup = await popup_info.value
-        await popup.wait_for_load_state('networkidle')
+        try:
+            await self._fill_and_submit(popup, message)
+        finally:
+            # 失敗時に入力途中のポップアップが次の送信に残らないよう閉じる
+            if not popup.is_closed():
+                await popup.close()
+
+    async def _fill_and_submit(self, popup: Page, message: SendMailMessage) -> None:
+        """作成ポップアップに送信内容を入力して送信する"""
+        await popup.wait_for_selector("input#mail-edit-to", state="visible")
         
         # 送信情報を入力
         # 宛先を入力
-        await popup.fill("input#mail-edit-to", message.to_addresses[0])
-        await popup.keyboard.press("Tab")
+        for address in message.to_addresses:
+            await popup.fill("input#mail-edit-to", address)
+            await popup.keyboard.press("Tab")
         
         # CCアドレスを追加する
         if message.cc_addresses:
             await popup.click("span#mail-edit-add_cc")
             await popup.wait_for_selector("input#mail-edit-cc", state='visible')
-            await popup.fill("input#mail-edit-cc", message.cc_addresses[0])
+            for address in message.cc_addresses:
+                await popup.fill("input#mail-edit-cc", address)
+                await popup.keyboard.press("Tab")
         
         await popup.fill("input#mail-edit-subject", message.subject)
         await popup.fill("textarea#mail-edit-body-text", message.body)
         
         # 添付ファイルを追加する
-        if message.attachment:
+        files = message.attachment_files()
+        if files:
             await popup.click("#mail-edit-footer-section input[type='button'][value='選択']")
             async with popup.expect_file_chooser() as file_chooser_info:
                 await popup.click("label[for='ifiles']:has-text('クリックしてファイルを選択してください')")
                 file_chooser = await file_chooser_info.value
-                await file_chooser.set_files(message.attachment)
+                await file_chooser.set_files(files)
                 await popup.click("#jco-attachdlg + div button:has-text('OK')")
             
         # 送信を実行
@@ -62,10 +397,11 @@ class MailSendOperation:
         await popup_toolbar.get_by_role("button", name="送信").click()
         #-- 確認ダイアログの表示を待って、OKボタンをクリック
         await popup.wait_for_selector('.dialog-type-confirm', state='visible')
-        await popup.locator(".dialog-type-confirm button.dialog-ok").click()
-        
-        # メインページに戻ったことを確認
-        await self.page.wait_for_load_state('networkidle')
+        try:
+            async with popup.expect_event("close"):
+                await popup.locator(".dialog-type-confirm button.dialog-ok").click()
+        except Exception as e:
+            raise MailDeliveryUnknownError(f"送信の確定後に失敗しました: {str(e)}") from e
         
     def _ignore_error(self, func):
         """エラーを無視して関数を実行するデコレータ"""
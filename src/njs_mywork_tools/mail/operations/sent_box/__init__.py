@@ -1,20 +1,29 @@
 
-from typing import List
+from typing import List, Optional
 
 from playwright.async_api import Page
 
+from njs_mywork_tools.mail.cache import MessageIdIndex
 from njs_mywork_tools.mail.models.message import MailMessage
 from njs_mywork_tools.mail.operations.sent_box.persistence import (
     SentBoxPersistenceOperation, SentBoxPersistenceResult)
 from njs_mywork_tools.mail.operations.sent_box.search import \
     SentBoxSearchOperation
-from njs_mywork_tools.settings import SurrealDBSetting
+from njs_mywork_tools.settings import MailStorageSetting, SurrealDBSetting
 
 
 class SentBoxOperation:
     """送信ボックスに関する操作をまとめるクラス"""
-    def __init__(self, page: Page, surrealdb_setting: SurrealDBSetting):
-        self.persistence_operation = SentBoxPersistenceOperation(surrealdb_setting)
+    def __init__(
+        self,
+        page: Page,
+        surrealdb_setting: SurrealDBSetting,
+        id_index: Optional[MessageIdIndex] = None,
+        storage_setting: Optional[MailStorageSetting] = None,
+    ):
+        self.persistence_operation = SentBoxPersistenceOperation(
+            surrealdb_setting, id_index, storage_setting
+        )
         self.search_operation = SentBoxSearchOperation(page)
         
     async def persist_message(self, message: MailMessage) -> SentBoxPersistenceResult:
@@ -1,8 +1,10 @@
 from enum import Enum
+from typing import Optional
 
+from njs_mywork_tools.mail.cache import MessageIdIndex
 from njs_mywork_tools.mail.models.message import MailMessage
-from njs_mywork_tools.mail.repository import MailRepository
-from njs_mywork_tools.settings import SurrealDBSetting
+from njs_mywork_tools.mail.store import create_mail_store
+from njs_mywork_tools.settings import MailStorageSetting, SurrealDBSetting
 
 
 class SentBoxPersistenceResult(Enum):
@@ -19,8 +21,13 @@ class SentBoxPersistenceResult(Enum):
 class SentBoxPersistenceOperation:
     """送信ボックスのメール永続化操作を行うクラス"""
     
-    def __init__(self, surrealdb_setting: SurrealDBSetting):
-        self.repository = MailRepository(surrealdb_setting)
+    def __init__(
+        self,
+        surrealdb_setting: SurrealDBSetting,
+        id_index: Optional[MessageIdIndex] = None,
+        storage_setting: Optional[MailStorageSetting] = None,
+    ):
+        self.repository = create_mail_store(surrealdb_setting, storage_setting, id_index=id_index)
 
     async def persist_message(
         self,
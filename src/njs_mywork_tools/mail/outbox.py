@@ -0,0 +1,320 @@
+import asyncio
+import logging
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from njs_mywork_tools.mail.core.session import SessionManager
+from njs_mywork_tools.mail.operations.send import (MailSendOperation,
+                                                   SendMailMessage,
+                                                   SendMailReport)
+from njs_mywork_tools.settings import SurrealDBSetting
+from njs_mywork_tools.storage import Database
+
+OUTBOX_TABLE = "mail_outbox"
+
+
+class OutboxStatus(str, Enum):
+    """送信キューの状態"""
+    QUEUED = "queued"  # 送信待ち
+    SENDING = "sending"  # 送信中
+    SENT = "sent"  # 送信完了
+    FAILED = "failed"  # 送信失敗（再試行しない）
+    UNKNOWN = "unknown"  # 送信結果不明（送信済みの可能性があるため、確認するまで再試行しない）
+
+
+class OutboxEntry(BaseModel):
+    """送信キューのエントリ"""
+    id: str
+    status: OutboxStatus
+    message: SendMailMessage
+    attempts: int = 0
+    last_error: Optional[str] = None
+
+
+class MailOutbox:
+    """SurrealDB上の送信キューを操作するクラス
+
+    レコードIDに重複排除キーを使うことで、同じキーのメールは一度しか登録されない。
+    """
+
+    def __init__(self, settings: SurrealDBSetting):
+        self.settings = settings
+        self.db = Database(settings)
+
+    async def enqueue(self, message: SendMailMessage, dedup_key: Optional[str] = None) -> bool:
+        """
+        メールを送信キューに登録する
+
+        Args:
+            message: 送信するメッセージ
+            dedup_key: 重複排除キー。省略時はランダムなIDを採番する
+
+        Returns:
+            bool: 新規登録した場合はTrue、同じキーが登録済みの場合はFalse
+        """
+        surql = """
+            CREATE type::thing($table, $id) CONTENT {
+                status: $status,
+                message: $message,
+                attempts: 0,
+                last_error: NONE,
+                created_at: time::now(),
+                next_attempt_at: time::now()
+            }
+        """
+        params = {
+            "table": OUTBOX_TABLE,
+            "id": dedup_key or uuid4().hex,
+            "status": OutboxStatus.QUEUED.value,
+            "message": message.model_dump(mode="json"),
+        }
+        async with self.db:
+            result = await self.db.query(surql, params)
+        return bool(result) and result[0].get("status") == "OK"
+
+    async def claim(self, limit: int) -> List[OutboxEntry]:
+        """
+        送信可能なエントリを最大limit件取得し、送信中に遷移させる
+
+        取得と状態遷移は1つのトランザクションで行うため、
+        複数のワーカーが同じエントリを取得することはない。
+        """
+        surql = """
+            BEGIN TRANSACTION;
+            LET $rows = (
+                SELECT id, created_at FROM type::table($table)
+                WHERE status = $queued AND next_attempt_at <= time::now()
+                ORDER BY created_at
+                LIMIT $limit
+            );
+            LET $ids = $rows.id;
+            UPDATE $ids SET status = $sending, locked_at = time::now(), attempts += 1;
+            COMMIT TRANSACTION;
+        """
+        params = {
+            "table": OUTBOX_TABLE,
+            "queued": OutboxStatus.QUEUED.value,
+            "sending": OutboxStatus.SENDING.value,
+            "limit": limit,
+        }
+        async with self.db:
+            result = await self.db.query(surql, params)
+        records = (result[-1].get("result") or []) if result else []
+        return [self._to_entry(record) for record in records]
+
+    async def mark_sent(self, entry_id: str) -> None:
+        """エントリを送信完了にする"""
+        surql = """
+            UPDATE type::thing($table, $id)
+            SET status = $status, sent_at = time::now(), last_error = NONE
+        """
+        async with self.db:
+            await self.db.query(
+                surql, {"table": OUTBOX_TABLE, "id": entry_id, "status": OutboxStatus.SENT.value}
+            )
+
+    async def mark_failed(self, entry: OutboxEntry, error: str, max_attempts: int, backoff: float) -> None:
+        """
+        送信失敗を記録する
+
+        試行回数が上限未満であれば指数バックオフ後に再送されるよう送信待ちに戻し、
+        上限に達した場合は送信失敗とする。
+        """
+        if entry.attempts < max_attempts:
+            delay = int(backoff * (2 ** (entry.attempts - 1)))
+            status = OutboxStatus.QUEUED
+        else:
+            delay = 0
+            status = OutboxStatus.FAILED
+        surql = """
+            UPDATE type::thing($table, $id)
+            SET status = $status,
+                last_error = $error,
+                next_attempt_at = time::now() + type::duration($delay)
+        """
+        params = {
+            "table": OUTBOX_TABLE,
+            "id": entry.id,
+            "status": status.value,
+            "error": error,
+            "delay": f"{delay}s",
+        }
+        async with self.db:
+            await self.db.query(surql, params)
+
+    async def mark_unknown(self, entry_id: str, error: str) -> None:
+        """
+        送信結果不明を記録する
+
+        送信済みの可能性があるため再試行せず、送信済みかを確認のうえ requeue で再送する。
+        """
+        surql = """
+            UPDATE type::thing($table, $id)
+            SET status = $status, last_error = $error
+        """
+        params = {
+            "table": OUTBOX_TABLE,
+            "id": entry_id,
+            "status": OutboxStatus.UNKNOWN.value,
+            "error": error,
+        }
+        async with self.db:
+            await self.db.query(surql, params)
+
+    async def recover_stale(self, lease_seconds: int) -> int:
+        """
+        一定時間以上送信中のまま残っているエントリを送信結果不明にする
+
+        ワーカーが送信中に停止した場合、送信済みかどうか判別できない。
+        二重送信を避けるため自動では再送せず、送信結果不明として残す。
+        内容を確認のうえ requeue で再送できる。
+
+        Returns:
+            int: 送信結果不明にしたエントリ数
+        """
+        surql = """
+            UPDATE type::table($table)
+            SET status = $unknown, last_error = "送信中にワーカーが停止しました"
+            WHERE status = $sending AND locked_at < time::now() - type::duration($lease)
+        """
+        params = {
+            "table": OUTBOX_TABLE,
+            "unknown": OutboxStatus.UNKNOWN.value,
+            "sending": OutboxStatus.SENDING.value,
+            "lease": f"{lease_seconds}s",
+        }
+        async with self.db:
+            result = await self.db.query(surql, params)
+        return len(result[0].get("result") or []) if result else 0
+
+    async def requeue(self, entry_id: str) -> None:
+        """送信失敗・送信結果不明のエントリを送信待ちに戻す"""
+        surql = """
+            UPDATE type::thing($table, $id)
+            SET status = $queued, attempts = 0, next_attempt_at = time::now()
+            WHERE status IN [$failed, $unknown]
+        """
+        params = {
+            "table": OUTBOX_TABLE,
+            "id": entry_id,
+            "queued": OutboxStatus.QUEUED.value,
+            "failed": OutboxStatus.FAILED.value,
+            "unknown": OutboxStatus.UNKNOWN.value,
+        }
+        async with self.db:
+            await self.db.query(surql, params)
+
+    def _to_entry(self, record: Dict[str, Any]) -> OutboxEntry:
+        return OutboxEntry(
+            id=record["id"].split(":", 1)[-1],
+            status=record["status"],
+            message=SendMailMessage(**record["message"]),
+            attempts=record.get("attempts", 0),
+            last_error=record.get("last_error"),
+        )
+
+
+class OutboxWorker:
+    """送信キューを一括で取り出して送信するワーカー"""
+
+    def __init__(
+        self,
+        outbox: MailOutbox,
+        send_operation: MailSendOperation,
+        session: SessionManager,
+        batch_size: int = 20,
+        concurrency: int = 1,
+        min_interval: float = 0.0,
+        max_attempts: int = 3,
+        backoff: float = 60.0,
+        poll_interval: float = 10.0,
+        lease_seconds: int = 600,
+    ):
+        self.outbox = outbox
+        self.send_operation = send_operation
+        self.session = session
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.logger = logging.getLogger(__name__)
+
+    async def run(self, stop_when_empty: bool = False) -> None:
+        """
+        送信キューを監視し、送信待ちのメールを送信し続ける
+
+        Args:
+            stop_when_empty: Trueの場合、送信待ちがなくなった時点で終了する
+        """
+        recovered = await self.outbox.recover_stale(self.lease_seconds)
+        if recovered:
+            self.logger.warning(f"送信中のまま停止したメールを送信結果不明にしました: {recovered}件")
+
+        while True:
+            processed = await self.drain_once()
+            if processed:
+                continue
+            if stop_when_empty:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+    async def drain_once(self) -> int:
+        """
+        送信待ちのメールを1バッチ分送信する
+
+        Returns:
+            int: 処理したエントリ数
+        """
+        entries = await self.outbox.claim(self.batch_size)
+        if not entries:
+            return 0
+
+        try:
+            await self.session.ensure_logged_in()
+        except Exception as e:
+            # 送信処理に入る前の失敗なので、いずれも未送信として再試行に回す
+            for entry in entries:
+                await self.outbox.mark_failed(entry, str(e), self.max_attempts, self.backoff)
+            raise
+
+        # 途中で例外が発生しても、送信済みの結果はレポートに残る
+        report = SendMailReport()
+        error: Optional[Exception] = None
+        try:
+            await self.send_operation.send_many(
+                [entry.message for entry in entries],
+                concurrency=self.concurrency,
+                min_interval=self.min_interval,
+                report=report,
+            )
+        except Exception as e:
+            error = e
+
+        attempted = set()
+        for result in report.results:
+            entry = entries[result.index]
+            attempted.add(result.index)
+            if result.success:
+                await self.outbox.mark_sent(entry.id)
+            elif result.unknown:
+                self.logger.error(f"メールの送信結果を確認できませんでした ({entry.id}): {result.error}")
+                await self.outbox.mark_unknown(entry.id, result.error or "")
+            else:
+                self.logger.warning(f"メール送信に失敗しました ({entry.id}): {result.error}")
+                await self.outbox.mark_failed(
+                    entry, result.error or "", self.max_attempts, self.backoff
+                )
+
+        if error is not None:
+            # 送信を開始していないエントリのみ未送信として再試行に回す
+            for index, entry in enumerate(entries):
+                if index not in attempted:
+                    await self.outbox.mark_failed(entry, str(error), self.max_attempts, self.backoff)
+            raise error
+        return len(entries)
@@ -0,0 +1,200 @@
+"""保存済みメールの検索条件を組み立てるクエリビルダー
+
+    query = (
+        MailQuery()
+        .between(start, end)
+        .from_sender("yamada@example.com")
+        .select("subject", "mail_date", "sender")
+        .order_by("mail_date", descending=True)
+        .limit(50)
+    )
+    rows = await repository.query(query)
+"""
+
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from njs_mywork_tools.mail.models.entities import RecipientType
+from njs_mywork_tools.mail.models.message import ContactPerson
+
+MailField = Literal["subject", "mail_date", "body", "sender", "recipients", "attachments"]
+MailSortField = Literal["mail_date", "subject", "id"]
+
+ALL_FIELDS: Tuple[MailField, ...] = (
+    "subject", "mail_date", "body", "sender", "recipients", "attachments",
+)
+
+# 送信者のメッセージIDを mail_senders の email インデックスで1度だけ取得する
+# （mail_messages の行ごとに副問い合わせを評価すると、インデックスが使われない）
+SENDER_MESSAGE_IDS = (
+    "LET $sender_ids = (SELECT VALUE type::thing('mail_messages', message_id) "
+    "FROM mail_senders WHERE email = $sender);"
+)
+
+
+@dataclass
+class MailQueryRow:
+    """クエリの結果。選択しなかったフィールドは None となる"""
+
+    id: str
+    subject: Optional[str] = None
+    mail_date: Optional[datetime] = None
+    body: Optional[str] = None
+    sender: Optional[ContactPerson] = None
+    to_addresses: Optional[List[ContactPerson]] = None
+    cc_addresses: Optional[List[ContactPerson]] = None
+    attachments: Optional[List[str]] = None
+
+
+@dataclass(frozen=True)
+class MailQuery:
+    """
+    mail_messages に対する検索条件
+
+    各メソッドは条件を追加した新しいインスタンスを返すため、共通の条件を
+    組み立てておき、画面ごとに条件や取得するフィールドを追加して使用できる。
+    """
+
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    sender: Optional[str] = None
+    recipient: Optional[str] = None
+    recipient_type: Optional[RecipientType] = None
+    has_attachments: Optional[bool] = None
+    subject_prefix: Optional[str] = None
+    fields: Tuple[MailField, ...] = ALL_FIELDS
+    sort: MailSortField = "mail_date"
+    descending: bool = False
+    max_rows: Optional[int] = None
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> "MailQuery":
+        """日時の範囲（両端を含む）で絞り込む"""
+        return replace(self, start=start, end=end)
+
+    def from_sender(self, email: str) -> "MailQuery":
+        """送信者のメールアドレスで絞り込む"""
+        return replace(self, sender=email)
+
+    def to_recipient(self, email: str, recipient_type: Optional[RecipientType] = None) -> "MailQuery":
+        """受信者のメールアドレスで絞り込む（recipient_type を省略した場合は To と CC の両方）"""
+        return replace(self, recipient=email, recipient_type=recipient_type)
+
+    def with_attachments(self, has_attachments: bool = True) -> "MailQuery":
+        """添付ファイルの有無で絞り込む"""
+        return replace(self, has_attachments=has_attachments)
+
+    def subject_startswith(self, prefix: str) -> "MailQuery":
+        """件名の前方一致で絞り込む"""
+        return replace(self, subject_prefix=prefix)
+
+    def select(self, *fields: MailField) -> "MailQuery":
+        """取得するフィールドを指定する（id は常に取得する）"""
+        for field in fields:
+            if field not in ALL_FIELDS:
+                raise ValueError(f"不正なフィールドです: {field}")
+        return replace(self, fields=tuple(dict.fromkeys(fields)))
+
+    def order_by(self, field: MailSortField, descending: bool = False) -> "MailQuery":
+        """並び順を指定する"""
+        if field not in ("mail_date", "subject", "id"):
+            raise ValueError(f"不正な並び順です: {field}")
+        return replace(self, sort=field, descending=descending)
+
+    def limit(self, max_rows: int) -> "MailQuery":
+        """最大件数を指定する"""
+        return replace(self, max_rows=max_rows)
+
+    def compile(
+        self,
+        layout: Literal["linked", "embedded"] = "linked",
+        body_parts: bool = False,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        パラメータ付きの SurrealQL に変換する
+
+        linked 形式で送信者・受信者を指定した場合は、先に各テーブルのインデックスで
+        メッセージIDを取得し、mail_messages はそのIDのレコードのみを読み込む。
+        結果は最後の SELECT 文の結果となる。
+
+        Args:
+            layout: メッセージの保存形式
+            body_parts: 本文を mail_bodies から復元する場合は True
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: SurrealQL とパラメータ
+        """
+        statements: List[str] = []
+        sources: List[str] = []
+        conditions: List[str] = []
+        params: Dict[str, Any] = {}
+
+        # mail_date のインデックスが使えるよう、日時の条件を先頭に置く
+        if self.start:
+            conditions.append("mail_date >= $start")
+            params["start"] = self.start.isoformat()
+        if self.end:
+            conditions.append("mail_date <= $end")
+            params["end"] = self.end.isoformat()
+        if self.subject_prefix:
+            # 件名は「:」をエスケープして保存している
+            prefix = self.subject_prefix.replace(":", "\\:")
+            conditions.append("subject >= $subject_prefix AND subject < $subject_prefix_end")
+            params["subject_prefix"] = prefix
+            params["subject_prefix_end"] = prefix + "\U0010ffff"
+        if self.sender:
+            if layout == "embedded":
+                conditions.append("sender.email = $sender")
+            else:
+                statements.append(SENDER_MESSAGE_IDS)
+                sources.append("$sender_ids")
+            params["sender"] = self.sender
+        if self.recipient:
+            recipient_condition = "email = $recipient"
+            if self.recipient_type:
+                recipient_condition += " AND recipient_type = $recipient_type"
+                params["recipient_type"] = self.recipient_type.value
+            if layout == "embedded":
+                conditions.append(f"array::len(recipients[WHERE {recipient_condition}]) > 0")
+            else:
+                # To と CC の両方に含まれる場合も1件とする
+                statements.append(
+                    "LET $recipient_ids = array::distinct((SELECT VALUE "
+                    "type::thing('mail_messages', message_id) FROM mail_recipients "
+                    f"WHERE {recipient_condition}));"
+                )
+                sources.append("$recipient_ids")
+            params["recipient"] = self.recipient
+        if self.has_attachments is not None:
+            conditions.append(f"array::len(attachments) {'>' if self.has_attachments else '='} 0")
+
+        # 並び替えに使うフィールドは取得するフィールドに含める
+        fields = list(self.fields)
+        if self.sort in ALL_FIELDS and self.sort not in fields:
+            fields.append(self.sort)
+        projection = ["id", *fields]
+        if "body" in fields and body_parts:
+            projection.append("body_parts")
+
+        fetch: List[str] = []
+        if layout == "linked":
+            fetch = [field for field in ("sender", "recipients", "attachments") if field in fields]
+        if "body" in fields and body_parts:
+            fetch.append("body_parts")
+
+        if len(sources) > 1:
+            statements.append(f"LET $message_ids = array::intersect({', '.join(sources)});")
+            source = "$message_ids"
+        else:
+            source = sources[0] if sources else "mail_messages"
+
+        surql = f"SELECT {', '.join(projection)} FROM {source}"
+        if conditions:
+            surql += f" WHERE {' AND '.join(conditions)}"
+        surql += f" ORDER BY {self.sort} {'DESC' if self.descending else 'ASC'}"
+        if self.max_rows is not None:
+            surql += " LIMIT $limit"
+            params["limit"] = self.max_rows
+        if fetch:
+            surql += f" FETCH {', '.join(fetch)}"
+        return "\n".join([*statements, surql]), params
@@ -1,133 +1,450 @@
-from datetime import datetime
-from typing import Any, Dict, List
-from uuid import uuid4
-
-from njs_mywork_tools.mail.models.entities import (AttachmentEntity,
-                                                   ContactEntity,
-                                                   MailMessageEntity,
-                                                   RecipientEntity,
-                                                   RecipientType, SenderEntity)
-from njs_mywork_tools.mail.models.message import MailMessage
+import calendar
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import (Any, AsyncIterator, Dict, Iterable, List, Literal,
+                    Optional, Set, Tuple)
+
+from njs_mywork_tools.mail.body_store import (BODY_TABLE, MailBodyStats,
+                                              MailBodyStore, split_quoted)
+from njs_mywork_tools.mail.cache import (ContactCache, MessageIdIndex,
+                                         ReadThroughCache)
+from njs_mywork_tools.mail.models.entities import (
+    AttachmentEntity, ContactEntity, EmbeddedAttachmentEntity,
+    EmbeddedContactEntity, EmbeddedMailMessageEntity, EmbeddedRecipientEntity,
+    MailMessageEntity, RecipientEntity, RecipientType, SenderEntity)
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.models.search import (MailCorrespondent,
+                                                 MailDailyCount,
+                                                 MailSearchFilters,
+                                                 MailSearchResult)
+from njs_mywork_tools.mail.query import (SENDER_MESSAGE_IDS, MailQuery,
+                                         MailQueryRow)
+from njs_mywork_tools.mail.schema import CONTACT_STATS_VIEWS, ensure_schema
+from njs_mywork_tools.mail.store import MailStore
 from njs_mywork_tools.settings import SurrealDBSetting
 from njs_mywork_tools.storage import Database
 
 
-class MailRepository:
-    """メールメッセージの永続化を担当するリポジトリ"""
+MailLayout = Literal["linked", "embedded"]
+
+
+def record_key(message_id: str, role: str, value: str) -> str:
+    """メッセージID・役割・メールアドレス（添付ファイルはパス）から決まるレコードIDを返す"""
+    return hashlib.blake2b(
+        "\0".join([message_id, role, value]).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def to_timestamp(mail_date: datetime) -> int:
+    """集計に使用するUNIX時間（タイムゾーンのない日時はUTCとして扱う）"""
+    return calendar.timegm(mail_date.utctimetuple())
+
+
+def from_timestamp(timestamp: Optional[float]) -> Optional[datetime]:
+    if timestamp is None:
+        return None
+    return datetime(1970, 1, 1) + timedelta(seconds=timestamp)
+
+
+class MailRepository(MailStore):
+    """
+    メールメッセージの永続化を担当するリポジトリ（SurrealDB）
+
+    layout が "linked" の場合は送信者・受信者・添付ファイルを別テーブルに保存し、
+    メッセージからIDで参照する。"embedded" の場合はメッセージのドキュメントに
+    埋め込むため、保存・取得ともにメッセージ1件の読み書きで完結する。
+
+    body_store が設定されている場合、本文は mail_bodies テーブルに重複を除いて保存し、
+    メッセージからはIDで参照する。全文検索用に引用部分を除いた本文のみ
+    mail_messages にも保存するため、引用部分の文字列では検索にかからない
+    （引用元のメッセージは検索できる）。
+    """
     
-    def __init__(self, settings: SurrealDBSetting):
+    def __init__(
+        self,
+        settings: SurrealDBSetting,
+        id_index: Optional[MessageIdIndex] = None,
+        contact_cache: Optional[ContactCache] = None,
+        message_cache: Optional[ReadThroughCache[MailMessage]] = None,
+        layout: MailLayout = "linked",
+        body_store: Optional[MailBodyStore] = None,
+    ):
         self.settings = settings
+        self.layout = layout
+        self.body_store = body_store
         self.db = Database(settings)
+        self.id_index = id_index
+        self.contact_cache = contact_cache or ContactCache()
+        self.message_cache = message_cache
     
-    async def save_messages(self, messages: List[MailMessage]) -> None:
-        """メールメッセージをデータベースに保存する"""
-        for message in messages:
-            await self.save(message)
-    
-    async def save(self, mail_message: MailMessage) -> None:
-        """メールメッセージをデータベースに保存する"""        
-        async with self.db:
-            async with self.db.transaction():
-                # 送信者エンティティの作成
-                sender_id = str(uuid4()).replace("-", "")
-                sender_entity = SenderEntity(
-                    id = sender_id,
-                    message_id=mail_message.id,
-                    email=mail_message.sender.email,
-                )
-                await self.db.create("mail_senders", sender_entity.model_dump())
-
-                # 受信者エンティティの作成
-                recipient_ids = []
-                for recipient in mail_message.to_addresses:
-                    id = str(uuid4()).replace("-", "")
-                    recipient_entity = RecipientEntity(
-                        id=id,
-                        message_id=mail_message.id,
-                        email=recipient.email,
-                        recipient_type=RecipientType.TO,
-                    )
-                    # 受信者データを保存し、IDを配列に追加
-                    await self.db.create("mail_recipients", recipient_entity.model_dump())
-                    recipient_ids.append(id)
-
-                for recipient in mail_message.cc_addresses:
-                    id = str(uuid4()).replace("-", "")
-                    recipient_entity = RecipientEntity(
-                        id=id,
-                        message_id=mail_message.id,
-                        email=recipient.email,
-                        recipient_type=RecipientType.CC,
-                    )
-                    await self.db.create("mail_recipients", recipient_entity.model_dump())
-                    recipient_ids.append(id)
-
-                # メールコンタクト更新
-                contacts = [mail_message.sender, *mail_message.to_addresses, *mail_message.cc_addresses]
-                for contact in contacts:
-                    if contact.name is not None:
-                        contact_entity = ContactEntity(
-                            id=contact.email,
-                            name=contact.name,
-                        )
-                        await self.db.upsert("mail_contacts", contact_entity.model_dump())
-
-                # 添付ファイルエンティティの作成
-                attachment_ids = []
-                for attachment in mail_message.attachments:
-                    id = str(uuid4()).replace("-", "")
-                    attachment_entity = AttachmentEntity(
-                        id=id,
-                        message_id=mail_message.id,
-                        file_path=attachment,
-                    )
-                    await self.db.create("mail_attachments", attachment_entity.model_dump())
-                    attachment_ids.append(id)
-
-                # メールメッセージエンティティの作成
-                message_entity = MailMessageEntity(
-                    id=mail_message.id,
-                    subject=mail_message.subject.replace(":", "\\:"),
-                    mail_date=mail_message.mail_date.isoformat(),
-                    body=mail_message.body,
-                    sender=sender_entity,
-                    recipients=[],
-                    attachments=[]
+    async def save_many(self, mail_messages: List[MailMessage]) -> None:
+        """
+        複数のメールメッセージを1つのトランザクションでデータベースに保存する
+
+        送信者・受信者・連絡先・添付ファイル・メッセージの書き込みを
+        1つのSurrealQLスクリプトにまとめ、1回のリクエストで実行する。
+        レコードIDはメッセージIDから決まり、既存のレコードは上書きするため、
+        保存済みのメッセージを再度保存しても重複しない。
+        """
+        if not mail_messages:
+            return
+        await ensure_schema(self.settings)
+
+        statements: List[str] = []
+        params: Dict[str, Any] = {}
+        contacts: Dict[str, str] = {}
+        bodies: Dict[str, Dict[str, Any]] = {}
+        body_fields: Dict[str, Dict[str, Any]] = {}
+        edges = []
+        for index, mail_message in enumerate(mail_messages):
+            body_fields[mail_message.id] = self._compile_body(mail_message, bodies)
+            # メールコンタクトの収集
+            for contact in [mail_message.sender, *mail_message.to_addresses, *mail_message.cc_addresses]:
+                if contact.name is not None:
+                    contacts[contact.email] = contact.name
+            if self.layout == "linked":
+                self._compile_save(mail_message, f"m{index}", statements, params)
+                params[f"m{index}_message"].update(body_fields[mail_message.id])
+            edges.append((mail_message, f"e{index}"))
+
+        if self.layout == "embedded":
+            for index, mail_message in enumerate(mail_messages):
+                statements.append(
+                    f"UPDATE type::thing('mail_messages', $m{index}.id) CONTENT $m{index};"
                 )
-                message_entity_dict = {
-                    **message_entity.model_dump(exclude={"recipients", "attachments"}),
-                    "sender": f"mail_senders:{sender_id}",
-                    "recipients": [f"mail_recipients:{id}" for id in recipient_ids],
-                    "attachments": [f"mail_attachments:{id}" for id in attachment_ids]
+                params[f"m{index}"] = {
+                    **self._to_embedded_entity(mail_message).model_dump(mode="json"),
+                    **body_fields[mail_message.id],
                 }
-                await self.db.create("mail_messages", message_entity_dict)
 
+        # 連絡先とメッセージのグラフエッジ（メッセージの作成後に張る）
+        for mail_message, prefix in edges:
+            self._compile_edges(mail_message, prefix, statements, params)
+
+        # 本文の保存（同じ内容の本文は1レコードにまとめる）
+        if bodies:
+            statements.append(
+                Database.upsert_statement(BODY_TABLE, ["codec", "data", "stored_size"], "bodies")
+            )
+            params["bodies"] = list(bodies.values())
+
+        # メールコンタクト更新（名前が変わっていない連絡先は書き込まない）
+        changed_contacts = self.contact_cache.changed(contacts)
+        if changed_contacts:
+            statements.append(Database.upsert_statement("mail_contacts", ["name"], "contacts"))
+            params["contacts"] = [
+                ContactEntity(id=email, name=name).model_dump()
+                for email, name in changed_contacts.items()
+            ]
+
+        async with self.db:
+            await self.db.execute_transaction(statements, params)
+
+        self.contact_cache.update(changed_contacts)
+        if self.message_cache:
+            for mail_message in mail_messages:
+                self.message_cache.invalidate(mail_message.id)
+        if self.id_index:
+            self.id_index.add_many(mail_message.id for mail_message in mail_messages)
+
+    def _compile_save(
+        self,
+        mail_message: MailMessage,
+        prefix: str,
+        statements: List[str],
+        params: Dict[str, Any],
+    ) -> None:
+        """1通分の保存処理をステートメントとパラメータに変換する"""
+        # 送信者エンティティの作成
+        sender_id = record_key(mail_message.id, "sender", mail_message.sender.email)
+        sender_entity = SenderEntity(
+            id = sender_id,
+            message_id=mail_message.id,
+            email=mail_message.sender.email,
+        )
+        statements.append(f"UPDATE type::thing('mail_senders', ${prefix}_sender.id) CONTENT ${prefix}_sender;")
+        params[f"{prefix}_sender"] = sender_entity.model_dump()
+
+        # 受信者エンティティの作成
+        recipients = [
+            *[(recipient, RecipientType.TO) for recipient in mail_message.to_addresses],
+            *[(recipient, RecipientType.CC) for recipient in mail_message.cc_addresses],
+        ]
+        recipient_entities = [
+            RecipientEntity(
+                id=record_key(mail_message.id, recipient_type.value, recipient.email),
+                message_id=mail_message.id,
+                email=recipient.email,
+                recipient_type=recipient_type,
+            )
+            for recipient, recipient_type in recipients
+        ]
+        if recipient_entities:
+            statements.append(Database.upsert_statement(
+                "mail_recipients", ["email", "recipient_type"], f"{prefix}_recipients"
+            ))
+            params[f"{prefix}_recipients"] = list({
+                entity.id: entity.model_dump(mode="json") for entity in recipient_entities
+            }.values())
+
+        # 添付ファイルエンティティの作成
+        attachment_entities = [
+            AttachmentEntity(
+                id=record_key(mail_message.id, "attachment", attachment),
+                message_id=mail_message.id,
+                file_path=attachment,
+            )
+            for attachment in mail_message.attachments
+        ]
+        if attachment_entities:
+            statements.append(Database.upsert_statement(
+                "mail_attachments", ["file_path"], f"{prefix}_attachments"
+            ))
+            params[f"{prefix}_attachments"] = list({
+                entity.id: entity.model_dump() for entity in attachment_entities
+            }.values())
+
+        # 以前の保存時から変わった送信者・受信者・添付ファイルを削除する
+        keys = {
+            "mail_senders": [sender_id],
+            "mail_recipients": [entity.id for entity in recipient_entities],
+            "mail_attachments": [entity.id for entity in attachment_entities],
+        }
+        for table, table_keys in keys.items():
+            statements.append(
+                f"DELETE {table} WHERE message_id = ${prefix}_sender.message_id "
+                f"AND meta::id(id) NOTINSIDE ${prefix}_{table}_keys;"
+            )
+            params[f"{prefix}_{table}_keys"] = table_keys
+
+        # メールメッセージエンティティの作成
+        message_entity = MailMessageEntity(
+            id=mail_message.id,
+            subject=mail_message.subject.replace(":", "\\:"),
+            mail_date=mail_message.mail_date.isoformat(),
+            body=mail_message.body,
+            sender=sender_entity,
+            recipients=[],
+            attachments=[]
+        )
+        message_entity_dict = {
+            **message_entity.model_dump(exclude={"recipients", "attachments"}),
+            "sender": f"mail_senders:{sender_id}",
+            "recipients": [f"mail_recipients:{entity.id}" for entity in recipient_entities],
+            "attachments": [f"mail_attachments:{entity.id}" for entity in attachment_entities]
+        }
+        statements.append(f"UPDATE type::thing('mail_messages', ${prefix}_message.id) CONTENT ${prefix}_message;")
+        params[f"{prefix}_message"] = message_entity_dict
+
+    @staticmethod
+    def _compile_edges(
+        mail_message: MailMessage,
+        prefix: str,
+        statements: List[str],
+        params: Dict[str, Any],
+    ) -> None:
+        """
+        送信者->sent->メッセージ、メッセージ->to/cc->受信者のエッジを張るステートメントを追加する
+
+        再保存時に重複しないよう、メッセージの既存のエッジは削除してから張り直す。
+        エッジにはメールの日時を持たせ、連絡先ごとの集計テーブルの更新に使用する。
+        """
+        statements.append(f"LET ${prefix}_message = type::thing('mail_messages', ${prefix}_id);")
+        statements.append(
+            f"LET ${prefix}_edges = array::flatten("
+            f"SELECT VALUE array::flatten([<-sent, ->to, ->cc]) FROM ${prefix}_message);"
+        )
+        statements.append(f"DELETE ${prefix}_edges;")
+        statements.append(f"LET ${prefix}_sender = type::thing('mail_contacts', ${prefix}_from);")
+        statements.append(
+            f"RELATE ${prefix}_sender->sent->${prefix}_message SET mail_ts = ${prefix}_ts;"
+        )
+        params[f"{prefix}_id"] = mail_message.id
+        params[f"{prefix}_from"] = mail_message.sender.email
+        params[f"{prefix}_ts"] = to_timestamp(mail_message.mail_date)
+
+        for edge, recipients in [("to", mail_message.to_addresses), ("cc", mail_message.cc_addresses)]:
+            if not recipients:
+                continue
+            contacts = ", ".join(
+                f"type::thing('mail_contacts', ${prefix}_{edge}{index})"
+                for index in range(len(recipients))
+            )
+            statements.append(
+                f"RELATE ${prefix}_message->{edge}->[{contacts}] SET mail_ts = ${prefix}_ts;"
+            )
+            for index, recipient in enumerate(recipients):
+                params[f"{prefix}_{edge}{index}"] = recipient.email
+
+    def _compile_body(
+        self, mail_message: MailMessage, bodies: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """本文の保存先に応じたメッセージのフィールドを返し、保存する本文を収集する"""
+        if not self.body_store:
+            return {}
+        parts = self.body_store.encode(mail_message.body)
+        for part in parts:
+            bodies[part.id] = part.model_dump()
+        # 本文は body_parts から復元する。body は全文検索のためだけに返信部分を保存し、
+        # 返信間で重複する引用部分は mail_bodies にのみ保存する
+        searchable = split_quoted(mail_message.body)[0]
+        return {
+            "body": searchable,
+            "body_search_size": len(searchable.encode("utf-8")),
+            "body_parts": [f"{BODY_TABLE}:{part.id}" for part in parts],
+        }
+
+    @staticmethod
+    def _to_embedded_entity(mail_message: MailMessage) -> EmbeddedMailMessageEntity:
+        """送信者・受信者・添付ファイルを埋め込んだエンティティに変換する"""
+        return EmbeddedMailMessageEntity(
+            id=mail_message.id,
+            subject=mail_message.subject.replace(":", "\\:"),
+            mail_date=mail_message.mail_date.isoformat(),
+            body=mail_message.body,
+            sender=EmbeddedContactEntity(
+                email=mail_message.sender.email, name=mail_message.sender.name
+            ),
+            recipients=[
+                EmbeddedRecipientEntity(
+                    email=recipient.email, name=recipient.name, recipient_type=recipient_type
+                )
+                for recipients, recipient_type in [
+                    (mail_message.to_addresses, RecipientType.TO),
+                    (mail_message.cc_addresses, RecipientType.CC),
+                ]
+                for recipient in recipients
+            ],
+            attachments=[
+                EmbeddedAttachmentEntity(file_path=attachment)
+                for attachment in mail_message.attachments
+            ],
+        )
+
+    @property
+    def _fetch_clause(self) -> str:
+        fields = ["sender", "recipients", "attachments"] if self.layout == "linked" else []
+        if self.body_store:
+            fields.append("body_parts")
+        return f"FETCH {', '.join(fields)}" if fields else ""
+
+    def _sender_filter(self) -> Tuple[str, str, Optional[str]]:
+        """
+        送信者による絞り込みの (前処理のステートメント, 読み込み元, 条件) を返す
+
+        linked 形式では送信者のメッセージIDを mail_senders のインデックスで先に取得し、
+        そのIDのメッセージのみを読み込む。
+        """
+        if self.layout == "embedded":
+            return "", "mail_messages", "sender.email = $sender"
+        return SENDER_MESSAGE_IDS, "$sender_ids", None
 
     async def find_by_id(self, message_id: str) -> MailMessage:
-        """IDによるメールメッセージの検索"""
+        """IDによるメールメッセージの検索
+
+        メッセージキャッシュが設定されている場合は、キャッシュから返す。
+        """
+        if self.message_cache:
+            return await self.message_cache.get(
+                message_id.split(":")[-1], lambda: self._find_by_id(message_id)
+            )
+        return await self._find_by_id(message_id)
+
+    async def _find_by_id(self, message_id: str) -> MailMessage:
         async with self.db:
-            surql = """
+            surql = f"""
                 SELECT *
                 FROM type::thing("mail_messages", $id)
-                FETCH recipients, attachments
+                {self._fetch_clause}
             """
             result = await self.db.query(surql, {"id": message_id})
 
             data = result[0]['result'][0]
             return self._convert_surreal_result_to_entity(data)
 
+    async def iter_messages(
+        self,
+        start: datetime,
+        end: datetime,
+        sender: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[MailMessage]:
+        """
+        期間内のメールメッセージを日時順に順次取得する
+
+        (mail_date, id) をキーにしたページングで batch_size 件ずつ取得するため、
+        件数が多くてもメモリ使用量は一定で、OFFSET による読み飛ばしも発生しない。
+
+        Args:
+            start: 取得開始日時
+            end: 取得終了日時
+            sender: 送信者のメールアドレスで絞り込む場合に指定
+            batch_size: 1回のクエリで取得する件数
+
+        Yields:
+            MailMessage: メールメッセージ
+        """
+        conditions = ["mail_date >= $start", "mail_date <= $end"]
+        params: Dict[str, Any] = {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "limit": batch_size,
+        }
+        prefix, source = "", "mail_messages"
+        if sender:
+            prefix, source, condition = self._sender_filter()
+            if condition:
+                conditions.append(condition)
+            params["sender"] = sender
+
+        first_page = " AND ".join(conditions)
+        next_page = " AND ".join([
+            *conditions,
+            "(mail_date > $last_date OR (mail_date = $last_date "
+            "AND id > type::thing('mail_messages', $last_id)))",
+        ])
+
+        where = first_page
+        while True:
+            surql = f"""
+                {prefix}
+                SELECT *
+                FROM {source}
+                WHERE {where}
+                ORDER BY mail_date, id
+                LIMIT $limit
+                {self._fetch_clause}
+            """
+            async with self.db:
+                result = await self.db.query(surql, params)
+            rows = (result[-1].get('result') or []) if result else []
+
+            for row in rows:
+                yield self._convert_surreal_result_to_entity(row)
+
+            if len(rows) < batch_size:
+                break
+            params["last_date"] = rows[-1]['mail_date']
+            params["last_id"] = rows[-1]['id'].split(":")[-1]
+            where = next_page
+
     def _convert_surreal_result_to_entity(self, result: Dict[str, Any]) -> MailMessage:
         if isinstance(result, list):
             result = result[0]
+        if result.get('body_parts'):
+            result = {**result, 'body': self._decode_body(result['body_parts'])}
+        if result.get('layout') == "embedded":
+            return self._convert_embedded_document(result)
         
         to_recipients = [
-            r['email'] for r in result.get('recipients', []) 
+            ContactPerson(email=r['email']) for r in result.get('recipients', [])
             if r['recipient_type'] == RecipientType.TO
         ]
         cc_recipients = [
-            r['email'] for r in result.get('recipients', []) 
+            ContactPerson(email=r['email']) for r in result.get('recipients', [])
             if r['recipient_type'] == RecipientType.CC
         ]
+        sender = result['sender']
         
         attachments = [
             a['file_path'] for a in result.get('attachments', [])
@@ -139,7 +456,7 @@ class MailRepository:
             subject=result['subject'],
             mail_date=datetime.fromisoformat(result['mail_date']),
             body=result['body'],
-            sender=result['sender'],
+            sender=ContactPerson(email=sender['email']) if isinstance(sender, dict) else sender,
             to_addresses=to_recipients,
             cc_addresses=cc_recipients,
             attachments=attachments
@@ -147,23 +464,538 @@ class MailRepository:
         
         return mail_message
 
-    async def exists(self, mail_message: MailMessage) -> bool:
-        """指定されたメールメッセージが既に存在するか確認する"""
+    def _decode_body(self, parts: List[Any]) -> str:
+        if any(not isinstance(part, dict) for part in parts):
+            raise ValueError("本文を復元するには body_store を設定してください")
+        return (self.body_store or MailBodyStore()).decode(parts)
+
+    def _convert_embedded_document(self, result: Dict[str, Any]) -> MailMessage:
+        entity = EmbeddedMailMessageEntity(**{**result, 'id': result['id'].split(":")[-1]})
+        return MailMessage(
+            id=entity.id,
+            subject=entity.subject,
+            mail_date=datetime.fromisoformat(entity.mail_date),
+            body=entity.body,
+            sender=ContactPerson(email=entity.sender.email, name=entity.sender.name or ""),
+            to_addresses=[
+                ContactPerson(email=r.email, name=r.name or "")
+                for r in entity.recipients if r.recipient_type == RecipientType.TO
+            ],
+            cc_addresses=[
+                ContactPerson(email=r.email, name=r.name or "")
+                for r in entity.recipients if r.recipient_type == RecipientType.CC
+            ],
+            attachments=[a.file_path for a in entity.attachments],
+        )
+
+    async def query(self, query: MailQuery) -> List[MailQueryRow]:
+        """
+        クエリビルダーで組み立てた条件でメールを検索する
+
+        選択したフィールドのみを取得するため、一覧表示では本文を読み込まずに済む。
+        """
+        await ensure_schema(self.settings)
+        surql, params = query.compile(self.layout, body_parts=self.body_store is not None)
         async with self.db:
-            surql = """
-                SELECT count() as count
-                FROM type::thing("mail_messages", $id)
-            """
-            result = await self.db.query(surql, {"id": mail_message.id})
-            
-            def safe_get_nested(data, default=0):
-                try:
-                    return data[0].get('result',{})[0].get('count', default)
-                except (IndexError, AttributeError):
-                    return default
-            
-            count = safe_get_nested(result, default=0)
-            return count > 0
+            result = await self.db.query(surql, params)
+        rows = (result[-1].get('result') or []) if result else []
+        return [self._convert_query_row(row, query) for row in rows]
+
+    def _convert_query_row(self, row: Dict[str, Any], query: MailQuery) -> MailQueryRow:
+        fields = set(query.fields)
+        converted = MailQueryRow(id=row['id'].split(":")[-1])
+        if "subject" in fields:
+            converted.subject = row.get('subject')
+        if "mail_date" in fields and row.get('mail_date'):
+            converted.mail_date = datetime.fromisoformat(row['mail_date'])
+        if "body" in fields:
+            parts = row.get('body_parts')
+            converted.body = self._decode_body(parts) if parts else row.get('body')
+        if "sender" in fields and isinstance(row.get('sender'), dict):
+            sender = row['sender']
+            converted.sender = ContactPerson(email=sender['email'], name=sender.get('name') or "")
+        if "recipients" in fields:
+            recipients = [r for r in row.get('recipients') or [] if isinstance(r, dict)]
+            converted.to_addresses, converted.cc_addresses = [
+                [
+                    ContactPerson(email=r['email'], name=r.get('name') or "")
+                    for r in recipients if r['recipient_type'] == recipient_type
+                ]
+                for recipient_type in (RecipientType.TO, RecipientType.CC)
+            ]
+        if "attachments" in fields:
+            converted.attachments = [
+                a['file_path'] for a in row.get('attachments') or [] if isinstance(a, dict)
+            ]
+        return converted
+
+    async def search(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        """
+        件名と本文を全文検索し、スコアの高い順に返す
+
+        Args:
+            text: 検索文字列
+            filters: 絞り込み条件
+            limit: 最大件数
+
+        Returns:
+            List[MailSearchResult]: 検索結果（ハイライトは<mark>タグで囲む）
+        """
+        await ensure_schema(self.settings)
+
+        conditions = ["(subject @1@ $text OR body @2@ $text)"]
+        params: Dict[str, Any] = {"text": text, "limit": limit}
+        filters = filters or MailSearchFilters()
+        if filters.start_date:
+            conditions.append("mail_date >= $start_date")
+            params["start_date"] = filters.start_date.isoformat()
+        if filters.end_date:
+            conditions.append("mail_date <= $end_date")
+            params["end_date"] = filters.end_date.isoformat()
+        prefix = ""
+        if filters.sender:
+            # 全文検索のインデックスで絞り込んだうえで、送信者のメッセージIDと照合する
+            prefix, _, condition = self._sender_filter()
+            conditions.append(condition or "id IN $sender_ids")
+            params["sender"] = filters.sender
+
+        surql = f"""
+            {prefix}
+            SELECT
+                meta::id(id) AS id,
+                subject,
+                mail_date,
+                search::score(1) + search::score(2) AS score,
+                search::highlight('<mark>', '</mark>', 1) AS subject_highlight,
+                search::highlight('<mark>', '</mark>', 2) AS body_highlight
+            FROM mail_messages
+            WHERE {" AND ".join(conditions)}
+            ORDER BY score DESC
+            LIMIT $limit
+        """
+        async with self.db:
+            result = await self.db.query(surql, params)
+
+        return [
+            MailSearchResult(
+                id=row['id'],
+                subject=row['subject'],
+                mail_date=datetime.fromisoformat(row['mail_date']),
+                score=row.get('score') or 0.0,
+                subject_highlight=row.get('subject_highlight') or row['subject'],
+                body_highlight=row.get('body_highlight') or "",
+            )
+            for row in ((result[-1].get('result') or []) if result else [])
+        ]
+
+    async def exists_many(self, message_ids: Iterable[str]) -> Set[str]:
+        """
+        指定されたIDのうち、既に保存されているものを返す
+
+        IDインデックスが設定されている場合は、インデックスで判定できないIDのみ
+        1回のクエリでデータベースに問い合わせる。
+
+        Args:
+            message_ids: 確認するメッセージID
+
+        Returns:
+            Set[str]: 保存済みのメッセージID
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        found: Set[str] = set()
+        unknown: List[str] = []
+
+        if self.id_index:
+            await self._warm_id_index()
+            for message_id in message_ids:
+                contained = self.id_index.contains(message_id)
+                if contained is None:
+                    unknown.append(message_id)
+                elif contained:
+                    found.add(message_id)
+        else:
+            unknown = message_ids
+
+        if unknown:
+            records = ", ".join(
+                f"type::thing('mail_messages', $id{index})" for index in range(len(unknown))
+            )
+            surql = f"SELECT VALUE meta::id(id) FROM [{records}]"
+            params = {f"id{index}": message_id for index, message_id in enumerate(unknown)}
+            async with self.db:
+                result = await self.db.query(surql, params)
+            stored = set(result[0].get('result') or []) if result else set()
+            found |= stored
+            if self.id_index:
+                self.id_index.add_many(stored)
+
+        return found
+
+    async def delete_many(self, message_ids: Iterable[str]) -> None:
+        """
+        指定されたIDのメールメッセージを削除する
+
+        送信者・受信者・添付ファイルのレコードとグラフエッジも合わせて削除する。
+        本文は他のメッセージと共有している可能性があるため削除しない。
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        if not message_ids:
+            return
+        await ensure_schema(self.settings)
+
+        statements: List[str] = []
+        params: Dict[str, Any] = {"ids": message_ids}
+        for index, message_id in enumerate(message_ids):
+            statements.extend([
+                f"LET $d{index} = type::thing('mail_messages', $d{index}_id);",
+                f"LET $d{index}_edges = array::flatten("
+                f"SELECT VALUE array::flatten([<-sent, ->to, ->cc]) FROM $d{index});",
+                f"DELETE $d{index}_edges;",
+                f"DELETE $d{index};",
+            ])
+            params[f"d{index}_id"] = message_id
+        if self.layout == "linked":
+            statements.extend(
+                f"DELETE {table} WHERE message_id IN $ids;"
+                for table in ("mail_senders", "mail_recipients", "mail_attachments")
+            )
+        async with self.db:
+            await self.db.execute_transaction(statements, params)
+
+        if self.id_index:
+            self.id_index.discard_many(message_ids)
+        if self.message_cache:
+            for message_id in message_ids:
+                self.message_cache.invalidate(message_id)
+
+    async def _warm_id_index(self) -> None:
+        """保存済みの全メッセージIDをインデックスに読み込む"""
+        if self.id_index.warmed:
+            return
+        async with self.db:
+            result = await self.db.query("SELECT VALUE meta::id(id) FROM mail_messages")
+        self.id_index.warm((result[0].get('result') or []) if result else [])
+
+    async def find_correspondence(
+        self,
+        email: str,
+        direction: Literal["all", "sent", "received"] = "all",
+        limit: int = 100,
+    ) -> List[MailMessage]:
+        """
+        連絡先とやり取りしたメールを新しい順に返す
+
+        連絡先からのエッジをたどるため、送信者・受信者のテーブルを走査しない。
+
+        Args:
+            email: 連絡先のメールアドレス
+            direction: "sent" は連絡先が送信したメール、"received" は連絡先が
+                To または CC に含まれるメール、"all" はその両方
+            limit: 最大件数
+        """
+        paths = {
+            "sent": ["->sent->mail_messages"],
+            "received": ["<-to<-mail_messages", "<-cc<-mail_messages"],
+        }
+        selected = paths["sent"] + paths["received"] if direction == "all" else paths[direction]
+        surql = f"""
+            LET $messages = array::distinct(array::flatten(array::flatten(
+                SELECT VALUE [{", ".join(selected)}]
+                FROM type::thing('mail_contacts', $email)
+            )));
+            SELECT *
+            FROM $messages
+            ORDER BY mail_date DESC
+            LIMIT $limit
+            {self._fetch_clause};
+        """
+        async with self.db:
+            result = await self.db.query(surql, {"email": email, "limit": limit})
+        rows = (result[-1].get('result') or []) if result else []
+        return [self._convert_surreal_result_to_entity(row) for row in rows]
+
+    async def top_correspondents(self, limit: int = 10) -> List[MailCorrespondent]:
+        """
+        やり取りしたメールの件数が多い連絡先を返す
+
+        件数は保存時に更新される集計テーブル（mail_contact_stats）から読み込み、
+        並べ替えと件数の絞り込みはデータベースで行う。送信・受信ごとの件数と期間は
+        上位の連絡先についてのみ mail_sender_stats, mail_recipient_stats から読み込む。
+        """
+        await ensure_schema(self.settings)
+        surql = """
+            LET $top = (
+                SELECT contact, message_count FROM mail_contact_stats
+                WHERE message_count > 0
+                ORDER BY message_count DESC
+                LIMIT $limit
+            );
+            SELECT
+                meta::id(contact) AS email,
+                contact.name AS name,
+                type::thing('mail_sender_stats', [contact]).message_count AS sent_count,
+                type::thing('mail_sender_stats', [contact]).first_seen AS sent_first_seen,
+                type::thing('mail_sender_stats', [contact]).last_seen AS sent_last_seen,
+                type::thing('mail_recipient_stats', [contact]).message_count AS received_count,
+                type::thing('mail_recipient_stats', [contact]).first_seen AS received_first_seen,
+                type::thing('mail_recipient_stats', [contact]).last_seen AS received_last_seen
+            FROM $top;
+        """
+        async with self.db:
+            result = await self.db.query(surql, {"limit": limit})
+        rows = (result[-1].get('result') or []) if result else []
+
+        top = []
+        for row in rows:
+            correspondent = MailCorrespondent(
+                email=row['email'],
+                name=row.get('name'),
+                sent_count=row.get('sent_count') or 0,
+                received_count=row.get('received_count') or 0,
+            )
+            for prefix in ("sent", "received"):
+                self._merge_seen(correspondent, {
+                    'first_seen': row.get(f'{prefix}_first_seen'),
+                    'last_seen': row.get(f'{prefix}_last_seen'),
+                })
+            top.append(correspondent)
+        return top
+
+    async def contact_stats(self, email: str) -> MailCorrespondent:
+        """
+        連絡先とやり取りしたメールの件数と、最初・最後にやり取りした日時を返す
+
+        集計テーブルのレコードをIDで読み込むため、やり取りの件数によらず一定の時間で返る。
+        """
+        await ensure_schema(self.settings)
+        surql = """
+            LET $contact = type::thing('mail_contacts', $email);
+            SELECT name FROM $contact;
+            SELECT message_count, first_seen, last_seen
+            FROM type::thing('mail_sender_stats', [$contact]);
+            SELECT message_count, first_seen, last_seen
+            FROM type::thing('mail_recipient_stats', [$contact]);
+        """
+        async with self.db:
+            result = await self.db.query(surql, {"email": email})
+        contact, sent, received = [
+            ((result[index].get('result') or [{}])[0] if len(result) > index else {}) or {}
+            for index in (1, 2, 3)
+        ]
+        correspondent = MailCorrespondent(
+            email=email,
+            name=contact.get('name'),
+            sent_count=sent.get('message_count') or 0,
+            received_count=received.get('message_count') or 0,
+        )
+        self._merge_seen(correspondent, sent)
+        self._merge_seen(correspondent, received)
+        return correspondent
+
+    @staticmethod
+    def _merge_seen(correspondent: MailCorrespondent, row: Dict[str, Any]) -> None:
+        """集計テーブルの最初・最後の日時を連絡先の期間に反映する"""
+        first_seen = from_timestamp(row.get('first_seen'))
+        last_seen = from_timestamp(row.get('last_seen'))
+        if first_seen and (correspondent.first_seen is None or first_seen < correspondent.first_seen):
+            correspondent.first_seen = first_seen
+        if last_seen and (correspondent.last_seen is None or last_seen > correspondent.last_seen):
+            correspondent.last_seen = last_seen
+
+    async def rebuild_contact_stats(self) -> None:
+        """
+        連絡先ごとの送信・受信の集計テーブルを作り直す
+
+        SurrealDB 1.x の集計テーブルはエッジの削除時に math::min/max を再計算しないため、
+        メールを削除した後は最初・最後にやり取りした日時が削除したメールのまま残る。
+        定義し直すと既存のエッジから集計し直される。
+        """
+        await ensure_schema(self.settings)
+        statements = [
+            statement
+            for table, view in CONTACT_STATS_VIEWS.items()
+            for statement in (f"REMOVE TABLE {table};", f"DEFINE TABLE {table} AS {view};")
+        ]
+        async with self.db:
+            await self.db.execute_transaction(statements)
+
+    async def daily_counts(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> List[MailDailyCount]:
+        """
+        日ごとのメールの件数を日付順に返す（両端を含む）
+
+        保存時に更新される集計テーブル（mail_daily_stats）から読み込む。
+        """
+        await ensure_schema(self.settings)
+        conditions = ["message_count > 0"]
+        params: Dict[str, Any] = {}
+        if start:
+            conditions.append("mail_day >= $start")
+            params["start"] = start.isoformat()
+        if end:
+            conditions.append("mail_day <= $end")
+            params["end"] = end.isoformat()
+        surql = f"""
+            SELECT mail_day, message_count
+            FROM mail_daily_stats
+            WHERE {' AND '.join(conditions)}
+            ORDER BY mail_day
+        """
+        async with self.db:
+            result = await self.db.query(surql, params)
+        return [
+            MailDailyCount(day=date.fromisoformat(row['mail_day']), message_count=row['message_count'])
+            for row in ((result[0].get('result') or []) if result else [])
+        ]
+
+    async def body_stats(self) -> MailBodyStats:
+        """
+        本文の保存容量の統計を返す
+
+        logical_bytes は mail_bodies に保存した本文をメッセージごとに保存した場合の容量、
+        unique_bytes は重複を除いた容量、stored_bytes は圧縮後の容量に全文検索用に
+        mail_messages にも保存した返信部分（inline_bytes）を加えた容量を表す。
+        """
+        await ensure_schema(self.settings)
+        async with self.db:
+            result = await self.db.query(
+                "SELECT math::sum(body_parts.size) AS size, body_search_size "
+                "FROM mail_messages WHERE body_parts;"
+                f"SELECT count() AS bodies, math::sum(size) AS unique_bytes, "
+                f"math::sum(stored_size) AS stored_bytes FROM {BODY_TABLE} GROUP ALL;"
+            )
+        rows = (result[0].get('result') or []) if result else []
+        totals = (result[1].get('result') or [{}])[0] if len(result) > 1 else {}
+        inline_bytes = int(sum(row.get('body_search_size') or 0 for row in rows))
+        return MailBodyStats(
+            messages=len(rows),
+            bodies=totals.get('bodies') or 0,
+            logical_bytes=int(sum(row.get('size') or 0 for row in rows)),
+            unique_bytes=int(totals.get('unique_bytes') or 0),
+            stored_bytes=int(totals.get('stored_bytes') or 0) + inline_bytes,
+            inline_bytes=inline_bytes,
+        )
+
+    async def migrate_to_embedded(self, batch_size: int = 200) -> int:
+        """
+        別テーブルに保存した送信者・受信者・添付ファイルをメッセージに埋め込む
+
+        未変換のメッセージのIDを1度の走査で取得し、batch_size 件ずつIDで読み込んで変換する。
+        変換したメッセージが参照していた送信者・受信者・添付ファイルのレコードは
+        同じトランザクションで削除する。途中で中断しても、再実行すると
+        未変換のメッセージのみが変換される。
+
+        Returns:
+            int: 変換したメッセージの件数
+        """
+        await ensure_schema(self.settings)
+        async with self.db:
+            result = await self.db.query(
+                'SELECT VALUE meta::id(id) FROM mail_messages WHERE layout != "embedded"'
+            )
+        pending = [str(message_id) for message_id in ((result[0].get('result') or []) if result else [])]
+
+        migrated = 0
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            records = ", ".join(
+                f"type::thing('mail_messages', $id{index})" for index in range(len(chunk))
+            )
+            surql = f"SELECT * FROM [{records}] FETCH sender, recipients, attachments"
+            params = {f"id{index}": message_id for index, message_id in enumerate(chunk)}
+            async with self.db:
+                result = await self.db.query(surql, params)
+            rows = [row for row in ((result[0].get('result') or []) if result else []) if row]
+            if not rows:
+                continue
+
+            names = await self._find_contact_names({
+                contact['email']
+                for row in rows
+                for contact in [row.get('sender'), *row.get('recipients', [])]
+                if isinstance(contact, dict)
+            })
+            statements: List[str] = []
+            batch: Dict[str, Any] = {}
+            ids: List[str] = []
+            children: List[List[str]] = []
+            for index, row in enumerate(rows):
+                message_id = row['id'].split(":")[-1]
+                sender = row.get('sender')
+                sender_email = sender['email'] if isinstance(sender, dict) else ""
+                entity = EmbeddedMailMessageEntity(
+                    id=message_id,
+                    subject=row['subject'],
+                    mail_date=row['mail_date'],
+                    body=row['body'],
+                    sender=EmbeddedContactEntity(email=sender_email, name=names.get(sender_email)),
+                    recipients=[
+                        EmbeddedRecipientEntity(
+                            email=r['email'],
+                            name=names.get(r['email']),
+                            recipient_type=r['recipient_type'],
+                        )
+                        for r in row.get('recipients', []) if isinstance(r, dict)
+                    ],
+                    attachments=[
+                        EmbeddedAttachmentEntity(file_path=a['file_path'])
+                        for a in row.get('attachments', []) if isinstance(a, dict)
+                    ],
+                )
+                statements.append(f"UPDATE type::thing('mail_messages', $m{index}.id) CONTENT $m{index};")
+                batch[f"m{index}"] = entity.model_dump(mode="json")
+                if row.get('body_parts'):
+                    batch[f"m{index}"]["body_parts"] = row['body_parts']
+                    batch[f"m{index}"]["body_search_size"] = row.get('body_search_size') or 0
+                ids.append(message_id)
+                children.extend(
+                    self._split_record_id(child['id'])
+                    for child in [sender, *row.get('recipients', []), *row.get('attachments', [])]
+                    if isinstance(child, dict) and child.get('id')
+                )
+
+            # 参照先はIDで削除するため、送信者等のテーブルは走査しない
+            statements.append("FOR $child IN $children { DELETE type::thing($child[0], $child[1]); };")
+            async with self.db:
+                await self.db.execute_transaction(statements, {**batch, "children": children})
+
+            if self.message_cache:
+                for message_id in ids:
+                    self.message_cache.invalidate(message_id)
+            migrated += len(ids)
+        return migrated
+
+    @staticmethod
+    def _split_record_id(record_id: str) -> List[str]:
+        """"table:id" 形式のレコードIDをテーブル名とIDに分割する"""
+        table, key = record_id.split(":", 1)
+        return [table, key.strip("⟨⟩`")]
+
+    async def _find_contact_names(self, emails: Set[str]) -> Dict[str, str]:
+        """連絡先の名前をメールアドレスごとに返す"""
+        if not emails:
+            return {}
+        emails = sorted(emails)
+        records = ", ".join(
+            f"type::thing('mail_contacts', $email{index})" for index in range(len(emails))
+        )
+        surql = f"SELECT meta::id(id) AS email, name FROM [{records}]"
+        params = {f"email{index}": email for index, email in enumerate(emails)}
+        async with self.db:
+            result = await self.db.query(surql, params)
+        return {
+            row['email']: row['name']
+            for row in ((result[0].get('result') or []) if result else [])
+            if row and row.get('name') is not None
+        }
 
 if __name__ == "__main__":
     import asyncio
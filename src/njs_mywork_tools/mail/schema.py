@@ -0,0 +1,221 @@
+"""メール関連テーブルのスキーマ定義
+
+テーブルは既存データとの互換性のためスキーマレスのまま、
+絞り込みに使用するフィールドの型とインデックスを定義する。
+"""
+
+import asyncio
+from typing import Any, Dict, List, Set, Tuple
+
+from njs_mywork_tools.mail.query import MailQuery
+from njs_mywork_tools.settings import Settings, SurrealDBSetting
+from njs_mywork_tools.storage import Database
+from njs_mywork_tools.storage.migrations import Migration, MigrationRunner
+
+# 連絡先ごとの送信・受信の集計テーブル。math::min/max は差分で更新されるため、
+# SurrealDB 1.x ではエッジを削除しても first_seen/last_seen が戻らない。
+# アーカイブ等でメールを削除した後は MailRepository.rebuild_contact_stats で作り直す
+CONTACT_STATS_VIEWS: Dict[str, str] = {
+    "mail_sender_stats": (
+        "SELECT in, count() AS message_count, math::min(mail_ts) AS first_seen, "
+        "math::max(mail_ts) AS last_seen FROM sent GROUP BY in"
+    ),
+    "mail_recipient_stats": (
+        "SELECT out, count() AS message_count, math::min(mail_ts) AS first_seen, "
+        "math::max(mail_ts) AS last_seen FROM to, cc GROUP BY out"
+    ),
+}
+
+MAIL_MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        name="mail_tables_and_indexes",
+        statements=[
+            "DEFINE TABLE mail_messages SCHEMALESS;",
+            "DEFINE FIELD mail_date ON mail_messages TYPE string;",
+            "DEFINE FIELD subject ON mail_messages TYPE string;",
+            "DEFINE INDEX mail_messages_mail_date ON mail_messages FIELDS mail_date;",
+
+            "DEFINE TABLE mail_senders SCHEMALESS;",
+            "DEFINE FIELD email ON mail_senders TYPE string;",
+            "DEFINE FIELD message_id ON mail_senders TYPE string;",
+            "DEFINE INDEX mail_senders_email ON mail_senders FIELDS email;",
+            "DEFINE INDEX mail_senders_message_id ON mail_senders FIELDS message_id;",
+
+            "DEFINE TABLE mail_recipients SCHEMALESS;",
+            "DEFINE FIELD email ON mail_recipients TYPE string;",
+            "DEFINE FIELD message_id ON mail_recipients TYPE string;",
+            "DEFINE FIELD recipient_type ON mail_recipients TYPE string;",
+            "DEFINE INDEX mail_recipients_email ON mail_recipients FIELDS email;",
+            "DEFINE INDEX mail_recipients_message_id ON mail_recipients FIELDS message_id;",
+
+            "DEFINE TABLE mail_attachments SCHEMALESS;",
+            "DEFINE FIELD message_id ON mail_attachments TYPE string;",
+            "DEFINE INDEX mail_attachments_message_id ON mail_attachments FIELDS message_id;",
+
+            "DEFINE TABLE mail_contacts SCHEMALESS;",
+        ],
+    ),
+    Migration(
+        version=2,
+        name="mail_fulltext_search",
+        statements=[
+            # 日本語は空白で区切られないため、文字種で区切ったうえで n-gram に分割する
+            "DEFINE ANALYZER mail_ja TOKENIZERS blank, class, punct FILTERS lowercase, ngram(2, 3);",
+            "DEFINE FIELD body ON mail_messages TYPE string;",
+            "DEFINE INDEX mail_messages_subject_search ON mail_messages "
+            "FIELDS subject SEARCH ANALYZER mail_ja BM25 HIGHLIGHTS;",
+            "DEFINE INDEX mail_messages_body_search ON mail_messages "
+            "FIELDS body SEARCH ANALYZER mail_ja BM25 HIGHLIGHTS;",
+        ],
+    ),
+    Migration(
+        version=3,
+        name="mail_embedded_layout",
+        statements=[
+            # 送信者等を埋め込む保存形式で送信者による絞り込みに使用する
+            "DEFINE INDEX mail_messages_sender_email ON mail_messages FIELDS sender.email;",
+        ],
+    ),
+    Migration(
+        version=4,
+        name="mail_bodies",
+        statements=[
+            # 本文は内容のハッシュをIDとして保存するため、IDによる参照のみでインデックスは不要
+            "DEFINE TABLE mail_bodies SCHEMALESS;",
+            "DEFINE FIELD codec ON mail_bodies TYPE string;",
+            "DEFINE FIELD size ON mail_bodies TYPE int;",
+            "DEFINE FIELD stored_size ON mail_bodies TYPE int;",
+        ],
+    ),
+    Migration(
+        version=5,
+        name="mail_contact_edges",
+        statements=[
+            # mail_contacts->sent->mail_messages, mail_messages->to/cc->mail_contacts
+            "DEFINE TABLE sent SCHEMALESS;",
+            "DEFINE TABLE to SCHEMALESS;",
+            "DEFINE TABLE cc SCHEMALESS;",
+        ],
+    ),
+    Migration(
+        version=6,
+        name="mail_messages_subject_index",
+        statements=[
+            # クエリビルダーの件名の前方一致（範囲条件）に使用する
+            "DEFINE INDEX mail_messages_subject ON mail_messages FIELDS subject;",
+        ],
+    ),
+    Migration(
+        version=7,
+        name="mail_aggregates",
+        statements=[
+            # 集計用の日付（YYYY-MM-DD）とエッジの日時（UNIX時間）を既存のレコードにも設定する
+            "DEFINE FIELD mail_day ON mail_messages VALUE string::slice(mail_date, 0, 10);",
+            "UPDATE mail_messages SET mail_day = string::slice(mail_date, 0, 10);",
+            "UPDATE sent SET mail_ts = time::unix(<datetime> string::concat(out.mail_date, 'Z'));",
+            "UPDATE to, cc SET mail_ts = time::unix(<datetime> string::concat(in.mail_date, 'Z'));",
+
+            # 集計テーブルはメッセージ・エッジの作成・更新・削除のたびに差分で更新される
+            "DEFINE TABLE mail_daily_stats AS "
+            "SELECT mail_day, count() AS message_count FROM mail_messages GROUP BY mail_day;",
+            *[f"DEFINE TABLE {table} AS {view};" for table, view in CONTACT_STATS_VIEWS.items()],
+
+            # 連絡先からは集計テーブルのレコードをIDで参照する（読み込み時に評価される）
+            "DEFINE FIELD sent_count ON mail_contacts VALUE <future> "
+            "{ type::thing('mail_sender_stats', [id]).message_count OR 0 };",
+            "DEFINE FIELD received_count ON mail_contacts VALUE <future> "
+            "{ type::thing('mail_recipient_stats', [id]).message_count OR 0 };",
+            "DEFINE FIELD first_seen ON mail_contacts VALUE <future> { array::min([ "
+            "type::thing('mail_sender_stats', [id]).first_seen, "
+            "type::thing('mail_recipient_stats', [id]).first_seen][WHERE $this]) };",
+            "DEFINE FIELD last_seen ON mail_contacts VALUE <future> { array::max([ "
+            "type::thing('mail_sender_stats', [id]).last_seen, "
+            "type::thing('mail_recipient_stats', [id]).last_seen][WHERE $this]) };",
+            "UPDATE mail_contacts;",
+        ],
+    ),
+    Migration(
+        version=8,
+        name="mail_contact_totals",
+        statements=[
+            # 送信・受信をまとめた連絡先ごとの件数で、件数順の取得をデータベースで行う
+            "DEFINE FIELD contact ON sent VALUE in;",
+            "DEFINE FIELD contact ON to VALUE out;",
+            "DEFINE FIELD contact ON cc VALUE out;",
+            "UPDATE sent, to, cc;",
+            "DEFINE TABLE mail_contact_stats AS "
+            "SELECT contact, count() AS message_count FROM sent, to, cc GROUP BY contact;",
+        ],
+    ),
+]
+
+# インデックスが効いていることを確認する代表的なクエリ
+MAIL_INDEX_CHECK_QUERIES: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "messages_by_date": (
+        "SELECT id FROM mail_messages WHERE mail_date >= $start AND mail_date < $end",
+        {"start": "2025-01-01T00:00:00", "end": "2025-02-01T00:00:00"},
+    ),
+    "senders_by_email": (
+        "SELECT message_id FROM mail_senders WHERE email = $email",
+        {"email": "user@example.com"},
+    ),
+    "recipients_by_email": (
+        "SELECT message_id FROM mail_recipients WHERE email = $email",
+        {"email": "user@example.com"},
+    ),
+    "recipients_by_message_id": (
+        "SELECT * FROM mail_recipients WHERE message_id = $message_id",
+        {"message_id": "INBOX_1"},
+    ),
+    "attachments_by_message_id": (
+        "SELECT * FROM mail_attachments WHERE message_id = $message_id",
+        {"message_id": "INBOX_1"},
+    ),
+    "query_by_sender": MailQuery().from_sender("user@example.com").limit(50).compile(),
+    "query_by_sender_and_recipient": (
+        MailQuery().from_sender("user@example.com").to_recipient("user@example.com").compile()
+    ),
+}
+
+
+_migrated: Set[Tuple[str, str, str]] = set()
+# 同じ接続先へのマイグレーションを直列化するロック（イベントループごと）
+_migration_locks: Dict[Tuple[Tuple[str, str, str], int], asyncio.Lock] = {}
+
+
+async def migrate(settings: SurrealDBSetting) -> List[Migration]:
+    """未適用のスキーマ変更を適用する"""
+    return await MigrationRunner(Database(settings), MAIL_MIGRATIONS).apply()
+
+
+async def ensure_schema(settings: SurrealDBSetting) -> None:
+    """プロセス内で接続先ごとに1度だけスキーマ変更を適用する"""
+    key = (settings.url, settings.namespace, settings.database)
+    if key in _migrated:
+        return
+    lock = _migration_locks.setdefault((key, id(asyncio.get_running_loop())), asyncio.Lock())
+    async with lock:
+        # 待機中に他のタスクが適用を済ませていれば何もしない
+        if key in _migrated:
+            return
+        await migrate(settings)
+        _migrated.add(key)
+
+
+async def check_indexes(settings: SurrealDBSetting) -> Dict[str, List[Dict[str, Any]]]:
+    """テーブル全体の走査となっているクエリを返す"""
+    runner = MigrationRunner(Database(settings), MAIL_MIGRATIONS)
+    return await runner.find_table_scans(MAIL_INDEX_CHECK_QUERIES)
+
+
+if __name__ == "__main__":
+    async def main():
+        settings = Settings().surrealdb
+        applied = await migrate(settings)
+        for migration in applied:
+            print(f"applied: {migration.version} {migration.name}")
+        for name, plan in (await check_indexes(settings)).items():
+            print(f"table scan: {name} {plan}")
+
+    asyncio.run(main())
@@ -0,0 +1,334 @@
+from datetime import datetime
+from pathlib import Path
+from typing import (Any, AsyncIterator, Dict, Iterable, List, Optional, Set,
+                    Union)
+
+from njs_mywork_tools.mail.cache import MessageIdIndex, ReadThroughCache
+from njs_mywork_tools.mail.models.entities import RecipientType
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.models.search import (MailSearchFilters,
+                                                 MailSearchResult)
+from njs_mywork_tools.mail.store import MailStore
+from njs_mywork_tools.storage.sqlite import SQLiteDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mail_messages (
+    id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    mail_date TEXT NOT NULL,
+    body TEXT NOT NULL,
+    sender_email TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mail_messages_mail_date ON mail_messages (mail_date, id);
+CREATE INDEX IF NOT EXISTS mail_messages_sender_email ON mail_messages (sender_email);
+
+CREATE TABLE IF NOT EXISTS mail_recipients (
+    message_id TEXT NOT NULL REFERENCES mail_messages (id) ON DELETE CASCADE,
+    email TEXT NOT NULL,
+    recipient_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mail_recipients_message_id ON mail_recipients (message_id);
+CREATE INDEX IF NOT EXISTS mail_recipients_email ON mail_recipients (email);
+
+CREATE TABLE IF NOT EXISTS mail_attachments (
+    message_id TEXT NOT NULL REFERENCES mail_messages (id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mail_attachments_message_id ON mail_attachments (message_id);
+
+CREATE TABLE IF NOT EXISTS mail_contacts (
+    email TEXT PRIMARY KEY,
+    name TEXT
+);
+
+-- trigram は空白で区切られない日本語でも部分一致で検索できる
+CREATE VIRTUAL TABLE IF NOT EXISTS mail_messages_fts USING fts5(
+    subject, body, content='mail_messages', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS mail_messages_ai AFTER INSERT ON mail_messages BEGIN
+    INSERT INTO mail_messages_fts (rowid, subject, body) VALUES (new.rowid, new.subject, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS mail_messages_ad AFTER DELETE ON mail_messages BEGIN
+    INSERT INTO mail_messages_fts (mail_messages_fts, rowid, subject, body)
+    VALUES ('delete', old.rowid, old.subject, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS mail_messages_au AFTER UPDATE ON mail_messages BEGIN
+    INSERT INTO mail_messages_fts (mail_messages_fts, rowid, subject, body)
+    VALUES ('delete', old.rowid, old.subject, old.body);
+    INSERT INTO mail_messages_fts (rowid, subject, body) VALUES (new.rowid, new.subject, new.body);
+END;
+"""
+
+# trigram で検索できない短い検索語は LIKE で検索する
+_TRIGRAM_MIN_LENGTH = 3
+
+
+class SQLiteMailRepository(MailStore):
+    """メールメッセージの永続化を担当するリポジトリ（組み込みSQLite）
+
+    サーバーを必要としないため、ローカルでの分析や単体での運用に使用する。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        id_index: Optional[MessageIdIndex] = None,
+        message_cache: Optional[ReadThroughCache[MailMessage]] = None,
+    ):
+        self.db = SQLiteDatabase(path)
+        self.id_index = id_index
+        self.message_cache = message_cache
+        self._initialized = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._initialized:
+            await self.db.executescript(SCHEMA)
+            self._initialized = True
+
+    async def save_many(self, mail_messages: List[MailMessage]) -> None:
+        """
+        複数のメールメッセージを1つのトランザクションでデータベースに保存する
+
+        同じIDのメッセージは置き換える。
+        """
+        if not mail_messages:
+            return
+        await self._ensure_schema()
+
+        ids = [(m.id,) for m in mail_messages]
+        contacts: Dict[str, str] = {}
+        for m in mail_messages:
+            for contact in [m.sender, *m.to_addresses, *m.cc_addresses]:
+                if contact.name is not None:
+                    contacts[contact.email] = contact.name
+
+        await self.db.execute_batch([
+            ("DELETE FROM mail_messages WHERE id = ?", ids),
+            (
+                "INSERT INTO mail_messages (id, subject, mail_date, body, sender_email) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (m.id, m.subject, m.mail_date.isoformat(), m.body, m.sender.email)
+                    for m in mail_messages
+                ],
+            ),
+            (
+                "INSERT INTO mail_recipients (message_id, email, recipient_type) VALUES (?, ?, ?)",
+                [
+                    (m.id, recipient.email, recipient_type.value)
+                    for m in mail_messages
+                    for recipients, recipient_type in [
+                        (m.to_addresses, RecipientType.TO),
+                        (m.cc_addresses, RecipientType.CC),
+                    ]
+                    for recipient in recipients
+                ],
+            ),
+            (
+                "INSERT INTO mail_attachments (message_id, file_path) VALUES (?, ?)",
+                [(m.id, attachment) for m in mail_messages for attachment in m.attachments],
+            ),
+            (
+                "INSERT INTO mail_contacts (email, name) VALUES (?, ?) "
+                "ON CONFLICT (email) DO UPDATE SET name = excluded.name "
+                "WHERE name IS NOT excluded.name",
+                list(contacts.items()),
+            ),
+        ])
+
+        if self.message_cache:
+            for m in mail_messages:
+                self.message_cache.invalidate(m.id)
+        if self.id_index:
+            self.id_index.add_many(m.id for m in mail_messages)
+
+    async def find_by_id(self, message_id: str) -> MailMessage:
+        """IDによるメールメッセージの検索"""
+        if self.message_cache:
+            return await self.message_cache.get(
+                message_id, lambda: self._find_by_id(message_id)
+            )
+        return await self._find_by_id(message_id)
+
+    async def _find_by_id(self, message_id: str) -> MailMessage:
+        await self._ensure_schema()
+        rows = await self.db.fetchall("SELECT * FROM mail_messages WHERE id = ?", (message_id,))
+        if not rows:
+            raise KeyError(message_id)
+        return (await self._to_messages(rows))[0]
+
+    async def exists_many(self, message_ids: Iterable[str]) -> Set[str]:
+        """指定されたIDのうち、既に保存されているものを返す"""
+        await self._ensure_schema()
+        message_ids = list(dict.fromkeys(message_ids))
+        found: Set[str] = set()
+        unknown: List[str] = []
+        for message_id in message_ids:
+            contained = self.id_index.contains(message_id) if self.id_index else None
+            if contained is None:
+                unknown.append(message_id)
+            elif contained:
+                found.add(message_id)
+
+        if unknown:
+            placeholders = ", ".join("?" for _ in unknown)
+            rows = await self.db.fetchall(
+                f"SELECT id FROM mail_messages WHERE id IN ({placeholders})", unknown
+            )
+            stored = {row["id"] for row in rows}
+            found |= stored
+            if self.id_index:
+                self.id_index.add_many(stored)
+        return found
+
+    async def delete_many(self, message_ids: Iterable[str]) -> None:
+        """指定されたIDのメールメッセージを削除する（受信者・添付ファイルも削除される）"""
+        await self._ensure_schema()
+        rows = [(message_id,) for message_id in message_ids]
+        await self.db.execute_batch([("DELETE FROM mail_messages WHERE id = ?", rows)])
+        if self.id_index:
+            self.id_index.discard_many(message_id for (message_id,) in rows)
+        if self.message_cache:
+            for (message_id,) in rows:
+                self.message_cache.invalidate(message_id)
+
+    async def search(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        """
+        件名と本文を全文検索し、スコアの高い順に返す
+
+        3文字未満の検索語は全文インデックスを使えないため、部分一致で検索する。
+        """
+        await self._ensure_schema()
+        filters = filters or MailSearchFilters()
+        conditions: List[str] = []
+        params: List[Any] = []
+
+        if len(text) >= _TRIGRAM_MIN_LENGTH:
+            select = (
+                "SELECT m.id, m.subject, m.mail_date, -bm25(mail_messages_fts) AS score, "
+                "highlight(mail_messages_fts, 0, '<mark>', '</mark>') AS subject_highlight, "
+                "highlight(mail_messages_fts, 1, '<mark>', '</mark>') AS body_highlight "
+                "FROM mail_messages_fts JOIN mail_messages m ON m.rowid = mail_messages_fts.rowid"
+            )
+            conditions.append("mail_messages_fts MATCH ?")
+            params.append('"' + text.replace('"', '""') + '"')
+        else:
+            select = (
+                "SELECT m.id, m.subject, m.mail_date, 0.0 AS score, "
+                "m.subject AS subject_highlight, '' AS body_highlight FROM mail_messages m"
+            )
+            conditions.append("(m.subject LIKE ? OR m.body LIKE ?)")
+            params.extend([f"%{text}%", f"%{text}%"])
+
+        if filters.start_date:
+            conditions.append("m.mail_date >= ?")
+            params.append(filters.start_date.isoformat())
+        if filters.end_date:
+            conditions.append("m.mail_date <= ?")
+            params.append(filters.end_date.isoformat())
+        if filters.sender:
+            conditions.append("m.sender_email = ?")
+            params.append(filters.sender)
+
+        sql = f"{select} WHERE {' AND '.join(conditions)} ORDER BY score DESC LIMIT ?"
+        rows = await self.db.fetchall(sql, [*params, limit])
+        return [
+            MailSearchResult(
+                id=row["id"],
+                subject=row["subject"],
+                mail_date=datetime.fromisoformat(row["mail_date"]),
+                score=row["score"],
+                subject_highlight=row["subject_highlight"],
+                body_highlight=row["body_highlight"],
+            )
+            for row in rows
+        ]
+
+    async def iter_messages(
+        self,
+        start: datetime,
+        end: datetime,
+        sender: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[MailMessage]:
+        """期間内のメールメッセージを (mail_date, id) のキーでページングしながら順次取得する"""
+        await self._ensure_schema()
+        conditions = ["mail_date >= ?", "mail_date <= ?"]
+        params: List[Any] = [start.isoformat(), end.isoformat()]
+        if sender:
+            conditions.append("sender_email = ?")
+            params.append(sender)
+
+        cursor: List[Any] = []
+        while True:
+            where = " AND ".join(conditions)
+            if cursor:
+                where += " AND (mail_date > ? OR (mail_date = ? AND id > ?))"
+            rows = await self.db.fetchall(
+                f"SELECT * FROM mail_messages WHERE {where} ORDER BY mail_date, id LIMIT ?",
+                [*params, *cursor, batch_size],
+            )
+            for message in await self._to_messages(rows):
+                yield message
+
+            if len(rows) < batch_size:
+                break
+            last = rows[-1]
+            cursor = [last["mail_date"], last["mail_date"], last["id"]]
+
+    async def _to_messages(self, rows) -> List[MailMessage]:
+        """メッセージ行に受信者・添付ファイル・連絡先名をまとめて付与する"""
+        ids = [row["id"] for row in rows]
+        if not ids:
+            return []
+        placeholders = ", ".join("?" for _ in ids)
+        recipient_rows = await self.db.fetchall(
+            "SELECT r.message_id, r.email, r.recipient_type, c.name FROM mail_recipients r "
+            "LEFT JOIN mail_contacts c ON c.email = r.email "
+            f"WHERE r.message_id IN ({placeholders}) ORDER BY r.rowid",
+            ids,
+        )
+        attachment_rows = await self.db.fetchall(
+            f"SELECT message_id, file_path FROM mail_attachments WHERE message_id IN ({placeholders}) "
+            "ORDER BY rowid",
+            ids,
+        )
+        sender_emails = list({row["sender_email"] for row in rows})
+        sender_rows = await self.db.fetchall(
+            "SELECT email, name FROM mail_contacts "
+            f"WHERE email IN ({', '.join('?' for _ in sender_emails)})",
+            sender_emails,
+        )
+        sender_names = {row["email"]: row["name"] or "" for row in sender_rows}
+
+        recipients: Dict[str, Dict[str, List[ContactPerson]]] = {
+            message_id: {RecipientType.TO.value: [], RecipientType.CC.value: []} for message_id in ids
+        }
+        for row in recipient_rows:
+            recipients[row["message_id"]][row["recipient_type"]].append(
+                ContactPerson(email=row["email"], name=row["name"] or "")
+            )
+        attachments: Dict[str, List[str]] = {message_id: [] for message_id in ids}
+        for row in attachment_rows:
+            attachments[row["message_id"]].append(row["file_path"])
+
+        return [
+            MailMessage(
+                id=row["id"],
+                subject=row["subject"],
+                mail_date=datetime.fromisoformat(row["mail_date"]),
+                body=row["body"],
+                sender=ContactPerson(
+                    email=row["sender_email"], name=sender_names.get(row["sender_email"], "")
+                ),
+                to_addresses=recipients[row["id"]][RecipientType.TO.value],
+                cc_addresses=recipients[row["id"]][RecipientType.CC.value],
+                attachments=attachments[row["id"]],
+            )
+            for row in rows
+        ]
@@ -0,0 +1,110 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Set
+
+from njs_mywork_tools.mail.models.message import MailMessage
+from njs_mywork_tools.mail.models.search import (MailSearchFilters,
+                                                 MailSearchResult)
+from njs_mywork_tools.settings import MailStorageSetting, SurrealDBSetting
+
+
+class MailStore(ABC):
+    """メールメッセージの保存先が実装するインターフェース"""
+
+    async def save_messages(self, messages: List[MailMessage]) -> None:
+        """メールメッセージをデータベースに保存する"""
+        await self.save_many(messages)
+
+    async def save(self, mail_message: MailMessage) -> None:
+        """メールメッセージをデータベースに保存する"""
+        await self.save_many([mail_message])
+
+    async def exists(self, mail_message: MailMessage) -> bool:
+        """指定されたメールメッセージが既に存在するか確認する"""
+        return mail_message.id in await self.exists_many([mail_message.id])
+
+    @abstractmethod
+    async def save_many(self, mail_messages: List[MailMessage]) -> None:
+        """複数のメールメッセージを1つのトランザクションで保存する"""
+
+    @abstractmethod
+    async def find_by_id(self, message_id: str) -> MailMessage:
+        """IDによるメールメッセージの検索"""
+
+    @abstractmethod
+    async def exists_many(self, message_ids: Iterable[str]) -> Set[str]:
+        """指定されたIDのうち、既に保存されているものを返す"""
+
+    @abstractmethod
+    async def delete_many(self, message_ids: Iterable[str]) -> None:
+        """指定されたIDのメールメッセージを削除する"""
+
+    @abstractmethod
+    async def search(
+        self,
+        text: str,
+        filters: Optional[MailSearchFilters] = None,
+        limit: int = 20,
+    ) -> List[MailSearchResult]:
+        """件名と本文を全文検索し、スコアの高い順に返す"""
+
+    @abstractmethod
+    def iter_messages(
+        self,
+        start: datetime,
+        end: datetime,
+        sender: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[MailMessage]:
+        """期間内のメールメッセージを日時順に順次取得する"""
+
+
+def create_mail_store(
+    surrealdb_setting: SurrealDBSetting,
+    storage_setting: Optional[MailStorageSetting] = None,
+    **kwargs,
+) -> MailStore:
+    """
+    設定に応じた保存先を生成する
+
+    Args:
+        surrealdb_setting: SurrealDBの接続設定
+        storage_setting: 保存先の設定。省略時はSurrealDB
+        **kwargs: 保存先のコンストラクタに渡す追加の引数
+    """
+    store = _create_backend_store(surrealdb_setting, storage_setting, **kwargs)
+    if storage_setting and storage_setting.archive_dir:
+        from njs_mywork_tools.mail.archive import ArchivedMailStore, MailArchive
+        store = ArchivedMailStore(store, MailArchive(storage_setting.archive_dir))
+    if storage_setting and storage_setting.journal_path:
+        from njs_mywork_tools.mail.journal import JournaledMailStore
+        return JournaledMailStore(
+            store, storage_setting.journal_path, id_index=kwargs.get("id_index")
+        )
+    return store
+
+
+def _create_backend_store(
+    surrealdb_setting: SurrealDBSetting,
+    storage_setting: Optional[MailStorageSetting],
+    **kwargs,
+) -> MailStore:
+    if storage_setting and storage_setting.backend == "sqlite":
+        from njs_mywork_tools.mail.sqlite_repository import \
+            SQLiteMailRepository
+        return SQLiteMailRepository(storage_setting.sqlite_path, **kwargs)
+
+    from njs_mywork_tools.mail.repository import MailRepository
+    if storage_setting is None:
+        return MailRepository(surrealdb_setting, **kwargs)
+
+    body_store = None
+    if storage_setting.body_storage == "deduplicated":
+        from njs_mywork_tools.mail.body_store import MailBodyStore
+        body_store = MailBodyStore(
+            compress_threshold=storage_setting.body_compress_threshold,
+            split_quoted=storage_setting.body_split_quoted,
+        )
+    return MailRepository(
+        surrealdb_setting, layout=storage_setting.layout, body_store=body_store, **kwargs
+    )
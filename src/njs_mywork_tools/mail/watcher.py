@@ -1,39 +1,59 @@
 import asyncio
 import json
 import logging
-from typing import AsyncGenerator, TypedDict
+from typing import AsyncGenerator, Optional, TypedDict
 
 from surrealdb import Surreal
 
+from njs_mywork_tools.mail.cache import ReadThroughCache
 from njs_mywork_tools.mail.models.entities import MailMessageEntity
 from njs_mywork_tools.mail.models.message import MailMessage
-from njs_mywork_tools.mail.repository import MailRepository
-from njs_mywork_tools.settings import Settings, SurrealDBSetting
+from njs_mywork_tools.mail.schema import ensure_schema
+from njs_mywork_tools.mail.store import create_mail_store
+from njs_mywork_tools.settings import (MailStorageSetting, Settings,
+                                       SurrealDBSetting)
+from njs_mywork_tools.storage import ConnectionPool
 
 
 class MailChangeEvent(TypedDict):
     action: str
-    mail_msg: MailMessage
+    mail_id: str
+    # 削除されたメールは取得できないため None
+    mail_msg: Optional[MailMessage]
 
 class MailWatcher:
     
-    def __init__(self, db: Surreal, settings: SurrealDBSetting):
+    def __init__(
+        self,
+        db: Surreal,
+        settings: SurrealDBSetting,
+        pool: ConnectionPool,
+        message_cache: Optional[ReadThroughCache[MailMessage]] = None,
+        storage_setting: Optional[MailStorageSetting] = None,
+    ):
         self.db = db
         self.settings = settings
+        self.pool = pool
+        self.message_cache = message_cache
+        self.storage_setting = storage_setting
         
     @classmethod
-    async def start(cls, settings: SurrealDBSetting):
-        db = Surreal(settings.url)
-        await db.connect()
-        await db.use(settings.namespace, settings.database)
-        await db.signin({'user': settings.username, 'pass': settings.password})
-        
-        return cls(db, settings)
+    async def start(
+        cls,
+        settings: SurrealDBSetting,
+        message_cache: Optional[ReadThroughCache[MailMessage]] = None,
+        storage_setting: Optional[MailStorageSetting] = None,
+    ):
+        await ensure_schema(settings)
+        pool = ConnectionPool.shared(settings)
+        db = await pool.acquire()
+        return cls(db, settings, pool, message_cache, storage_setting)
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        if self.db.ws and not self.db.ws.closed:
+        if self.db.ws and not self.db.ws.closed and hasattr(self, 'live_query_id'):
             await self.db.kill(self.live_query_id)
-        await self.db.close()
+        # LiveQueryの通知が残っている可能性があるため、接続は再利用しない
+        await self.pool.release(self.db, discard=True)
     
     async def watch_mails(self) -> AsyncGenerator[MailChangeEvent, None]:
         """メールの変更を監視し、更新があった場合にデータを返すasync generator
@@ -42,7 +62,10 @@ class MailWatcher:
             MailChangeEvent: 新規作成されたメールデータのID
         """
         
-        repos = MailRepository(self.settings)
+        # 本文の保存形式等は保存時と同じ設定で読み込む
+        repos = create_mail_store(
+            self.settings, self.storage_setting, message_cache=self.message_cache
+        )
         
         try:
             # LiveQueryを設定
@@ -56,19 +79,29 @@ class MailWatcher:
                 try:
                     # WebSocketからデータを待機
                     data = await self.db.ws.recv()
+                except Exception as e:
+                    logging.error(f"エラーが発生しました。: {e}")
+                    break
+
+                try:
                     result = json.loads(data)
                     
                     # LiveQueryの結果のみを処理
-                    if result.get('result') and isinstance(result['result'], dict):
-                        result_data = result['result']
-                        action = result_data['action']
-                        mail_id = result_data['record']
-                        mail_msg = await repos.find_by_id(mail_id)
-                        yield MailChangeEvent(action=action, mail_msg=mail_msg)
-                        
+                    if not (result.get('result') and isinstance(result['result'], dict)):
+                        continue
+                    result_data = result['result']
+                    action = result_data['action']
+                    mail_id = str(result_data['record']).split(":")[-1]
+                    # 更新・削除されたメールはキャッシュから除外する
+                    if self.message_cache and action in ("UPDATE", "DELETE"):
+                        self.message_cache.invalidate(mail_id)
+                    mail_msg = None if action == "DELETE" else await repos.find_by_id(mail_id)
                 except Exception as e:
-                    logging.error(f"エラーが発生しました。: {e}")
-                    break
+                    # 通知の直後に削除された場合等。1件の失敗で監視は止めない
+                    logging.error(f"変更の通知を処理できませんでした。: {e}")
+                    continue
+
+                yield MailChangeEvent(action=action, mail_id=mail_id, mail_msg=mail_msg)
                 
         finally:
             if hasattr(self, 'live_query_id'):
@@ -77,8 +110,8 @@ class MailWatcher:
 
 if __name__ == "__main__":
     async def main():
-        settings = Settings().surrealdb
-        watcher = await MailWatcher.start(settings)
+        settings = Settings()
+        watcher = await MailWatcher.start(settings.surrealdb, storage_setting=settings.mail_storage)
         async for mail in watcher.watch_mails():
             print(mail)
     
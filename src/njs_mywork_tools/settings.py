@@ -1,4 +1,4 @@
-from typing import Tuple, Type
+from typing import Dict, Literal, Optional, Tuple, Type
 
 from pydantic import BaseModel
 from pydantic_settings import (BaseSettings, PydanticBaseSettingsSource,
@@ -13,11 +13,26 @@ class XlwingsSetting(BaseModel):
     visible: bool
 
 
+class DenbunSendApiSetting(BaseModel):
+    endpoint: str
+    to_field: str = "to"
+    cc_field: str = "cc"
+    subject_field: str = "subject"
+    body_field: str = "body"
+    attachment_field: str = "attachment{index}"
+    extra_fields: Dict[str, str] = {}
+    token_field: Optional[str] = None
+    token_selector: Optional[str] = None
+    # 送信完了時の応答にのみ含まれる文字列（ログイン画面等の200応答を送信済みと誤認しないため必須）
+    success_marker: str
+
+
 class DenbunSetting(BaseModel):
     username: str
     password: str
     url: str
     session_timeout: int
+    send_api: Optional[DenbunSendApiSetting] = None
 
 
 class SurrealDBSetting(BaseModel):
@@ -26,6 +41,24 @@ class SurrealDBSetting(BaseModel):
     database: str
     username: str
     password: str
+    pool_size: int = 4
+
+
+class MailStorageSetting(BaseModel):
+    backend: Literal["surrealdb", "sqlite"] = "surrealdb"
+    # embedded は送信者・受信者・添付ファイルをメッセージに埋め込む（SurrealDBのみ）
+    layout: Literal["linked", "embedded"] = "linked"
+    # deduplicated は本文を重複を除いて mail_bodies に保存する（SurrealDBのみ）
+    # 全文検索の対象は引用部分を除いた本文となる
+    body_storage: Literal["inline", "deduplicated"] = "inline"
+    body_compress_threshold: int = 1024
+    body_split_quoted: bool = False
+    # 指定した場合、保存はジャーナルへの追記で完了とし、バックグラウンドでデータベースに反映する
+    journal_path: Optional[str] = None
+    # 指定した場合、archive_after_days 日より前の月のメールを年・月ごとの Parquet ファイルに移す
+    archive_dir: Optional[str] = None
+    archive_after_days: int = 365
+    sqlite_path: str = "data/mail.sqlite3"
 
 
 class GoogleSheetSetting(BaseModel):
@@ -40,6 +73,7 @@ class Settings(BaseSettings):
     xlwings: XlwingsSetting
     surrealdb: SurrealDBSetting
     google_sheet: GoogleSheetSetting
+    mail_storage: MailStorageSetting = MailStorageSetting()
     model_config = SettingsConfigDict(
         env_file=".env",
         env_nested_delimiter="__",
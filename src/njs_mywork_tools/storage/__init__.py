@@ -2,6 +2,8 @@
 Storage package for database operations
 """ 
 
-from .database import Database
+from .database import Database, DatabaseError
+from .pool import ConnectionPool
+from .sqlite import SQLiteDatabase
 
-__all__ = ["Database"]
+__all__ = ["Database", "DatabaseError", "ConnectionPool", "SQLiteDatabase"]
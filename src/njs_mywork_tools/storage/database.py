@@ -1,32 +1,114 @@
 import asyncio
 import logging
+import re
 import uuid
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from surrealdb import Surreal
 
 from njs_mywork_tools.settings import Settings, SurrealDBSetting
+from njs_mywork_tools.storage.pool import ConnectionPool
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# タスクごとに借用中の接続（プールのID -> (借用したタスク, 接続, ネストの深さ)）
+# create_task はコンテキストをコピーするため、借用中に作成された子タスクにも引き継がれる。
+# 接続は同時に1つのリクエストしか扱えないため、借用したタスク以外からは参照しない。
+_borrowed: ContextVar[Dict[int, Tuple[Optional[asyncio.Task], Surreal, int]]] = ContextVar(
+    "borrowed_connections", default={}
+)
+
+
+def _current_borrowed(key: int) -> Optional[Tuple[Surreal, int]]:
+    """現在のタスクが借用している接続とネストの深さ"""
+    entry = _borrowed.get().get(key)
+    if entry is None or entry[0] is not asyncio.current_task():
+        return None
+    return entry[1], entry[2]
+
+
+class DatabaseError(Exception):
+    """データベース操作に関する例外"""
+    pass
 
 
 class Database:
+    """
+    SurrealDBへのアクセスを提供するクラス
+
+    接続はコネクションプールから借用する。``async with`` の間は同じ接続を使い、
+    借用状態はタスクごとに管理されるため、1つのインスタンスを複数のタスクから同時に使用できる。
+    プールを指定しない場合は、接続先ごとに共有されるプールを使用する。
+    """
     
-    def __init__(self, settings: SurrealDBSetting):
+    def __init__(self, settings: SurrealDBSetting, pool: Optional[ConnectionPool] = None):
         self.settings = settings
-        self.db = Surreal(self.settings.url)
+        self._pool = pool
         self.logger = logging.getLogger(__name__)
 
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            self._pool = ConnectionPool.shared(self.settings)
+        return self._pool
+
+    @property
+    def db(self) -> Surreal:
+        """現在のタスクが借用している接続"""
+        borrowed = _current_borrowed(id(self.pool))
+        if borrowed is None:
+            raise DatabaseError("データベースに接続されていません")
+        return borrowed[0]
+
     async def connect(self):
-        await self.db.connect()
-        await self.db.use(namespace=self.settings.namespace, database=self.settings.database)
-        await self.db.signin({"user": self.settings.username, "pass": self.settings.password})
+        key = id(self.pool)
+        conn, depth = _current_borrowed(key) or (await self.pool.acquire(), 0)
+        borrowed = dict(_borrowed.get())
+        borrowed[key] = (asyncio.current_task(), conn, depth + 1)
+        _borrowed.set(borrowed)
 
     async def close(self):
-        await self.db.close()
+        key = id(self.pool)
+        current = _current_borrowed(key)
+        if current is None:
+            return
+        conn, depth = current
+        borrowed = dict(_borrowed.get())
+        if depth > 1:
+            borrowed[key] = (asyncio.current_task(), conn, depth - 1)
+            _borrowed.set(borrowed)
+            return
+        borrowed.pop(key)
+        _borrowed.set(borrowed)
+        await self.pool.release(conn)
 
     async def query(self, query: str, params: dict = {}):
         return await self.db.query(query, params)
 
+    async def execute_transaction(self, statements: List[str], params: Dict[str, Any] = {}):
+        """
+        複数のステートメントを1つのトランザクションとして1回のリクエストで実行します。
+
+        Args:
+            statements (List[str]): 実行するSurrealQLステートメント
+            params (Dict[str, Any]): ステートメントで参照するパラメータ
+
+        Returns:
+            list: ステートメントごとの実行結果
+
+        Raises:
+            DatabaseError: いずれかのステートメントが失敗した場合
+        """
+        surql = "\n".join(["BEGIN TRANSACTION;", *statements, "COMMIT TRANSACTION;"])
+        result = await self.query(surql, params)
+        errors = [r.get("detail") or r.get("result") for r in result or [] if r.get("status") == "ERR"]
+        if errors:
+            raise DatabaseError(f"Transaction failed: {errors[0]}")
+        return result
+
     async def create(self, collection: str, data: dict):
         return await self.db.create(collection, data)
     
@@ -61,6 +143,7 @@ class Database:
         """
         指定されたコレクションにデータをupsertします。
         データのIDが存在する場合は更新、存在しない場合は新規作成を行います。
+        1つのステートメントで実行するため、事前の存在確認は行いません。
 
         Args:
             collection (str): コレクション名
@@ -75,13 +158,57 @@ class Database:
         if 'id' not in data:
             raise ValueError("データにidキーが必要です")
 
-        existing_record = await self.find_by_id(collection, data['id'])
-        
-        if existing_record:
-            return await self.update(collection, data['id'], data)
-        else:
-            result = await self.create(collection, data)
-            return result
+        result = await self.upsert_many(collection, [data])
+        return result[0] if result else None
+
+    async def upsert_many(self, collection: str, rows: List[dict]) -> List[dict]:
+        """
+        指定されたコレクションに複数のデータを1つのステートメントでupsertします。
+
+        Args:
+            collection (str): コレクション名
+            rows (List[dict]): upsertするデータ（それぞれidキーを含む必要があります）
+
+        Returns:
+            List[dict]: 作成または更新されたレコード
+
+        Raises:
+            ValueError: データにidキーが含まれていない場合
+        """
+        if not rows:
+            return []
+        if any('id' not in row for row in rows):
+            raise ValueError("データにidキーが必要です")
+
+        fields = sorted({key for row in rows for key in row if key != 'id'})
+        result = await self.query(self.upsert_statement(collection, fields, "rows"), {"rows": rows})
+        if result and len(result) > 0 and 'result' in result[0]:
+            return result[0]['result']
+        return []
+
+    @staticmethod
+    def upsert_statement(collection: str, fields: List[str], param: str) -> str:
+        """
+        パラメータのレコード配列をupsertするステートメントを返します。
+
+        既存のレコードは指定したフィールドのみ更新し、それ以外のフィールドは保持します。
+
+        Args:
+            collection (str): コレクション名
+            fields (List[str]): 既存レコードで更新するフィールド
+            param (str): レコード配列を渡すパラメータ名
+
+        Returns:
+            str: SurrealQLステートメント
+        """
+        for name in [collection, *fields]:
+            if not _IDENTIFIER.match(name):
+                raise ValueError(f"不正な識別子です: {name}")
+        statement = f"INSERT INTO {collection} ${param}"
+        if fields:
+            updates = ", ".join(f"{field} = $input.{field}" for field in fields)
+            statement += f" ON DUPLICATE KEY UPDATE {updates}"
+        return statement + ";"
 
     async def update(self, collection: str, id: str, data: dict):
         """
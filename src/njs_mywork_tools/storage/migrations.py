@@ -0,0 +1,83 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from njs_mywork_tools.storage.database import Database
+
+MIGRATION_TABLE = "schema_migrations"
+
+
+@dataclass(frozen=True)
+class Migration:
+    """バージョン付きのスキーマ変更"""
+
+    version: int
+    name: str
+    statements: List[str] = field(default_factory=list)
+
+
+class MigrationRunner:
+    """
+    未適用のマイグレーションを順に適用するクラス
+
+    適用済みのバージョンは schema_migrations テーブルに記録するため、
+    起動のたびに実行しても未適用のものだけが適用される。
+    各マイグレーションはバージョンの記録と合わせて1つのトランザクションで実行する。
+    別のプロセスが同じマイグレーションを同時に適用した場合も失敗しないよう、
+    バージョンの記録は上書きで行う。
+    """
+
+    def __init__(self, db: Database, migrations: List[Migration]):
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.logger = logging.getLogger(__name__)
+
+    async def applied_versions(self) -> List[int]:
+        """適用済みのバージョンを返す"""
+        async with self.db:
+            result = await self.db.query(f"SELECT VALUE version FROM {MIGRATION_TABLE}")
+        return sorted((result[0].get("result") or []) if result else [])
+
+    async def apply(self) -> List[Migration]:
+        """
+        未適用のマイグレーションを適用する
+
+        Returns:
+            List[Migration]: 今回適用したマイグレーション
+        """
+        applied = set(await self.applied_versions())
+        pending = [m for m in self.migrations if m.version not in applied]
+        for migration in pending:
+            self.logger.info(f"Applying migration {migration.version}: {migration.name}")
+            statements = [
+                *migration.statements,
+                f"UPDATE type::thing('{MIGRATION_TABLE}', $version) "
+                "CONTENT { version: $version, name: $name, applied_at: time::now() };",
+            ]
+            async with self.db:
+                await self.db.execute_transaction(
+                    statements, {"version": migration.version, "name": migration.name}
+                )
+        return pending
+
+    async def find_table_scans(
+        self, queries: Dict[str, Tuple[str, Dict[str, Any]]]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        インデックスを使わずにテーブル全体を走査するクエリを検出する
+
+        Args:
+            queries: 名前ごとの (SELECTクエリ, パラメータ)
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: テーブル走査となるクエリ名と実行計画
+        """
+        scans = {}
+        async with self.db:
+            for name, (surql, params) in queries.items():
+                result = await self.db.query(f"{surql.rstrip().rstrip(';')} EXPLAIN;", params)
+                # LET で前処理するクエリは最後の SELECT の実行計画を確認する
+                plan = (result[-1].get("result") or []) if result else []
+                if any(step.get("operation") == "Iterate Table" for step in plan):
+                    scans[name] = plan
+        return scans
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from surrealdb import Surreal
+
+from njs_mywork_tools.settings import SurrealDBSetting
+
+
+class ConnectionPool:
+    """
+    SurrealDBへの接続を使い回すためのプール
+
+    接続は借用時に生成し、返却後もプール内で保持して再利用する。
+    初回のサインインで得たトークンを新しい接続の認証に使い、
+    トークンが無効な場合のみサインインし直す。
+    一定時間使われていない接続は借用時に疎通確認を行い、切断されていれば接続し直す。
+    """
+
+    _shared: Dict[Tuple, "ConnectionPool"] = {}
+
+    def __init__(
+        self,
+        settings: SurrealDBSetting,
+        size: Optional[int] = None,
+        health_check_interval: float = 30.0,
+    ):
+        self.settings = settings
+        self.size = size or settings.pool_size
+        self.health_check_interval = health_check_interval
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._idle: List[Tuple[Surreal, float]] = []
+        self._token: Optional[str] = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def shared(cls, settings: SurrealDBSetting) -> "ConnectionPool":
+        """接続先とイベントループごとに共有されるプールを返す"""
+        key = (
+            settings.url,
+            settings.namespace,
+            settings.database,
+            settings.username,
+            id(asyncio.get_running_loop()),
+        )
+        pool = cls._shared.get(key)
+        if pool is None:
+            pool = cls(settings)
+            cls._shared[key] = pool
+        return pool
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Surreal]:
+        """接続を借用し、終了時に返却する"""
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def acquire(self) -> Surreal:
+        """接続を借用する。空きがない場合は返却されるまで待機する"""
+        await self._semaphore.acquire()
+        try:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if await self._is_healthy(conn, last_used):
+                    return conn
+                await self._close_quietly(conn)
+            return await self._open()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def release(self, conn: Surreal, discard: bool = False) -> None:
+        """
+        接続を返却する
+
+        Args:
+            conn: 返却する接続
+            discard: Trueの場合は再利用せずに切断する
+        """
+        try:
+            if discard or self._is_closed(conn):
+                await self._close_quietly(conn)
+            else:
+                self._idle.append((conn, asyncio.get_running_loop().time()))
+        finally:
+            self._semaphore.release()
+
+    async def close(self) -> None:
+        """保持している接続をすべて切断する"""
+        idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            await self._close_quietly(conn)
+
+    async def _open(self) -> Surreal:
+        conn = Surreal(self.settings.url)
+        await conn.connect()
+        await conn.use(namespace=self.settings.namespace, database=self.settings.database)
+        if self._token:
+            try:
+                await conn.authenticate(self._token)
+                return conn
+            except Exception:
+                self.logger.info("Token expired. Signing in again.")
+        self._token = await conn.signin({"user": self.settings.username, "pass": self.settings.password})
+        return conn
+
+    async def _is_healthy(self, conn: Surreal, last_used: float) -> bool:
+        if self._is_closed(conn):
+            return False
+        if asyncio.get_running_loop().time() - last_used < self.health_check_interval:
+            return True
+        try:
+            await conn.query("RETURN true;")
+            return True
+        except Exception:
+            return False
+
+    def _is_closed(self, conn: Surreal) -> bool:
+        return conn.ws is None or conn.ws.closed
+
+    async def _close_quietly(self, conn: Surreal) -> None:
+        try:
+            await conn.close()
+        except Exception as e:
+            self.logger.debug(f"Failed to close connection: {str(e)}")
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+class SQLiteDatabase:
+    """
+    組み込みSQLiteへのアクセスを提供するクラス
+
+    WALモードで開き、読み込みと書き込みが互いをブロックしないようにする。
+    sqlite3 は同期APIのため、処理はスレッドで実行し、ロックで直列化する。
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    async def connect(self):
+        if self._conn is not None:
+            return
+        if str(self.path) != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = await asyncio.to_thread(self._open)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    async def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.to_thread(conn.close)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # 接続は使い回すため、ここでは閉じない
+        pass
+
+    async def executescript(self, script: str) -> None:
+        """複数のステートメントをまとめて実行する"""
+        await self._run(lambda conn: conn.executescript(script))
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        """クエリを実行し、全行を返す"""
+        return await self._run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute_batch(self, statements: Iterable[Tuple[str, Sequence[Sequence[Any]]]]) -> None:
+        """
+        (SQL, パラメータ行の配列) の組を1つのトランザクションで実行する
+
+        Raises:
+            sqlite3.Error: いずれかのステートメントが失敗した場合（全体をロールバックする）
+        """
+        statements = list(statements)
+
+        def run(conn: sqlite3.Connection):
+            conn.execute("BEGIN")
+            try:
+                for sql, rows in statements:
+                    conn.executemany(sql, rows)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+        await self._run(run)
+
+    async def _run(self, func):
+        await self.connect()
+        async with self._lock:
+            return await asyncio.to_thread(func, self._conn)
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+pytest.importorskip("surrealdb")
+
+from njs_mywork_tools.mail.export import (MailParquetExporter,
+                                          from_record_batch, to_record_batch)
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.repository import MailRepository
+from njs_mywork_tools.mail.sqlite_repository import SQLiteMailRepository
+from njs_mywork_tools.settings import SurrealDBSetting
+
+
+def test_linked_layout_message_round_trips_through_record_batch():
+    """linked 形式で取得したメッセージを Parquet の行に変換して元に戻せる"""
+    repository = MailRepository(
+        SurrealDBSetting(url="ws://localhost:8000/rpc", namespace="test", database="test",
+                         username="root", password="root"),
+    )
+    # FETCH sender, recipients, attachments した結果
+    row = {
+        "id": "mail_messages:INBOX_1",
+        "subject": "週報の送付",
+        "mail_date": "2025-01-02T03:04:00",
+        "body": "お疲れさまです。",
+        "sender": {"id": "mail_senders:s1", "message_id": "INBOX_1", "email": "sender@example.com"},
+        "recipients": [
+            {"id": "mail_recipients:r1", "message_id": "INBOX_1",
+             "email": "to@example.com", "recipient_type": "to"},
+            {"id": "mail_recipients:r2", "message_id": "INBOX_1",
+             "email": "cc@example.com", "recipient_type": "cc"},
+        ],
+        "attachments": [
+            {"id": "mail_attachments:a1", "message_id": "INBOX_1", "file_path": "report.xlsx"},
+        ],
+    }
+
+    message = repository._convert_surreal_result_to_entity(row)
+
+    assert message == MailMessage(
+        id="INBOX_1",
+        subject="週報の送付",
+        mail_date=datetime(2025, 1, 2, 3, 4),
+        body="お疲れさまです。",
+        sender=ContactPerson(email="sender@example.com"),
+        to_addresses=[ContactPerson(email="to@example.com")],
+        cc_addresses=[ContactPerson(email="cc@example.com")],
+        attachments=["report.xlsx"],
+    )
+    assert from_record_batch(to_record_batch([message])) == [message]
+
+
+def test_export_from_mid_month_keeps_earlier_rows_of_the_month(tmp_path):
+    """月の途中から書き出しても、その月のパーティションの既存の行は失われない"""
+    messages = [
+        MailMessage(
+            id=f"INBOX_{day}",
+            subject=f"件名{day}",
+            mail_date=datetime(2025, 1, day, 9, 0),
+            body="本文",
+            sender=ContactPerson(email="sender@example.com"),
+            to_addresses=[],
+            cc_addresses=[],
+            attachments=[],
+        )
+        for day in (5, 20)
+    ]
+
+    async def run():
+        store = SQLiteMailRepository(tmp_path / "mail.sqlite3")
+        await store.save_many(messages)
+        exporter = MailParquetExporter(store, tmp_path / "export")
+        return await exporter.export(
+            start=datetime(2025, 1, 15), end=datetime(2025, 1, 25), incremental=False
+        )
+
+    [path] = asyncio.run(run())
+    assert pq.read_table(path)["id"].to_pylist() == ["INBOX_5", "INBOX_20"]
@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Set
+
+from njs_mywork_tools.mail.journal import (JournaledMailStore, JournalFlusher,
+                                           MailJournal, _dump)
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.store import MailStore
+
+
+def _message(message_id: str) -> MailMessage:
+    return MailMessage(
+        id=message_id,
+        subject=f"件名 {message_id}",
+        mail_date=datetime(2025, 1, 1, 9, 0),
+        body="本文",
+        sender=ContactPerson(email="sender@example.com", name="送信者"),
+        to_addresses=[ContactPerson(email="to@example.com")],
+        cc_addresses=[],
+        attachments=[],
+    )
+
+
+class _MemoryStore(MailStore):
+    """保存したメールを保持し、指定したIDの保存を拒否する保存先"""
+
+    def __init__(self, rejected: Set[str] = frozenset(), exists_delay: float = 0.0):
+        self.saved: Dict[str, MailMessage] = {}
+        self.rejected = rejected
+        self.exists_delay = exists_delay
+        self.exists_calls = 0
+
+    async def save_many(self, mail_messages: List[MailMessage]) -> None:
+        if any(message.id in self.rejected for message in mail_messages):
+            raise ValueError("rejected")
+        self.saved.update({message.id: message for message in mail_messages})
+
+    async def find_by_id(self, message_id: str) -> MailMessage:
+        return self.saved[message_id]
+
+    async def exists_many(self, message_ids: Iterable[str]) -> Set[str]:
+        self.exists_calls += 1
+        await asyncio.sleep(self.exists_delay)
+        return {message_id for message_id in message_ids if message_id in self.saved}
+
+    async def delete_many(self, message_ids: Iterable[str]) -> None:
+        for message_id in message_ids:
+            self.saved.pop(message_id, None)
+
+    async def search(self, text, filters=None, limit=20):
+        return []
+
+    async def iter_messages(self, start, end, sender=None, batch_size=500):
+        for message in self.saved.values():
+            yield message
+
+
+def test_open_discards_incomplete_trailing_record(tmp_path):
+    """書き込み途中の末尾の行を破棄し、完全な行のみを未反映として読み込む"""
+    path = tmp_path / "journal.jsonl"
+    path.write_bytes(_dump(_message("INBOX_1")) + _dump(_message("INBOX_2")) + b'{"id": "INBOX_3", "sub')
+
+    async def run():
+        journal = MailJournal(path)
+        await journal.open()
+        messages, _ = await journal.read_pending(10)
+        await journal.close()
+        return journal.pending_ids, messages
+
+    pending, messages = asyncio.run(run())
+    assert pending == {"INBOX_1", "INBOX_2"}
+    assert messages == [_message("INBOX_1"), _message("INBOX_2")]
+    assert path.read_bytes().endswith(b"\n")
+
+
+def test_commit_records_offset_and_truncates_when_drained(tmp_path):
+    """反映済みの位置は再起動後も引き継がれ、すべて反映するとファイルを空にする"""
+    path = tmp_path / "journal.jsonl"
+
+    async def run():
+        journal = MailJournal(path)
+        await journal.append_many([_message("INBOX_1"), _message("INBOX_2"), _message("INBOX_3")])
+        messages, offset = await journal.read_pending(2)
+        await journal.commit(offset, [message.id for message in messages])
+        await journal.close()
+
+        reopened = MailJournal(path)
+        await reopened.open()
+        pending = reopened.pending_ids
+        rest, offset = await reopened.read_pending(10)
+        await reopened.commit(offset, [message.id for message in rest])
+        await reopened.close()
+        return pending, rest, reopened.offset
+
+    pending, rest, offset = asyncio.run(run())
+    assert pending == {"INBOX_3"}
+    assert rest == [_message("INBOX_3")]
+    assert offset == 0
+    assert path.read_bytes() == b""
+    assert (tmp_path / "journal.jsonl.offset").read_text() == "0"
+
+
+def test_flusher_moves_rejected_records_to_dead_letter(tmp_path):
+    """繰り返し反映に失敗したバッチは、拒否されたメールのみデッドレターに移して先に進む"""
+    path = tmp_path / "journal.jsonl"
+    store = _MemoryStore(rejected={"INBOX_2"})
+
+    async def run():
+        journal = MailJournal(path)
+        await journal.append_many([_message("INBOX_1"), _message("INBOX_2"), _message("INBOX_3")])
+        flusher = JournalFlusher(journal, store, max_attempts=2)
+        first_error = None
+        try:
+            await flusher.drain_once()
+        except ValueError as e:
+            first_error = e
+        drained = await flusher.drain_once()
+        await journal.close()
+        return first_error, drained, journal.pending_ids
+
+    first_error, drained, pending = asyncio.run(run())
+    assert first_error is not None
+    assert drained == 3
+    assert pending == set()
+    assert set(store.saved) == {"INBOX_1", "INBOX_3"}
+    assert (tmp_path / "journal.jsonl.dead").read_bytes() == _dump(_message("INBOX_2"))
+
+
+def test_exists_many_does_not_wait_for_a_stalled_database(tmp_path):
+    """データベースが応答しない場合は追記済みのIDのみを返し、しばらく問い合わせない"""
+    store = _MemoryStore(exists_delay=10.0)
+
+    async def run():
+        journaled = JournaledMailStore(store, tmp_path / "journal.jsonl", check_timeout=0.05)
+        await journaled.save(_message("INBOX_1"))
+        first = await journaled.exists_many(["INBOX_1", "INBOX_2"])
+        second = await journaled.exists_many(["INBOX_2"])
+        await MailJournal.close_all()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == {"INBOX_1"}
+    assert second == set()
+    assert store.exists_calls == 1
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+
+from njs_mywork_tools.mail.models.entities import RecipientType
+from njs_mywork_tools.mail.query import SENDER_MESSAGE_IDS, MailQuery
+
+
+def test_compile_selects_fields_with_date_range_and_limit():
+    """選択したフィールドと並び順のフィールドのみを取得し、日時の条件を先頭に置く"""
+    query = (
+        MailQuery()
+        .between(datetime(2025, 1, 1), datetime(2025, 1, 31, 23, 59))
+        .subject_startswith("週報:")
+        .with_attachments()
+        .select("subject")
+        .order_by("mail_date", descending=True)
+        .limit(50)
+    )
+
+    surql, params = query.compile()
+
+    assert surql == (
+        "SELECT id, subject, mail_date FROM mail_messages "
+        "WHERE mail_date >= $start AND mail_date <= $end "
+        "AND subject >= $subject_prefix AND subject < $subject_prefix_end "
+        "AND array::len(attachments) > 0 "
+        "ORDER BY mail_date DESC LIMIT $limit"
+    )
+    assert params == {
+        "start": "2025-01-01T00:00:00",
+        "end": "2025-01-31T23:59:00",
+        "subject_prefix": "週報\\:",
+        "subject_prefix_end": "週報\\:\U0010ffff",
+        "limit": 50,
+    }
+
+
+def test_compile_linked_sender_and_recipient_reads_only_matching_ids():
+    """linked 形式の送信者・受信者の条件はインデックスで取得したIDから読み込む"""
+    query = (
+        MailQuery()
+        .from_sender("sender@example.com")
+        .to_recipient("to@example.com", RecipientType.TO)
+        .select("subject", "sender")
+    )
+
+    surql, params = query.compile("linked")
+
+    assert surql.split("\n") == [
+        SENDER_MESSAGE_IDS,
+        "LET $recipient_ids = array::distinct((SELECT VALUE "
+        "type::thing('mail_messages', message_id) FROM mail_recipients "
+        "WHERE email = $recipient AND recipient_type = $recipient_type));",
+        "LET $message_ids = array::intersect($sender_ids, $recipient_ids);",
+        "SELECT id, subject, sender, mail_date FROM $message_ids ORDER BY mail_date ASC FETCH sender",
+    ]
+    assert params == {
+        "sender": "sender@example.com",
+        "recipient": "to@example.com",
+        "recipient_type": "to",
+    }
+
+
+def test_compile_embedded_filters_on_document_fields_and_fetches_body_parts():
+    """embedded 形式は埋め込んだフィールドで絞り込み、本文の参照先のみを FETCH する"""
+    query = MailQuery().from_sender("sender@example.com").to_recipient("cc@example.com").select("body")
+
+    surql, params = query.compile("embedded", body_parts=True)
+
+    assert surql == (
+        "SELECT id, body, mail_date, body_parts FROM mail_messages "
+        "WHERE sender.email = $sender AND array::len(recipients[WHERE email = $recipient]) > 0 "
+        "ORDER BY mail_date ASC FETCH body_parts"
+    )
+    assert params == {"sender": "sender@example.com", "recipient": "cc@example.com"}
+
+
+def test_select_and_order_by_reject_unknown_fields():
+    with pytest.raises(ValueError):
+        MailQuery().select("unknown")
+    with pytest.raises(ValueError):
+        MailQuery().order_by("body")
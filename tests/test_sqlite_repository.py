@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime
+
+from njs_mywork_tools.mail.models.message import ContactPerson, MailMessage
+from njs_mywork_tools.mail.models.search import MailSearchFilters
+from njs_mywork_tools.mail.sqlite_repository import SQLiteMailRepository
+
+
+def _message(message_id: str, mail_date: datetime, subject: str, body: str,
+             sender: str = "sender@example.com") -> MailMessage:
+    return MailMessage(
+        id=message_id,
+        subject=subject,
+        mail_date=mail_date,
+        body=body,
+        sender=ContactPerson(email=sender, name="送信者"),
+        to_addresses=[ContactPerson(email="to@example.com", name="宛先")],
+        cc_addresses=[ContactPerson(email="cc@example.com", name="")],
+        attachments=["report.xlsx"],
+    )
+
+
+MESSAGES = [
+    _message("INBOX_1", datetime(2025, 1, 1, 9, 0), "週報の送付", "先週の進捗を報告します。"),
+    _message("INBOX_2", datetime(2025, 1, 2, 9, 0), "会議のお知らせ", "定例会議を開催します。",
+             sender="other@example.com"),
+    _message("INBOX_3", datetime(2025, 1, 2, 9, 0), "週報の確認", "内容を確認しました。"),
+]
+
+
+def test_save_and_find_by_id(tmp_path):
+    """保存したメッセージを受信者・添付ファイル・連絡先名を含めて取得できる"""
+    async def run():
+        repository = SQLiteMailRepository(tmp_path / "mail.sqlite3")
+        await repository.save_many(MESSAGES)
+        # 同じIDは置き換える
+        await repository.save(MESSAGES[0])
+        return (
+            await repository.find_by_id("INBOX_1"),
+            await repository.exists_many(["INBOX_1", "INBOX_9"]),
+        )
+
+    found, existing = asyncio.run(run())
+    assert found == MESSAGES[0]
+    assert existing == {"INBOX_1"}
+
+
+def test_search_uses_fulltext_and_filters(tmp_path):
+    """件名・本文を全文検索し、送信者で絞り込める（短い検索語は部分一致）"""
+    async def run():
+        repository = SQLiteMailRepository(tmp_path / "mail.sqlite3")
+        await repository.save_many(MESSAGES)
+        return (
+            await repository.search("進捗を報告"),
+            await repository.search("週報"),
+            await repository.search("週報", MailSearchFilters(sender="other@example.com")),
+        )
+
+    by_body, by_subject, filtered = asyncio.run(run())
+    assert [r.id for r in by_body] == ["INBOX_1"]
+    assert "<mark>進捗を報告</mark>" in by_body[0].body_highlight
+    assert sorted(r.id for r in by_subject) == ["INBOX_1", "INBOX_3"]
+    assert filtered == []
+
+
+def test_iter_messages_pages_in_date_order(tmp_path):
+    """同じ日時のメッセージがページの境界にあっても漏れなく日時順に返す"""
+    async def run():
+        repository = SQLiteMailRepository(tmp_path / "mail.sqlite3")
+        await repository.save_many(MESSAGES)
+        await repository.delete_many(["INBOX_1"])
+        return [
+            message.id
+            async for message in repository.iter_messages(
+                datetime(2025, 1, 1), datetime(2025, 1, 31), batch_size=1
+            )
+        ]
+
+    assert asyncio.run(run()) == ["INBOX_2", "INBOX_3"]